@@ -0,0 +1,94 @@
+import json
+import logging
+import os
+from collections import OrderedDict
+
+from locks import FileLock
+
+LOG = logging.getLogger(__name__)
+
+CHECKPOINTS_DIR_NAME = "checkpoints"
+CHECKPOINT_FILENAME_TEMPLATE = "run-{}.jsonl"
+
+
+class CheckpointJournal:
+  # JSON lines journal of finished issues: a header line with the branches of the run,
+  # then one line per finished issue with all of its result rows.
+  # Each line is appended with a single write to a file opened with O_APPEND and synced to disk,
+  # so a crash can only leave an incomplete last line, which is ignored when the journal is loaded.
+  def __init__(self, file_path):
+    self.file_path = file_path
+    self._fd = None
+    self._lock = None
+
+  def lock(self):
+    # Reruns of the same issue source use the same journal, only one live run may own it.
+    # The lock is released by remove(), or by the OS when the process dies.
+    directory = os.path.dirname(self.file_path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    lock = FileLock(self.file_path + ".lock")
+    if not lock.acquire(blocking=False):
+      raise ValueError("Checkpoint journal {} is used by another running reviewsync process!".format(self.file_path))
+    self._lock = lock
+
+  def start(self, branches):
+    # Starts a new journal, dropping the issues of the previous run.
+    # The journal may already be open, if a journal without finished issues was resumed.
+    self.close()
+    directory = os.path.dirname(self.file_path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    tmp_file_path = self.file_path + ".tmp"
+    with open(tmp_file_path, "w") as f:
+      f.write(json.dumps({"branches": branches}) + "\n")
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(tmp_file_path, self.file_path)
+    self._open()
+
+  def resume(self):
+    # Returns the branches of the journal and the result rows of finished issues (key: issue ID)
+    branches, finished_issues = self.load()
+    self._open()
+    return branches, finished_issues
+
+  def load(self):
+    finished_issues = OrderedDict()
+    with open(self.file_path, "r") as f:
+      header = json.loads(f.readline())
+      for line_number, line in enumerate(f, start=2):
+        try:
+          entry = json.loads(line)
+        except ValueError:
+          LOG.warning("Ignoring incomplete line %d of checkpoint journal %s", line_number, self.file_path)
+          continue
+        finished_issues[entry["issue"]] = entry["rows"]
+    return header["branches"], finished_issues
+
+  def _open(self):
+    self._fd = os.open(self.file_path, os.O_WRONLY | os.O_APPEND)
+    # An incomplete last line of a crashed run is terminated, so the next entry starts on a new line
+    if os.fstat(self._fd).st_size > 0:
+      with open(self.file_path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+          os.write(self._fd, b"\n")
+
+  def append(self, issue_id, rows):
+    line = (json.dumps({"issue": issue_id, "rows": rows}) + "\n").encode("utf-8")
+    os.write(self._fd, line)
+    os.fsync(self._fd)
+
+  def close(self):
+    if self._fd is not None:
+      os.close(self._fd)
+      self._fd = None
+
+  def remove(self):
+    self.close()
+    if os.path.exists(self.file_path):
+      os.remove(self.file_path)
+    if self._lock:
+      self._lock.release()
+      self._lock = None
@@ -0,0 +1,76 @@
+import logging
+import os
+import tempfile
+
+from conflict_details import FILE_ERROR_PATTERN
+from git_backend import execute_command
+from patch_apply import PatchApply, PatchStatus
+
+LOG = logging.getLogger(__name__)
+
+
+class ConflictClassifier:
+  # Tells real conflicts apart from patches that are partially or fully present on the branch already,
+  # or that apply with a 3-way merge. All checks run against a scratch index populated from the branch,
+  # the working tree and the index of the repository are not touched.
+  def __init__(self, repo_path):
+    self.repo_path = repo_path
+
+  def classify(self, patch, target_branch, patch_apply):
+    if patch_apply.result != PatchStatus.CONFLICT:
+      return patch_apply
+    fd, index_file = tempfile.mkstemp(prefix="reviewsync-index-")
+    os.close(fd)
+    os.remove(index_file)
+    env = dict(os.environ, GIT_INDEX_FILE=index_file)
+    try:
+      result = self._classify(patch, target_branch, env)
+    finally:
+      if os.path.exists(index_file):
+        os.remove(index_file)
+    if result == patch_apply.result:
+      return patch_apply
+    LOG.info("[%s] Conflicting patch %s on %s is classified as: %s", patch.issue_id, patch.filename, target_branch, result)
+    if result == PatchStatus.PATCH_ALREADY_COMMITTED:
+      return PatchApply(patch, target_branch, result)
+    return PatchApply(patch, target_branch, result, conflicts=patch_apply.conflicts,
+                      conflict_details=patch_apply.conflict_details)
+
+  def _classify(self, patch, target_branch, env):
+    self._read_tree(target_branch, env)
+    if self._apply_succeeds(patch, env, '--check', '-R'):
+      # The whole patch can be reverted, so all of its changes are present on the branch
+      return PatchStatus.PATCH_ALREADY_COMMITTED
+
+    # A single forward check reports all files failing to apply, only those are checked for reverted changes
+    already_present_files = [path for path in self._get_failed_paths(patch, env)
+                             if self._apply_succeeds(patch, env, '--check', '-R', '--include=' + path)]
+    if already_present_files:
+      LOG.debug("[%s] Changes of patch %s already present on %s: %s",
+                patch.issue_id, patch.filename, target_branch, already_present_files)
+      return PatchStatus.PARTIALLY_APPLIED
+
+    if self._apply_succeeds(patch, env, '--3way'):
+      return PatchStatus.THREE_WAY_CLEAN
+    return PatchStatus.CONFLICT
+
+  def _read_tree(self, target_branch, env):
+    status, _, stderr = execute_command(['git', 'read-tree', target_branch], self.repo_path, env=env)
+    if status != 0:
+      raise ValueError("Failed to read tree of {} into scratch index: {}".format(target_branch, stderr))
+
+  def _apply(self, patch, env, *args):
+    return execute_command(['git', 'apply', '--cached'] + list(args) + [patch.file_path], self.repo_path, env=env)
+
+  def _apply_succeeds(self, patch, env, *args):
+    status, _, _ = self._apply(patch, env, *args)
+    return status == 0
+
+  def _get_failed_paths(self, patch, env):
+    _, _, stderr = self._apply(patch, env, '--check')
+    paths = []
+    for line in stderr.splitlines():
+      search_obj = FILE_ERROR_PATTERN.match(line)
+      if search_obj and search_obj.group(1) not in paths:
+        paths.append(search_obj.group(1))
+    return paths
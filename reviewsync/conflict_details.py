@@ -0,0 +1,138 @@
+import logging
+import os
+import re
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONFLICT_DETAILS = 20
+DEFAULT_MAX_LOGGED_OUTPUT_LENGTH = 4000
+CONFLICTS_DIR_NAME = "conflicts"
+
+PATCH_FAILED_PATTERN = re.compile(r'^error: patch failed: (.+):(\d+)$')
+FILE_ERROR_PATTERN = re.compile(r'^error: (.+?): (patch does not apply|does not exist in index|'
+                                r'already exists in working directory|already exists in index|'
+                                r'does not match index|No such file or directory)$')
+DIFF_NEW_FILE_PATTERN = re.compile(r'^\+\+\+ (?:b/)?(.+?)\s*$')
+DIFF_OLD_FILE_PATTERN = re.compile(r'^--- (?:a/)?(.+?)\s*$')
+HUNK_HEADER_PATTERN = re.compile(r'^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@')
+
+
+class ConflictDetail:
+  __slots__ = ('file', 'hunk', 'reason', 'line')
+
+  def __init__(self, file, hunk, reason, line=None):
+    self.file = file
+    # 1-based index of the hunk within the file's diff, None if it cannot be determined
+    self.hunk = hunk
+    self.reason = reason
+    self.line = line
+
+  def __repr__(self):
+    return repr((self.file, self.hunk, self.reason))
+
+  def __str__(self):
+    hunk = "hunk #{}".format(self.hunk) if self.hunk else "line {}".format(self.line) if self.line else "-"
+    return "{} ({}): {}".format(self.file, hunk, self.reason)
+
+
+class ConflictDetails:
+  __slots__ = ('details', 'total', 'log_file')
+
+  def __init__(self, details, total, log_file=None):
+    self.details = details
+    # Number of conflict details found, can be more than the number of details kept
+    self.total = total
+    self.log_file = log_file
+
+  @property
+  def truncated(self):
+    return self.total > len(self.details)
+
+  def __len__(self):
+    return len(self.details)
+
+  def __repr__(self):
+    return repr((self.details, self.total, self.log_file))
+
+  def __str__(self):
+    result = "; ".join(str(d) for d in self.details)
+    if self.truncated:
+      result += "; ... ({} more)".format(self.total - len(self.details))
+    return result
+
+
+class ConflictDetailParser:
+  @classmethod
+  def parse(cls, stderr, patch_file_path=None, max_details=DEFAULT_MAX_CONFLICT_DETAILS):
+    hunk_start_lines = cls._get_hunk_start_lines(patch_file_path) if patch_file_path else {}
+    details = []
+    total = 0
+    failed_lines = {}
+    for line in stderr.splitlines():
+      search_obj = PATCH_FAILED_PATTERN.match(line)
+      if search_obj:
+        failed_lines[search_obj.group(1)] = int(search_obj.group(2))
+        continue
+      search_obj = FILE_ERROR_PATTERN.match(line)
+      if not search_obj:
+        continue
+      total += 1
+      if len(details) >= max_details:
+        continue
+      file, reason = search_obj.group(1), search_obj.group(2)
+      failed_line = failed_lines.pop(file, None)
+      hunk = cls._get_hunk_index(hunk_start_lines.get(file), failed_line)
+      details.append(ConflictDetail(file, hunk, reason, line=failed_line))
+    return ConflictDetails(details, total)
+
+  @staticmethod
+  def _get_hunk_index(start_lines, failed_line):
+    # git apply reports the original start line of the failing hunk
+    if not start_lines or failed_line is None or failed_line not in start_lines:
+      return None
+    return start_lines.index(failed_line) + 1
+
+  @staticmethod
+  def _get_hunk_start_lines(patch_file_path):
+    # key: file path, value: original start line of each hunk, in order
+    hunk_start_lines = {}
+    current_file = None
+    old_file = None
+    try:
+      with open(patch_file_path, "r", errors="replace") as f:
+        for line in f:
+          if line.startswith("--- "):
+            search_obj = DIFF_OLD_FILE_PATTERN.match(line)
+            old_file = search_obj.group(1) if search_obj else None
+          elif line.startswith("+++ "):
+            search_obj = DIFF_NEW_FILE_PATTERN.match(line)
+            new_file = search_obj.group(1) if search_obj else None
+            current_file = old_file if new_file == "/dev/null" else new_file
+            hunk_start_lines.setdefault(current_file, [])
+          elif line.startswith("@@") and current_file:
+            search_obj = HUNK_HEADER_PATTERN.match(line)
+            if search_obj:
+              hunk_start_lines[current_file].append(int(search_obj.group(1)))
+    except OSError:
+      LOG.exception("Failed to read patch file %s", patch_file_path)
+    return hunk_start_lines
+
+
+class ConflictOutputStore:
+  def __init__(self, log_dir):
+    self.conflicts_dir = os.path.join(log_dir, CONFLICTS_DIR_NAME)
+
+  def save(self, issue_id, branch, patch_filename, stdout, stderr):
+    if not os.path.exists(self.conflicts_dir):
+      os.makedirs(self.conflicts_dir, exist_ok=True)
+    filename = "{}-{}-{}.log".format(issue_id, branch, patch_filename).replace("/", "_")
+    file_path = os.path.join(self.conflicts_dir, filename)
+    with open(file_path, "w") as f:
+      f.write("stdout:\n{}\nstderr:\n{}\n".format(stdout, stderr))
+    return file_path
+
+
+def truncate_output(output, max_length=DEFAULT_MAX_LOGGED_OUTPUT_LENGTH):
+  if not output or len(output) <= max_length:
+    return output
+  return "{}... ({} more characters)".format(output[:max_length], len(output) - max_length)
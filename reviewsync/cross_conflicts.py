@@ -0,0 +1,135 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from git_backend import execute_command
+
+LOG = logging.getLogger(__name__)
+
+CROSS_CONFLICT_HEADERS = ["Branch", "Issue", "Patch file", "Conflicting issue", "Conflicting patch file",
+                          "Overlapping files"]
+
+
+class CrossConflict:
+  __slots__ = ('branch', 'first', 'second', 'paths')
+
+  def __init__(self, branch, first, second, paths):
+    self.branch = branch
+    # second does not apply on the branch once first is applied
+    self.first = first
+    self.second = second
+    self.paths = paths
+
+  def __repr__(self):
+    return repr((self.branch, self.first.issue_id, self.second.issue_id, self.paths))
+
+  def __str__(self):
+    return "{} and {} on {} (overlapping files: {})".format(self.first.filename, self.second.filename, self.branch,
+                                                            ", ".join(self.paths))
+
+  def to_record(self):
+    return {"type": "cross_conflict", "branch": self.branch, "issue": self.first.issue_id,
+            "patch_file": self.first.filename, "conflicting_issue": self.second.issue_id,
+            "conflicting_patch_file": self.second.filename, "paths": self.paths}
+
+
+class CrossPatchConflictDetector:
+  # Finds pairs of patches that apply cleanly on a branch one by one (directly or with a clean 3-way merge),
+  # but conflict with each other.
+  # Candidate pairs come from an inverted index of touched paths, so only patches touching the same files
+  # are applied together. Candidates are verified in a scratch index populated from the branch,
+  # the working tree and the index of the repository are not touched.
+  def __init__(self, repo_path):
+    self.repo_path = repo_path
+    # key: branch, value: patches applying cleanly or 3-way cleanly on the branch, in the order issues are finished
+    self.clean_patches = OrderedDict()
+    self._lock = threading.Lock()
+
+  def add(self, patch_applies):
+    from patch_apply import PatchStatus
+    with self._lock:
+      for patch_apply in patch_applies:
+        patch = patch_apply.patch
+        if patch_apply.result in (PatchStatus.APPLIES_CLEANLY, PatchStatus.THREE_WAY_CLEAN) and patch and patch.info:
+          self.clean_patches.setdefault(patch_apply.branch, []).append(patch)
+
+  @staticmethod
+  def get_candidate_pairs(patches):
+    # key: (index of first patch, index of second patch), value: overlapping paths
+    patches_by_path = {}
+    for idx, patch in enumerate(patches):
+      for path in patch.info.paths:
+        patches_by_path.setdefault(path, []).append(idx)
+    pairs = {}
+    for path, indexes in patches_by_path.items():
+      for i, first in enumerate(indexes):
+        for second in indexes[i + 1:]:
+          if patches[first].issue_id != patches[second].issue_id:
+            pairs.setdefault((first, second), []).append(path)
+    return pairs
+
+  def detect(self):
+    conflicts = []
+    for branch, patches in self.clean_patches.items():
+      pairs = self.get_candidate_pairs(patches)
+      LOG.info("Checking %d candidate patch pairs with overlapping files on %s, out of %d cleanly applying patches",
+               len(pairs), branch, len(patches))
+      # key: index of first patch, value: list of (index of second patch, overlapping paths)
+      candidates = OrderedDict()
+      for (first, second), paths in sorted(pairs.items()):
+        candidates.setdefault(first, []).append((second, paths))
+      for first, seconds in candidates.items():
+        conflicts.extend(self._verify(branch, patches[first], [(patches[idx], paths) for idx, paths in seconds]))
+    LOG.info("Found %d conflicting patch pairs", len(conflicts))
+    return conflicts
+
+  def _verify(self, branch, first, seconds):
+    fd, index_file = tempfile.mkstemp(prefix="reviewsync-index-")
+    os.close(fd)
+    os.remove(index_file)
+    env = dict(os.environ, GIT_INDEX_FILE=index_file)
+    conflicts = []
+    try:
+      # The first patch is applied to the scratch index once, then each candidate is checked on top of it
+      status, _, stderr = execute_command(['git', 'read-tree', branch], self.repo_path, env=env)
+      if status != 0:
+        raise ValueError("Failed to read tree of {} into scratch index: {}".format(branch, stderr))
+      status, _, stderr = execute_command(['git', 'apply', '--cached', first.file_path], self.repo_path, env=env)
+      if status != 0:
+        status, _, stderr = execute_command(['git', 'apply', '--cached', '--3way', first.file_path], self.repo_path,
+                                            env=env)
+      if status != 0:
+        LOG.warning("[%s] Patch %s does not apply to scratch index of %s: %s",
+                    first.issue_id, first.filename, branch, stderr)
+        return conflicts
+      for second, paths in seconds:
+        status, _, _ = execute_command(['git', 'apply', '--cached', '--check', second.file_path], self.repo_path,
+                                       env=env)
+        if status != 0 and not self._applies_with_3way(index_file, second):
+          conflict = CrossConflict(branch, first, second, paths)
+          LOG.info("[%s] Patch conflicts with patch of %s: %s", first.issue_id, second.issue_id, conflict)
+          conflicts.append(conflict)
+    finally:
+      if os.path.exists(index_file):
+        os.remove(index_file)
+    return conflicts
+
+  def _applies_with_3way(self, index_file, patch):
+    # git apply --check reports success for 3-way merges with conflicts, so the merge is done on a copy of the index
+    trial_index_file = index_file + ".3way"
+    shutil.copyfile(index_file, trial_index_file)
+    try:
+      status, _, _ = execute_command(['git', 'apply', '--cached', '--3way', patch.file_path], self.repo_path,
+                                     env=dict(os.environ, GIT_INDEX_FILE=trial_index_file))
+      return status == 0
+    finally:
+      os.remove(trial_index_file)
+
+  @staticmethod
+  def convert_data_for_result_printer(conflicts):
+    data = [[conflict.branch, conflict.first.issue_id, conflict.first.filename, conflict.second.issue_id,
+             conflict.second.filename, ", ".join(conflict.paths)] for conflict in conflicts]
+    return data, CROSS_CONFLICT_HEADERS
@@ -0,0 +1,9 @@
+from enum import Enum
+
+
+# Mirrors pythoncommons.jira_wrapper.JiraFetchMode, without importing the Jira client.
+# JQL is specific to reviewsync.
+class JiraFetchMode(Enum):
+  ISSUES_CMDLINE = "ISSUES_CMDLINE"
+  GSHEET = "GSHEET"
+  JQL = "JQL"
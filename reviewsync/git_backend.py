@@ -0,0 +1,112 @@
+import logging
+import subprocess
+import threading
+
+LOG = logging.getLogger(__name__)
+
+
+class GitBackendType:
+  GITPYTHON = "gitpython"
+  NATIVE = "native"
+
+  ALLOWED_VALUES = [GITPYTHON, NATIVE]
+
+
+# Goes through the GitPython object model, kept as a fallback for the native backends
+class GitPythonBackend:
+  def __init__(self, repo):
+    self.repo = repo
+
+  def resolve_commit(self, rev):
+    from git import GitCommandError
+    try:
+      return self.repo.git.rev_parse("--verify", rev + "^{commit}")
+    except GitCommandError:
+      return None
+
+  def execute(self, command, env=None):
+    return self.repo.git.execute(command, with_extended_output=True, with_exceptions=False, env=env)
+
+  def close(self):
+    pass
+
+
+# Talks to a long-lived git plumbing process instead of launching one git process per query:
+# ref and object lookups go through 'git cat-file --batch-check'.
+# Patches are applied in detached worktrees, so no refs are updated by the backends.
+class NativeGitBackend:
+  def __init__(self, repo_path):
+    self.repo_path = repo_path
+    self._cat_file = None
+    self._lock = threading.Lock()
+
+  def _start_process(self, *args):
+    return subprocess.Popen(["git"] + list(args), cwd=self.repo_path, stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, bufsize=1)
+
+  def _query_object(self, rev):
+    if "\n" in rev:
+      raise ValueError("Revision must not contain newline characters: {}".format(repr(rev)))
+    with self._lock:
+      if not self._cat_file or self._cat_file.poll() is not None:
+        self._cat_file = self._start_process("cat-file", "--batch-check")
+      self._cat_file.stdin.write(rev + "\n")
+      self._cat_file.stdin.flush()
+      line = self._cat_file.stdout.readline().rstrip("\n")
+    # Output is either '<sha> <type> <size>' or '<rev> missing' / '<rev> ambiguous'
+    parts = line.split(" ")
+    if len(parts) != 3:
+      LOG.debug("git cat-file could not resolve %s: %s", rev, line)
+      return None, None
+    return parts[0], parts[1]
+
+  def resolve_commit(self, rev):
+    sha, obj_type = self._query_object(rev + "^{commit}")
+    return sha if obj_type == "commit" else None
+
+  def execute(self, command, env=None):
+    return execute_command(command, self.repo_path, env=env)
+
+  def close(self):
+    with self._lock:
+      if self._cat_file and self._cat_file.poll() is None:
+        self._cat_file.stdin.close()
+        self._cat_file.wait()
+      self._cat_file = None
+
+
+# Uses libgit2 in-process for ref and object queries, where pygit2 is installed
+class Pygit2Backend(NativeGitBackend):
+  def __init__(self, repo_path, pygit2):
+    super().__init__(repo_path)
+    self.pygit2 = pygit2
+    self.pygit2_repo = pygit2.Repository(repo_path)
+
+  def resolve_commit(self, rev):
+    try:
+      obj = self.pygit2_repo.revparse_single(rev)
+      return str(obj.peel(self.pygit2.Commit).id)
+    except (KeyError, ValueError, self.pygit2.GitError):
+      return None
+
+
+def execute_command(command, cwd, env=None, input=None):
+  proc = subprocess.run(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                        universal_newlines=True, env=env, input=input)
+  return proc.returncode, proc.stdout.rstrip("\n"), proc.stderr.rstrip("\n")
+
+
+def create_git_backend(backend_type, repo_path, repo=None):
+  if backend_type == GitBackendType.GITPYTHON:
+    if not repo:
+      raise ValueError("GitPython backend requires a Repo object!")
+    return GitPythonBackend(repo)
+  elif backend_type == GitBackendType.NATIVE:
+    try:
+      import pygit2
+      LOG.info("Using pygit2 (libgit2) git backend")
+      return Pygit2Backend(repo_path, pygit2)
+    except ImportError:
+      LOG.info("pygit2 is not available, using git cat-file git backend")
+      return NativeGitBackend(repo_path)
+  raise ValueError("Unknown git backend: {}. Allowed values: {}".format(backend_type, GitBackendType.ALLOWED_VALUES))
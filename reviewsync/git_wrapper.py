@@ -1,21 +1,49 @@
 import logging
-from git import Repo, RemoteProgress, GitCommandError
+import re
+import time
+from contextlib import nullcontext
+from git import Repo, RemoteProgress
 import os
 
 from pythoncommons.git_utils import GitUtils
 
+from git_backend import GitBackendType, create_git_backend, execute_command
+from worktrees import WorktreeManager
+from conflict_classifier import ConflictClassifier
+from patch_ids import ApplyVerdictCache, CommittedPatchIdIndex, compute_patch_id, DEFAULT_PATCH_ID_WINDOW, \
+  PATCH_ID_INDEX_DIR_NAME
+from conflict_details import ConflictDetailParser, ConflictOutputStore, DEFAULT_MAX_CONFLICT_DETAILS, truncate_output
 from patch_apply import PatchApply, PatchStatus
 from jira_patch import HadoopJiraPatch
 
 HADOOP_UPSTREAM_REPO_URL = "https://github.com/apache/hadoop.git"
-BRANCH_PREFIX = "reviewsync"
 LOG = logging.getLogger(__name__)
 
 
 class GitWrapper:
-  def __init__(self, base_path):
+  def __init__(self, base_path, backend_type=GitBackendType.NATIVE, log_dir=None,
+               max_conflict_details=DEFAULT_MAX_CONFLICT_DETAILS, patch_id_window=DEFAULT_PATCH_ID_WINDOW,
+               classify_conflicts=False, repo_locks=None):
     self.base_path = base_path
     self.hadoop_repo_path = os.path.join(self.base_path, 'hadoop')
+    self.backend_type = backend_type
+    self.max_conflict_details = max_conflict_details
+    # Raw git apply output of conflicts is written to files instead of being kept in memory
+    self.conflict_output_store = ConflictOutputStore(log_dir) if log_dir else None
+    self.apply_verdict_cache = ApplyVerdictCache()
+    self.conflict_classifier = ConflictClassifier(self.hadoop_repo_path) if classify_conflicts else None
+    self.committed_patch_id_index = None
+    if patch_id_window > 0:
+      self.committed_patch_id_index = CommittedPatchIdIndex(self.hadoop_repo_path,
+                                                            os.path.join(self.base_path, PATCH_ID_INDEX_DIR_NAME),
+                                                            window=patch_id_window)
+    # Locks of fetches and worktree registrations, if the repository is shared by concurrent runs
+    self.repo_locks = repo_locks
+    # Worktree of the apply area of this run, patches are applied there, the working tree of the shared repository
+    # is not used
+    self.apply_worktree = None
+    self.repo = None
+    self.backend = None
     self._ensure_base_path_exists()
 
   def _ensure_base_path_exists(self):
@@ -23,6 +51,11 @@ class GitWrapper:
       os.mkdir(self.base_path)
       
   def sync_hadoop(self, fetch=True):
+    with self.repo_locks.fetch if self.repo_locks else nullcontext():
+      self._sync_hadoop(fetch)
+    self.backend = create_git_backend(self.backend_type, self.hadoop_repo_path, repo=self.repo)
+
+  def _sync_hadoop(self, fetch):
     if not os.path.exists(self.hadoop_repo_path):
       # Do initial clone
       LOG.info("Cloning Hadoop for the first time, into directory: %s", self.hadoop_repo_path)
@@ -38,85 +71,150 @@ class GitWrapper:
         for fetch_info in origin.fetch(progress=ProgressPrinter("fetch")):
           LOG.debug("Updated %s to %s", fetch_info.ref, fetch_info.commit)
 
-  def is_branch_exist(self, branch: str, exc_info=True):
-    try:
-      self.repo.git.rev_parse("--verify", branch)
+  def set_apply_area(self, apply_area_path, branch):
+    refs_lock = self.repo_locks.refs if self.repo_locks else None
+    worktree_manager = WorktreeManager(self.hadoop_repo_path, apply_area_path, lock=refs_lock)
+    self.apply_worktree = worktree_manager.get_worktree("apply", "origin/" + branch)
+
+  def is_branch_exist(self, branch: str):
+    if self.backend.resolve_commit(branch):
       return True
-    except GitCommandError:
-      LOG.exception("Branch does not exist", exc_info=exc_info)
-      return False
+    LOG.error("Branch does not exist: %s", branch)
+    return False
 
   def validate_branches(self, branches):
     if not self.repo:
       raise ValueError("Repository is not yet synced! Please invoke sync_hadoop method before this method!")
     for branch in branches:
-      Repo.rev_parse(self.repo, "origin/" + branch)
+      if not self.backend.resolve_commit("origin/" + branch):
+        raise ValueError("Remote branch does not exist: origin/{}".format(branch))
         
   def apply_patch(self, patch):
     if not isinstance(patch, HadoopJiraPatch):
       raise ValueError('patch must be an instance of JiraPatch!')
     if not self.repo:
       raise ValueError("Repository is not yet synced! Please invoke sync_hadoop method before this method!")
+    if not self.apply_worktree:
+      raise ValueError("Apply area is not set! Please invoke set_apply_area method before this method!")
     
     LOG.info("Applying patch %s on branches: %s", patch.filename, patch.target_branches)
     LOG.debug("Applying patch %s", patch)
     
     results = []
     for branch in patch.target_branches:
-      patch_branch_name = "{prefix}-{branch}-{filename}"\
-        .format(prefix=BRANCH_PREFIX, branch=branch, filename=patch.filename)
       target_branch = "origin/" + branch
-
       if not patch.is_applicable_for_branch(branch):
-        LOG.warning("Patch %s is not applicable on branch %s! Reason: %s!", patch, branch, patch.get_reason_for_non_applicability(branch))
-        results.append(PatchApply(patch, target_branch, PatchStatus.PATCH_ALREADY_COMMITTED))
+        results.append(self._create_non_applicable_patch_apply(patch, branch, target_branch))
         continue
-      
-      # If branch already exists, move it to target_branch
-      if patch_branch_name in self.repo.heads:
-        LOG.info("Patch branch already exists with name %s, moving branch pointer to %s", patch_branch_name, target_branch)
-        patch_branch = self.repo.heads[patch_branch_name]
-        patch_branch.set_commit(target_branch)
-      else:
-        patch_branch = self.repo.create_head(patch_branch_name, target_branch)
-  
-      self.repo.head.reference = patch_branch
-      self.cleanup()
-      try:
-        LOG.debug("[%s] Applying patch %s to branch: %s...", patch.issue_id, patch.filename, target_branch)
-        status, stdout, stderr = self.repo.git.execute(['git', 'apply', patch.file_path], with_extended_output=True)
-        self.log_git_exec(status, stderr, stdout)
-        if status == 0:
-          LOG.info("[%s] Successfully applied patch %s to branch: %s.", patch.issue_id, patch.filename, target_branch)
-          results.append(PatchApply(patch, target_branch, PatchStatus.APPLIES_CLEANLY))
-        else:
-          LOG.error("Something bad happened")
-          self.log_git_exec(status, stderr, stdout, level=logging.INFO)
-      except GitCommandError as gce:
-        if "patch does not apply" in gce.stderr:
-          LOG.info("[%s] Patch %s does not apply to %s!" % (patch.issue_id, patch.filename, target_branch))
-          self.log_git_exec(gce.status, gce.stderr, gce.stdout)
-          
-          conflicts = GitUtils.get_number_of_conflicts_from_str(gce.stderr)
-          results.append(PatchApply(patch, target_branch, PatchStatus.CONFLICT, conflicts=conflicts, conflict_details=gce.stderr))
-        else:
-          results.append(PatchApply(patch, target_branch, PatchStatus.UNKNOWN_ERROR))
+      results.append(self.apply_patch_in_worktree(patch, branch, self.apply_worktree))
 
     return results
 
-  def cleanup(self):
-    self.repo.head.reset(index=True, working_tree=True)
-    self.repo.git.clean('-xdfq')
+  def apply_patch_in_worktree(self, patch, branch, worktree_path):
+    # Does not touch HEAD and the working tree of the main repository, so it can run concurrently
+    # for different branches, as long as each branch has its own worktree.
+    target_branch = "origin/" + branch
+    if not patch.is_applicable_for_branch(branch):
+      return self._create_non_applicable_patch_apply(patch, branch, target_branch)
 
-  def log_git_exec(self, status, stderr, stdout, level=logging.DEBUG):
-    if level == logging.DEBUG:
-      LOG.debug("Status of git command: %s", status)
-      LOG.debug("stdout of git command: %s", stdout)
-      LOG.debug("stderr of git command: %s", stderr)
+    def apply_in_worktree(patch, branch, target_branch):
+      WorktreeManager.reset(worktree_path, target_branch)
+      LOG.debug("[%s] Applying patch %s to branch: %s in worktree %s...",
+                patch.issue_id, patch.filename, target_branch, worktree_path)
+      status, stdout, stderr = execute_command(['git', 'apply', patch.file_path], worktree_path)
+      return self._create_patch_apply(patch, branch, target_branch, status, stdout, stderr)
+    return self._apply_or_reuse_result(patch, branch, target_branch, apply_in_worktree)
+
+  def _apply_or_reuse_result(self, patch, branch, target_branch, apply_func):
+    if self.committed_patch_id_index and self.committed_patch_id_index.contains(branch, patch.patch_id):
+      LOG.info("[%s] Patch %s has the same content (patch-id: %s) as a recent commit of %s, "
+               "treating it as already committed", patch.issue_id, patch.filename, patch.patch_id, target_branch)
+      return PatchApply(patch, target_branch, PatchStatus.PATCH_ALREADY_COMMITTED)
+
+    branch_tip = self.backend.resolve_commit(target_branch) if patch.patch_id else None
+    verdict = self.apply_verdict_cache.get(patch.patch_id, branch_tip)
+    if verdict:
+      LOG.info("[%s] Identical diff (patch-id: %s) was already applied to %s at %s, reusing result: %s",
+               patch.issue_id, patch.patch_id, target_branch, branch_tip, verdict.result)
+      return PatchApply(patch, target_branch, verdict.result, conflicts=verdict.conflicts,
+                        conflict_details=verdict.conflict_details)
+
+    patch_apply = apply_func(patch, branch, target_branch)
+    if self.conflict_classifier:
+      patch_apply = self.conflict_classifier.classify(patch, target_branch, patch_apply)
+    # Unknown errors can be transient, they are not cached
+    if patch_apply.result != PatchStatus.UNKNOWN_ERROR:
+      self.apply_verdict_cache.put(patch.patch_id, branch_tip, patch_apply)
+    return patch_apply
+
+  def compute_patch_id(self, patch):
+    try:
+      patch.patch_id = compute_patch_id(self.hadoop_repo_path, patch.file_path)
+    except (OSError, ValueError):
+      LOG.exception("[%s] Failed to compute patch-id of patch %s", patch.issue_id, patch.filename)
+      patch.patch_id = None
+    LOG.debug("[%s] patch-id of patch %s: %s", patch.issue_id, patch.filename, patch.patch_id)
+    return patch.patch_id
+
+  @staticmethod
+  def _create_non_applicable_patch_apply(patch, branch, target_branch):
+    LOG.warning("Patch %s is not applicable on branch %s! Reason: %s!", patch, branch, patch.get_reason_for_non_applicability(branch))
+    return PatchApply(patch, target_branch, PatchStatus.PATCH_ALREADY_COMMITTED)
+
+  def _create_patch_apply(self, patch, branch, target_branch, status, stdout, stderr):
+    self.log_git_exec(status, stderr, stdout)
+    if status == 0:
+      LOG.info("[%s] Successfully applied patch %s to branch: %s.", patch.issue_id, patch.filename, target_branch)
+      return PatchApply(patch, target_branch, PatchStatus.APPLIES_CLEANLY)
+    elif "patch does not apply" in stderr:
+      LOG.info("[%s] Patch %s does not apply to %s!" % (patch.issue_id, patch.filename, target_branch))
+      conflicts = GitUtils.get_number_of_conflicts_from_str(stderr)
+      conflict_details = self.parse_conflict_details(patch, branch, stdout, stderr)
+      return PatchApply(patch, target_branch, PatchStatus.CONFLICT, conflicts=conflicts,
+                        conflict_details=conflict_details)
     else:
-      LOG.info("Status of git command: %s", status)
-      LOG.info("stdout of git command: %s", stdout)
-      LOG.info("stderr of git command: %s", stderr)
+      LOG.error("[%s] Unexpected error while applying patch %s to branch: %s", patch.issue_id, patch.filename, target_branch)
+      self.log_git_exec(status, stderr, stdout, level=logging.INFO)
+      return PatchApply(patch, target_branch, PatchStatus.UNKNOWN_ERROR)
+
+  def discover_release_branches(self, pattern, active_days=None):
+    # Remote branches matching pattern, sorted by version, e.g. ['branch-3.1', 'branch-3.2', 'branch-3.3']
+    status, stdout, stderr = self.backend.execute(['git', 'for-each-ref',
+                                                   '--format=%(committerdate:unix) %(refname:lstrip=3)',
+                                                   'refs/remotes/origin/'])
+    self.log_git_exec(status, stderr, stdout)
+    if status != 0:
+      raise ValueError("Failed to list remote branches: {}".format(stderr))
+    min_commit_time = time.time() - active_days * 24 * 60 * 60 if active_days else 0
+    branches = []
+    for line in stdout.splitlines():
+      commit_time, branch = line.split(" ", 1)
+      if re.match(pattern, branch) and int(commit_time) >= min_commit_time:
+        branches.append(branch)
+    branches.sort(key=lambda b: [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', b)])
+    LOG.info("Discovered release branches matching %s: %s", pattern, branches)
+    return branches
+
+  def parse_conflict_details(self, patch, branch, stdout, stderr):
+    conflict_details = ConflictDetailParser.parse(stderr, patch.file_path, max_details=self.max_conflict_details)
+    if self.conflict_output_store:
+      conflict_details.log_file = self.conflict_output_store.save(patch.issue_id, branch, patch.filename,
+                                                                  stdout, stderr)
+      LOG.info("[%s] Saved output of conflicting git apply to %s", patch.issue_id, conflict_details.log_file)
+    LOG.info("[%s] Conflicts of patch %s on branch %s: %s", patch.issue_id, patch.filename, branch, conflict_details)
+    return conflict_details
+
+  def close(self):
+    LOG.info("Apply verdict cache hits: %d, misses: %d", self.apply_verdict_cache.hits, self.apply_verdict_cache.misses)
+    if self.backend:
+      self.backend.close()
+
+  def log_git_exec(self, status, stderr, stdout, level=logging.DEBUG):
+    if not LOG.isEnabledFor(level):
+      return
+    LOG.log(level, "Status of git command: %s", status)
+    LOG.log(level, "stdout of git command: %s", truncate_output(stdout))
+    LOG.log(level, "stderr of git command: %s", truncate_output(stderr))
       
   def get_remote_branches_committed_for_issue(self, issue_id):
     commit_hashes = self._get_commit_hashes(issue_id)
@@ -124,8 +222,7 @@ class GitWrapper:
     return set(remote_branches)
 
   def _get_commit_hashes(self, issue_id):
-    status, stdout, stderr = self.repo.git.execute(['git', 'log', "--oneline", "--all", "--grep", issue_id],
-                                                   with_extended_output=True)
+    status, stdout, stderr = self.backend.execute(['git', 'log', "--oneline", "--all", "--grep", issue_id])
     self.log_git_exec(status, stderr, stdout)
     if status != 0:
       raise ValueError("[%s] Failed to run git log command that finds a Jira issue!")
@@ -145,7 +242,7 @@ class GitWrapper:
     
     remote_branches = []
     for commit in commits:
-      status, stdout, stderr = self.repo.git.execute(['git', 'branch', "-r", "--contains", commit], with_extended_output=True)
+      status, stdout, stderr = self.backend.execute(['git', 'branch', "-r", "--contains", commit])
       self.log_git_exec(status, stderr, stdout)
       if status != 0:
         raise ValueError("[%s] Failed to run git branch command that finds remote branches for commit!")
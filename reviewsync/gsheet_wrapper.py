@@ -0,0 +1,28 @@
+import logging
+
+from googleapiwrapper.google_sheet import GSheetWrapper
+
+LOG = logging.getLogger(__name__)
+
+
+class HadoopGSheetWrapper(GSheetWrapper):
+  def update_issue_cells(self, issue_statuses, update_date_str):
+    # issue_statuses: list of (issue ID, overall status).
+    # Only the cells of these issues are written, with a single request.
+    # GSheetWrapper.update_issues_with_results would write the cells of all issues of the sheet on every call.
+    if not self.sheet:
+      raise ValueError("Sheet data is not yet fetched! Please invoke 'fetch_jira_data' method first!")
+    cells = []
+    for issue_id, overall_status in issue_statuses:
+      cell_update = self.issue_to_cellupdate.get(issue_id)
+      if not cell_update:
+        LOG.info("No cell update will be performed for issue %s", issue_id)
+        continue
+      if self.options.do_update_date:
+        cell_update.update_date_cell.cell.value = update_date_str
+        cells.append(cell_update.update_date_cell.cell)
+      if self.options.do_update_status:
+        cell_update.status_cell.cell.value = overall_status
+        cells.append(cell_update.status_cell.cell)
+    if cells:
+      self.sheet.update_cells(cells)
@@ -0,0 +1,35 @@
+import importlib
+import logging
+import time
+from collections import OrderedDict
+
+LOG = logging.getLogger(__name__)
+
+
+class ImportTimer:
+  # key: module name, value: seconds spent on the first import of the module
+  timings = OrderedDict()
+
+  @classmethod
+  def import_module(cls, name):
+    if name in cls.timings:
+      return importlib.import_module(name)
+    start_time = time.time()
+    module = importlib.import_module(name)
+    cls.timings[name] = time.time() - start_time
+    LOG.debug("Imported module %s in %.3f seconds", name, cls.timings[name])
+    return module
+
+  @classmethod
+  def import_modules(cls, *names):
+    return [cls.import_module(name) for name in names]
+
+  @classmethod
+  def get_total_time(cls):
+    return sum(cls.timings.values())
+
+  @classmethod
+  def log_timings(cls):
+    for name, duration in cls.timings.items():
+      LOG.info("Import of module %s took %.3f seconds", name, duration)
+    LOG.info("Deferred imports took %.3f seconds in total", cls.get_total_time())
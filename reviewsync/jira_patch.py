@@ -1,4 +1,5 @@
 import logging
+import sys
 
 from pythoncommons.jira_wrapper import JiraPatch, PatchOverallStatus
 
@@ -11,14 +12,20 @@ class HadoopJiraPatch(JiraPatch):
     self.issue_id = issue_id
     # TODO owner and owner_short are currently not queried anywhere except __str__
     self.version = version
+    target_branch = sys.intern(target_branch)
     self.target_branches = [target_branch]
     self.applicability = {target_branch: applicability}
     self.overall_status = PatchOverallStatus("N/A")
+    # git patch-id of the downloaded patch file, identifies the content regardless of the filename
+    self.patch_id = None
+    # PatchInfo of the downloaded patch file: size, content hash, touched paths and hunks
+    self.info = None
 
   def get_applicability(self, branch):
     return self.applicability[branch]
 
   def add_additional_branch(self, branch, applicability):
+    branch = sys.intern(branch)
     self.target_branches.append(branch)
     self.applicability[branch] = applicability
 
@@ -1,11 +1,15 @@
 from typing import Dict, List
 
+import os
 import re
 import logging
 
+from jira.exceptions import JIRAError
 from pythoncommons.jira_wrapper import JiraWrapper
 from jira_patch import HadoopJiraPatch
 from patch_apply import PatchApplicability
+from pull_requests import get_pull_request_numbers_from_urls
+from rate_limit import get_host
 
 LOG = logging.getLogger(__name__)
 
@@ -14,9 +18,70 @@ TRUNK_PATCH_FILENAME_PATTERN_TEMPLATE = r'^(\w+-\d+)$SEPCHAR(\d+)\.' + DEFAULT_P
 
 
 class HadoopJiraWrapper(JiraWrapper):
-  def __init__(self, jira_url, default_branch, patches_root, git_wrapper):
+  def __init__(self, jira_url, default_branch, patches_root, git_wrapper, request_scheduler=None):
     super().__init__(jira_url, default_branch, patches_root)
     self.git_wrapper = git_wrapper
+    # Requests to Jira, including attachment downloads, are rate limited and retried by the scheduler if specified
+    self.request_scheduler = request_scheduler
+    self.host = get_host(jira_url)
+
+  def _request(self, func, *args, **kwargs):
+    if not self.request_scheduler:
+      return func(*args, **kwargs)
+    return self.request_scheduler.call(self.host, func, *args, **kwargs)
+
+  def get_jira_issue(self, issue_id):
+    # The client is called directly, JiraWrapper.get_jira_issue would swallow throttling and server errors
+    # before the scheduler could retry them
+    try:
+      return self._request(self.jira.issue, issue_id)
+    except JIRAError:
+      LOG.exception("[%s] Failed to get Jira issue", issue_id)
+      return None
+
+  def download_patch_file(self, patch):
+    return self._request(self._download_patch_file, patch)
+
+  def _download_patch_file(self, patch):
+    # The attachment is written to a temporary file and renamed, so an interrupted download never leaves
+    # a truncated patch file behind, that a resumed run would reuse
+    issue = self.jira.issue(patch.issue_id)
+    attachment = next((a for a in issue.fields.attachment if a.filename == patch.filename), None)
+    if not attachment:
+      raise ValueError("Cannot find attachment with name '{}' for issue {}".format(patch.filename, patch.issue_id))
+    file_path = os.path.join(self.patches_root, patch.issue_id, patch.filename)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    LOG.debug("Downloading patch from issue %s to file %s", patch.issue_id, file_path)
+    # Timeouts are raised to the scheduler, the download is retried with its backoff
+    data = attachment.get()
+    tmp_file_path = "{}.{}.tmp".format(file_path, os.getpid())
+    with open(tmp_file_path, "wb") as f:
+      f.write(data)
+    os.replace(tmp_file_path, file_path)
+    patch.set_patch_file_path(file_path)
+
+  def search_issue_keys(self, jql, start_at, max_results):
+    result_list = self._request(self.jira.search_issues, jql, startAt=start_at, maxResults=max_results, fields="key")
+    return [issue.key for issue in result_list], getattr(result_list, "total", None)
+
+  def get_pull_request_numbers(self, issue_id):
+    urls = [getattr(link.object, "url", None) for link in self._request(self.jira.remote_links, issue_id)]
+    return get_pull_request_numbers_from_urls(urls)
+
+  def create_pull_request_patch(self, issue_id, number, filename, file_path, additional_branches,
+                                committed_on_branches):
+    issue = self.get_jira_issue(issue_id)
+    owner = self.determine_patch_owner(issue)
+    if self.default_branch not in committed_on_branches:
+      applicability = PatchApplicability(True)
+    else:
+      applicability = PatchApplicability(False, "Patch already committed on {}".format(self.default_branch))
+    # Pull requests target the default branch, version of the patch is the PR number
+    patch = HadoopJiraPatch(issue_id, owner, number, self.default_branch, filename, applicability)
+    patch.file_path = file_path
+    self._map_patches_for_additional_branches(additional_branches, {self.default_branch: patch},
+                                              committed_on_branches, issue_id)
+    return patch
 
   def get_patches_per_branch(self, issue_id, additional_branches, committed_on_branches):
     issue = self.get_jira_issue(issue_id)
@@ -103,6 +168,28 @@ class HadoopJiraWrapper(JiraWrapper):
     LOG.info("Found patches from all issues, after all filters applied: %s", dedup_patches)
     return dedup_patches
 
+  @staticmethod
+  def deduplicate_patches_by_patch_id(issue_id, patches):
+    # Patches with the same content (e.g. same diff attached for trunk and for a branch) are applied only once:
+    # target branches of the duplicates are moved to the first patch with the same patch-id.
+    patches_by_patch_id = {}
+    dedup_patches = []
+    for patch in patches:
+      if not patch.patch_id:
+        dedup_patches.append(patch)
+        continue
+      if patch.patch_id not in patches_by_patch_id:
+        patches_by_patch_id[patch.patch_id] = patch
+        dedup_patches.append(patch)
+        continue
+      kept_patch = patches_by_patch_id[patch.patch_id]
+      LOG.info("[%s] Patch %s has the same content as patch %s (patch-id: %s), merging target branches: %s",
+               issue_id, patch.filename, kept_patch.filename, patch.patch_id, patch.target_branches)
+      for branch in patch.target_branches:
+        if branch not in kept_patch.target_branches:
+          kept_patch.add_additional_branch(branch, patch.get_applicability(branch))
+    return dedup_patches
+
   def create_jira_patch_obj(self, issue_id, filename, owner, committed_on_branches):
     sep_char = self._get_separator_char_from_patch_filename(filename)
     if not sep_char:
@@ -0,0 +1,88 @@
+import logging
+import queue
+import re
+import threading
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_JQL_PAGE_SIZE = 100
+DEFAULT_PREFETCHED_PAGES = 2
+_END_OF_STREAM = object()
+ORDER_BY_PATTERN = re.compile(r'\border\s+by\s+(.*)$', re.IGNORECASE | re.DOTALL)
+KEY_FIELD_PATTERN = re.compile(r'\b(?:key|issuekey)\b', re.IGNORECASE)
+
+
+def get_stable_jql(jql):
+  # Pages are fetched by offset, issues are ordered by key (after the ordering of the query, if any),
+  # so issues updated during the fetch don't move between pages
+  match = ORDER_BY_PATTERN.search(jql)
+  if not match:
+    return jql + " ORDER BY key"
+  if KEY_FIELD_PATTERN.search(match.group(1)):
+    return jql
+  return jql + ", key"
+
+
+class JqlIssueStream:
+  # Iterates over the issue keys matching a JQL query.
+  # Pages are fetched by a background thread, so processing of the first page can start
+  # while the next pages are still being fetched.
+  def __init__(self, jira_wrapper, jql, page_size=DEFAULT_JQL_PAGE_SIZE, prefetched_pages=DEFAULT_PREFETCHED_PAGES):
+    self.jira_wrapper = jira_wrapper
+    self.jql = get_stable_jql(jql)
+    self.page_size = page_size
+    self.pages = queue.Queue(maxsize=prefetched_pages)
+    self.fetched_issues = 0
+    self._stopped = threading.Event()
+    self._thread = None
+
+  def start(self):
+    if not self._thread:
+      self._thread = threading.Thread(target=self._fetch_pages, name="jql-fetcher", daemon=True)
+      self._thread.start()
+    return self
+
+  def stop(self):
+    self._stopped.set()
+
+  def _fetch_pages(self):
+    start_at = 0
+    try:
+      while not self._stopped.is_set():
+        keys, total = self.jira_wrapper.search_issue_keys(self.jql, start_at, self.page_size)
+        LOG.info("Fetched %d issues (%d-%d of %s) for JQL: %s",
+                 len(keys), start_at + 1, start_at + len(keys), total, self.jql)
+        if keys:
+          self._put(keys)
+        start_at += len(keys)
+        # Jira may return fewer issues than page_size, even if there are more pages
+        if not keys or (total is not None and start_at >= total):
+          break
+    except Exception as e:
+      LOG.exception("Failed to fetch issues for JQL: %s", self.jql)
+      self._put(e)
+    finally:
+      self._put(_END_OF_STREAM)
+
+  def _put(self, item):
+    while not self._stopped.is_set():
+      try:
+        self.pages.put(item, timeout=1)
+        return
+      except queue.Full:
+        continue
+
+  def __iter__(self):
+    self.start()
+    try:
+      while True:
+        page = self.pages.get()
+        if page is _END_OF_STREAM:
+          return
+        if isinstance(page, Exception):
+          raise page
+        for key in page:
+          self.fetched_issues += 1
+          yield key
+    finally:
+      self.stop()
@@ -0,0 +1,97 @@
+import fcntl
+import itertools
+import logging
+import os
+import threading
+import time
+import zlib
+
+LOG = logging.getLogger(__name__)
+
+LOCKS_DIR_NAME = "locks"
+APPLY_AREA_DIR_NAME = "apply-areas"
+PATCH_LOCK_STRIPES = 64
+
+
+class FileLock:
+  # Exclusive lock shared by concurrent reviewsync processes (flock on a lock file)
+  # and by the threads of a process (threading.Lock).
+  def __init__(self, file_path):
+    self.file_path = file_path
+    self._thread_lock = threading.Lock()
+    self._fd = None
+
+  def acquire(self, blocking=True):
+    if not self._thread_lock.acquire(blocking):
+      return False
+    try:
+      fd = os.open(self.file_path, os.O_RDWR | os.O_CREAT, 0o644)
+      try:
+        start_time = time.time()
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+      except BlockingIOError:
+        os.close(fd)
+        self._thread_lock.release()
+        return False
+      waited = time.time() - start_time
+      if waited > 1:
+        LOG.info("Waited %.1f seconds for lock %s", waited, self.file_path)
+      self._fd = fd
+      return True
+    except BaseException:
+      self._thread_lock.release()
+      raise
+
+  def release(self):
+    fd = self._fd
+    self._fd = None
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+    self._thread_lock.release()
+
+  def __enter__(self):
+    self.acquire()
+    return self
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    self.release()
+
+
+class RepoLocks:
+  # Locks of the state shared by concurrent runs under the same reviewsync root.
+  # Only fetches and worktree registrations of the shared repository, and downloads into the shared patch cache are locked,
+  # patches are applied in the apply area of each run.
+  def __init__(self, locks_dir):
+    self.locks_dir = locks_dir
+    os.makedirs(locks_dir, exist_ok=True)
+    self.fetch = FileLock(os.path.join(locks_dir, "fetch.lock"))
+    self.refs = FileLock(os.path.join(locks_dir, "refs.lock"))
+    # Fixed number of lock files for patch downloads, an issue is mapped to one of them by the hash of its ID.
+    # crc32 is used as it is the same in every process, unlike hash() of str.
+    self._patch_locks = [FileLock(os.path.join(locks_dir, "patches-{}.lock".format(stripe)))
+                         for stripe in range(PATCH_LOCK_STRIPES)]
+
+  def patch_download(self, issue_id):
+    return self._patch_locks[zlib.crc32(issue_id.encode("utf-8")) % len(self._patch_locks)]
+
+
+class ApplyArea:
+  # Directory where a run applies patches, exclusively owned by the run while it holds the lock of the area.
+  # Areas are numbered, a run takes the first one not used by another run, so the worktrees of an area
+  # are reused by later runs.
+  def __init__(self, path, lock):
+    self.path = path
+    self.lock = lock
+
+  @classmethod
+  def acquire(cls, apply_areas_root):
+    os.makedirs(apply_areas_root, exist_ok=True)
+    for number in itertools.count():
+      lock = FileLock(os.path.join(apply_areas_root, "area-{}.lock".format(number)))
+      if lock.acquire(blocking=False):
+        path = os.path.join(apply_areas_root, "area-{}".format(number))
+        LOG.info("Using apply area: %s", path)
+        return cls(path, lock)
+
+  def release(self):
+    self.lock.release()
@@ -0,0 +1,71 @@
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from patch_apply import PatchStatus
+from worktrees import WorktreeManager
+
+LOG = logging.getLogger(__name__)
+
+WORKTREES_DIR_NAME = "worktrees"
+REMOTE_PREFIX = "origin/"
+
+MATRIX_CELL_VALUES = {
+  PatchStatus.APPLIES_CLEANLY: "OK",
+  PatchStatus.CONFLICT: "CONFLICT",
+  PatchStatus.PATCH_ALREADY_COMMITTED: "COMMITTED",
+  PatchStatus.UNKNOWN_ERROR: "ERROR",
+  PatchStatus.CANNOT_FIND_PATCH: "NO PATCH",
+  PatchStatus.PARTIALLY_APPLIED: "PARTIAL",
+  PatchStatus.THREE_WAY_CLEAN: "3WAY",
+}
+
+
+class BackportMatrix:
+  def __init__(self, git_wrapper, branches, worktrees_root, max_workers=None):
+    self.git_wrapper = git_wrapper
+    self.branches = branches
+    refs_lock = git_wrapper.repo_locks.refs if git_wrapper.repo_locks else None
+    worktree_manager = WorktreeManager(git_wrapper.hadoop_repo_path, worktrees_root, lock=refs_lock)
+    # Each branch has its own worktree, applies on different branches can run concurrently
+    self.worktrees = {branch: worktree_manager.get_worktree(branch, REMOTE_PREFIX + branch) for branch in branches}
+    self.worktree_locks = {branch: threading.Lock() for branch in branches}
+    self.executor = ThreadPoolExecutor(max_workers=max_workers or len(branches))
+
+  def apply_patches(self, patches):
+    futures = []
+    for patch in patches:
+      for branch in patch.target_branches:
+        # Target branches come from the filenames of patches, e.g. YARN-1.branch-2.10.001.patch
+        if branch not in self.worktrees:
+          LOG.info("[%s] Skipping patch %s on branch %s, it is not part of the backport matrix: %s",
+                   patch.issue_id, patch.filename, branch, self.branches)
+          continue
+        futures.append(self.executor.submit(self._apply_patch, patch, branch))
+    # Results are returned in the same order as the serial apply loop would produce them
+    return [future.result() for future in futures]
+
+  def _apply_patch(self, patch, branch):
+    with self.worktree_locks[branch]:
+      return self.git_wrapper.apply_patch_in_worktree(patch, branch, self.worktrees[branch])
+
+  def close(self):
+    self.executor.shutdown()
+
+  @staticmethod
+  def convert_data_for_matrix_printer(results, branches):
+    headers = ["Issue"] + branches
+    # key: issue ID, value: dict of branch -> cell value
+    cells_per_issue = OrderedDict()
+    for record in results.iter_records():
+      branch = record["branch"]
+      if branch.startswith(REMOTE_PREFIX):
+        branch = branch[len(REMOTE_PREFIX):]
+      cell = MATRIX_CELL_VALUES[PatchStatus[record["result"]]]
+      if record["conflicts"]:
+        cell = "{} ({})".format(cell, record["conflicts"])
+      cells_per_issue.setdefault(record["issue"], {})[branch] = cell
+    data = [[issue_id] + [cells.get(branch, "-") for branch in branches]
+            for issue_id, cells in cells_per_issue.items()]
+    return data, headers
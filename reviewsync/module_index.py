@@ -0,0 +1,154 @@
+import json
+import logging
+import os
+import threading
+
+from git_backend import execute_command
+
+LOG = logging.getLogger(__name__)
+
+MODULE_INDEX_DIR_NAME = "module-index"
+POM_FILENAME = "pom.xml"
+ROOT_MODULE = "."
+TEST_SOURCE_DIR = "src/test/"
+TEST_FILE_SUFFIXES = (".java", ".scala")
+
+
+class _TrieNode:
+  __slots__ = ('children', 'module')
+
+  def __init__(self):
+    self.children = {}
+    # Directory of the Maven module if this node is a module directory
+    self.module = None
+
+
+class ModuleTrie:
+  # Prefix trie of path components, lookups take O(depth of the path)
+  def __init__(self):
+    self.root = _TrieNode()
+
+  def insert(self, module_dir):
+    node = self.root
+    for part in _split(module_dir):
+      node = node.children.setdefault(part, _TrieNode())
+    node.module = module_dir or ROOT_MODULE
+
+  def find(self, path):
+    # Returns the directory of the deepest module containing the path
+    node = self.root
+    module = node.module
+    for part in _split(os.path.dirname(path)):
+      node = node.children.get(part)
+      if node is None:
+        break
+      if node.module is not None:
+        module = node.module
+    return module
+
+
+class ModuleImpact:
+  __slots__ = ('modules', 'tests')
+
+  def __init__(self, modules, tests):
+    # Directories of the Maven modules touched by a patch
+    self.modules = modules
+    # Number of test source files in the touched modules
+    self.tests = tests
+
+  @property
+  def module_names(self):
+    return [os.path.basename(module) if module != ROOT_MODULE else module for module in self.modules]
+
+  def __repr__(self):
+    return repr((self.modules, self.tests))
+
+
+class MavenModuleIndex:
+  __slots__ = ('test_counts', 'trie')
+
+  def __init__(self, test_counts):
+    # key: module directory, value: number of test source files of the module
+    self.test_counts = test_counts
+    self.trie = ModuleTrie()
+    for module_dir in test_counts:
+      self.trie.insert("" if module_dir == ROOT_MODULE else module_dir)
+
+  @classmethod
+  def build(cls, paths):
+    paths = list(paths)
+    module_dirs = [os.path.dirname(path) or ROOT_MODULE for path in paths
+                   if path == POM_FILENAME or path.endswith("/" + POM_FILENAME)]
+    index = cls({module_dir: 0 for module_dir in module_dirs})
+    for path in paths:
+      if _is_test_file(path):
+        module = index.trie.find(path)
+        if module is not None:
+          index.test_counts[module] += 1
+    return index
+
+  def get_module(self, path):
+    return self.trie.find(path)
+
+  def get_impact(self, paths):
+    modules = sorted({module for module in map(self.get_module, paths) if module is not None})
+    return ModuleImpact(modules, sum(self.test_counts[module] for module in modules))
+
+  def to_dict(self):
+    return {"test_counts": self.test_counts}
+
+  @classmethod
+  def from_dict(cls, data):
+    return cls(data["test_counts"])
+
+
+class MavenModuleIndexStore:
+  # Module indexes are built from the tree objects of the repository, without checkouts.
+  # They are cached by tree SHA, in memory and in index_dir, so a branch tip is only indexed once.
+  def __init__(self, repo_path, index_dir):
+    self.repo_path = repo_path
+    self.index_dir = index_dir
+    self._indexes = {}
+    self._lock = threading.Lock()
+
+  def get_index(self, rev):
+    status, tree_sha, stderr = execute_command(['git', 'rev-parse', '--verify', rev + "^{tree}"], self.repo_path)
+    if status != 0:
+      LOG.warning("Cannot resolve tree of %s: %s", rev, stderr)
+      return None
+    with self._lock:
+      if tree_sha not in self._indexes:
+        self._indexes[tree_sha] = self._load(tree_sha) or self._build(tree_sha)
+      return self._indexes[tree_sha]
+
+  def _load(self, tree_sha):
+    index_file = os.path.join(self.index_dir, tree_sha + ".json")
+    if not os.path.exists(index_file):
+      return None
+    try:
+      with open(index_file, "r") as f:
+        return MavenModuleIndex.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError):
+      LOG.warning("Ignoring invalid module index file: %s", index_file)
+      return None
+
+  def _build(self, tree_sha):
+    status, stdout, stderr = execute_command(['git', 'ls-tree', '-r', '-z', '--name-only', tree_sha], self.repo_path)
+    if status != 0:
+      raise ValueError("Failed to list tree {}: {}".format(tree_sha, stderr))
+    index = MavenModuleIndex.build(path for path in stdout.split("\0") if path)
+    LOG.info("Built Maven module index of tree %s: %d modules", tree_sha, len(index.test_counts))
+    os.makedirs(self.index_dir, exist_ok=True)
+    tmp_file = os.path.join(self.index_dir, "{}.json.{}.tmp".format(tree_sha, os.getpid()))
+    with open(tmp_file, "w") as f:
+      json.dump(index.to_dict(), f)
+    os.replace(tmp_file, os.path.join(self.index_dir, tree_sha + ".json"))
+    return index
+
+
+def _split(path):
+  return [part for part in path.split("/") if part]
+
+
+def _is_test_file(path):
+  return TEST_SOURCE_DIR in path and path.endswith(TEST_FILE_SUFFIXES)
@@ -1,50 +1,71 @@
+import sys
+from enum import Enum
+
 from pythoncommons.git_utils import GitUtils
 
 
 class PatchApply:
+  # Instances are created for every issue x branch combination, slots keep them small
+  __slots__ = ('patch', 'branch', 'explicit', 'result', 'conflicts', 'conflict_details', 'module_impact')
+
   def __init__(self, patch, branch, result, conflicts=0, conflict_details=None):
     self.patch = patch
-    self.branch = branch
+    self.branch = sys.intern(branch)
     local_branch = GitUtils.convert_remote_branch_name_to_local(branch)
     if patch:
       self.explicit = patch.get_applicability(local_branch).explicit
     else:
       self.explicit = None
 
-    if result not in PatchStatus.ALLOWED_VALUES:
+    if not isinstance(result, PatchStatus):
       raise ValueError('result must be a value found in PatchStatus!')
     
-    if result != PatchStatus.CONFLICT and conflicts > 0:
-      raise ValueError("Number of conflicts should be specified only if value of result is 'PatchStatus.CONFLICT'!")
-    if result != PatchStatus.CONFLICT and conflict_details and len(conflict_details) > 0:
-      raise ValueError("Conflict details should be specified only if value of result is 'PatchStatus.CONFLICT'!")
+    if result not in CONFLICTING_STATUSES and conflicts > 0:
+      raise ValueError("Number of conflicts should be specified only if value of result is one of {}!"
+                       .format(CONFLICTING_STATUSES))
+    if result not in CONFLICTING_STATUSES and conflict_details and len(conflict_details) > 0:
+      raise ValueError("Conflict details should be specified only if value of result is one of {}!"
+                       .format(CONFLICTING_STATUSES))
     
     self.result = result
     self.conflicts = conflicts
     self.conflict_details = conflict_details
+    # ModuleImpact of a cleanly applying patch on the branch, if test impact preview is enabled
+    self.module_impact = None
 
   def __repr__(self):
     return repr((self.patch, self.branch, self.result, self.conflicts, self.conflict_details))
 
   def __str__(self):
     return self.__class__.__name__ + \
-           " { patch: " + self.patch + \
+           " { patch: " + str(self.patch) + \
            ", branch: " + str(self.branch) + \
            ", result: " + str(self.result) + \
-           ", conflicts: " + str(self.conflicts) + " }"
+           ", conflicts: " + str(self.conflicts) + \
+           ", conflict details: " + str(self.conflict_details) + " }"
 
 
-class PatchStatus:
+class PatchStatus(Enum):
   APPLIES_CLEANLY = "APPLIES CLEANLY"
   CONFLICT = "CONFLICT"
   PATCH_ALREADY_COMMITTED = "PATCH_ALREADY_COMMITTED"
   UNKNOWN_ERROR = "UNKNOWN_ERROR"
   CANNOT_FIND_PATCH = "CANNOT FIND PATCH - POSSIBLE PULL REQUEST?"
+  # Statuses below are only used for conflicting patches, if conflict classification is enabled
+  PARTIALLY_APPLIED = "PARTIALLY_APPLIED"
+  THREE_WAY_CLEAN = "3WAY_CLEAN"
+
+  def __str__(self):
+    return self.value
+
 
-  ALLOWED_VALUES = {APPLIES_CLEANLY, CONFLICT, PATCH_ALREADY_COMMITTED, UNKNOWN_ERROR, CANNOT_FIND_PATCH}
+# git apply failed for these statuses, so they can have conflicts
+CONFLICTING_STATUSES = {PatchStatus.CONFLICT, PatchStatus.PARTIALLY_APPLIED, PatchStatus.THREE_WAY_CLEAN}
 
 
 class PatchApplicability:
+  __slots__ = ('applicable', 'explicit', 'reason')
+
   def __init__(self, applicable, reason=None, explicit=True):
     self.applicable = applicable
     self.explicit = explicit
@@ -58,4 +79,4 @@ class PatchApplicability:
   def __str__(self):
     return self.__class__.__name__ + \
            " { applicable: " + str(self.applicable) + \
-           ", reason: " + self.reason + " }"
+           ", reason: " + str(self.reason) + " }"
@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import subprocess
+import threading
+
+from git_backend import execute_command
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_PATCH_ID_WINDOW = 2000
+PATCH_ID_INDEX_DIR_NAME = "patch-id-index"
+
+
+def compute_patch_id(repo_path, patch_file_path):
+  # Stable patch-id: does not depend on hunk order, whitespace-only changes of the diff or
+  # on the file name / version number of the patch file.
+  # Format-patch files have a patch-id per commit, they are combined to the patch-id of the squashed commits.
+  with open(patch_file_path, "rb") as f:
+    patch_content = f.read()
+  patch_ids = [patch_id for _, patch_id in _run_patch_id(repo_path, patch_content.decode("utf-8", errors="replace"))]
+  if not patch_ids:
+    return None
+  return patch_ids[0] if len(patch_ids) == 1 else combine_patch_ids(patch_ids)
+
+
+def compute_patch_ids_from_diff(repo_path, diff):
+  # key: commit hash (None for a plain diff), value: patch-id
+  return {commit: patch_id for commit, patch_id in _run_patch_id(repo_path, diff)}
+
+
+def combine_patch_ids(patch_ids):
+  # Stable patch-ids are the sum of the SHA-1 of each file diff, added byte by byte with carry,
+  # so the sum of the patch-ids of commits touching different files is the patch-id of their squashed diff
+  result = [0] * 20
+  for patch_id in patch_ids:
+    carry = 0
+    for idx, byte in enumerate(bytes.fromhex(patch_id)):
+      carry += result[idx] + byte
+      result[idx] = carry & 0xff
+      carry >>= 8
+  return bytes(result).hex()
+
+
+def _run_patch_id(repo_path, diff):
+  # List of (commit hash or None for a plain diff, patch-id)
+  status, stdout, stderr = execute_command(['git', 'patch-id', '--stable'], repo_path, input=diff)
+  if status != 0:
+    raise ValueError("Failed to compute patch-id: {}".format(stderr))
+  patch_ids = []
+  for line in stdout.splitlines():
+    parts = line.split(" ")
+    if len(parts) == 2:
+      commit = None if parts[1].strip("0") == "" else parts[1]
+      patch_ids.append((commit, parts[0]))
+  return patch_ids
+
+
+class ApplyVerdict:
+  __slots__ = ('result', 'conflicts', 'conflict_details')
+
+  def __init__(self, result, conflicts, conflict_details):
+    self.result = result
+    self.conflicts = conflicts
+    self.conflict_details = conflict_details
+
+
+class ApplyVerdictCache:
+  # Results of git apply keyed by (patch-id, commit hash of branch tip):
+  # identical diffs are only applied once per branch tip, regardless of the patch file name or the issue.
+  def __init__(self):
+    self.verdicts = {}
+    self.hits = 0
+    self.misses = 0
+    self._lock = threading.Lock()
+
+  def get(self, patch_id, branch_tip):
+    if not patch_id or not branch_tip:
+      return None
+    with self._lock:
+      verdict = self.verdicts.get((patch_id, branch_tip))
+      if verdict:
+        self.hits += 1
+      else:
+        self.misses += 1
+      return verdict
+
+  def put(self, patch_id, branch_tip, patch_apply):
+    if not patch_id or not branch_tip:
+      return
+    with self._lock:
+      self.verdicts[(patch_id, branch_tip)] = ApplyVerdict(patch_apply.result, patch_apply.conflicts,
+                                                           patch_apply.conflict_details)
+
+
+class CommittedPatchIdIndex:
+  # patch-ids of the last <window> non-merge commits of each remote branch, persisted per branch and
+  # updated incrementally when the branch tip moves forward.
+  # Used to detect patches that were committed with a typo'd issue key in the commit message or squashed.
+  def __init__(self, repo_path, index_dir, window=DEFAULT_PATCH_ID_WINDOW):
+    self.repo_path = repo_path
+    self.index_dir = index_dir
+    self.window = window
+    # key: branch, value: set of patch-ids
+    self.patch_ids_per_branch = {}
+    # Indexes of branches are built under their own locks, lookups on loaded branches don't wait for other builds
+    self._branch_locks = {}
+    self._lock = threading.Lock()
+
+  def contains(self, branch, patch_id):
+    if not patch_id:
+      return False
+    patch_ids = self.patch_ids_per_branch.get(branch)
+    if patch_ids is None:
+      with self._get_branch_lock(branch):
+        patch_ids = self.patch_ids_per_branch.get(branch)
+        if patch_ids is None:
+          patch_ids = set(self._load_or_build(branch))
+          self.patch_ids_per_branch[branch] = patch_ids
+    return patch_id in patch_ids
+
+  def _get_branch_lock(self, branch):
+    with self._lock:
+      return self._branch_locks.setdefault(branch, threading.Lock())
+
+  def _load_or_build(self, branch):
+    remote_branch = "origin/" + branch
+    status, tip, stderr = execute_command(['git', 'rev-parse', '--verify', remote_branch + "^{commit}"], self.repo_path)
+    if status != 0:
+      raise ValueError("Cannot resolve branch {}: {}".format(remote_branch, stderr))
+
+    index_file = os.path.join(self.index_dir, branch.replace("/", "_") + ".json")
+    stored = self._read_index_file(index_file)
+    if stored and stored["window"] == self.window and stored["tip"] == tip:
+      LOG.debug("patch-id index of %s is up-to-date at %s", branch, tip)
+      return stored["patch_ids"]
+
+    if stored and stored["window"] == self.window and self._is_ancestor(stored["tip"], tip):
+      LOG.info("Updating patch-id index of %s from %s to %s", branch, stored["tip"], tip)
+      new_patch_ids = self._compute_commit_patch_ids("{}..{}".format(stored["tip"], tip))
+      # Both lists are ordered newest first
+      patch_ids = (new_patch_ids + stored["patch_ids"])[:self.window]
+    else:
+      LOG.info("Building patch-id index of the last %d commits of %s", self.window, branch)
+      patch_ids = self._compute_commit_patch_ids(tip)
+
+    os.makedirs(self.index_dir, exist_ok=True)
+    tmp_file = "{}.{}.tmp".format(index_file, os.getpid())
+    with open(tmp_file, "w") as f:
+      json.dump({"tip": tip, "window": self.window, "patch_ids": patch_ids}, f)
+    os.replace(tmp_file, index_file)
+    return patch_ids
+
+  @staticmethod
+  def _read_index_file(index_file):
+    if not os.path.exists(index_file):
+      return None
+    try:
+      with open(index_file) as f:
+        return json.load(f)
+    except (OSError, ValueError):
+      LOG.exception("Failed to read patch-id index file %s, rebuilding it", index_file)
+      return None
+
+  def _is_ancestor(self, commit, descendant):
+    status, _, _ = execute_command(['git', 'merge-base', '--is-ancestor', commit, descendant], self.repo_path)
+    return status == 0
+
+  def _compute_commit_patch_ids(self, rev_range):
+    # Streams git log -p into git patch-id, the full log output is never held in memory
+    log_proc = subprocess.Popen(['git', 'log', '-p', '--no-merges', '--no-color', '--no-ext-diff',
+                                 '--max-count={}'.format(self.window), rev_range],
+                                cwd=self.repo_path, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    patch_id_proc = subprocess.Popen(['git', 'patch-id', '--stable'], cwd=self.repo_path, stdin=log_proc.stdout,
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    log_proc.stdout.close()
+    stdout, stderr = patch_id_proc.communicate()
+    log_status = log_proc.wait()
+    if log_status != 0 or patch_id_proc.returncode != 0:
+      raise ValueError("Failed to compute patch-ids for {}: {}".format(rev_range, stderr))
+    return [line.split(" ")[0] for line in stdout.splitlines() if line]
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+
+LOG = logging.getLogger(__name__)
+
+INDEX_FILE_SUFFIX = ".index.json"
+DEV_NULL = "/dev/null"
+SOURCE_DIR_NAME = "src"
+
+# Matches the diff headers of a patch: file headers of git diffs, ---/+++ file header pairs and hunk headers.
+# A --- line is only a file header if it is followed by a +++ line, otherwise it is a removed line of a hunk.
+DIFF_HEADER_PATTERN = re.compile(rb'^(?:diff --git a/(\S+) b/(\S+)|--- ([^\t\n]+)[^\n]*\n\+\+\+ ([^\t\n]+)|(@@ ))',
+                                 re.MULTILINE)
+
+
+class PatchInfo:
+  __slots__ = ('size', 'sha256', 'hunks')
+
+  def __init__(self, size, sha256, hunks):
+    self.size = size
+    self.sha256 = sha256
+    # key: touched path, value: number of hunks, in the order of the patch
+    self.hunks = hunks
+
+  @property
+  def paths(self):
+    return list(self.hunks)
+
+  @property
+  def total_hunks(self):
+    return sum(self.hunks.values())
+
+  @property
+  def modules(self):
+    return sorted({get_module(path) for path in self.hunks})
+
+  def to_dict(self):
+    return {"size": self.size, "sha256": self.sha256, "hunks": self.hunks}
+
+  @classmethod
+  def from_dict(cls, data):
+    return cls(data["size"], data["sha256"], data["hunks"])
+
+  def __repr__(self):
+    return repr((self.size, self.sha256, self.hunks))
+
+  def __str__(self):
+    return "{} bytes, {} files, {} hunks, modules: {}".format(self.size, len(self.hunks), self.total_hunks,
+                                                              ", ".join(self.modules))
+
+
+class PatchIndex:
+  # Scans each patch file once through a memory map and stores the result next to the patch file,
+  # so later runs and reports don't need to read the patch again.
+  @classmethod
+  def get(cls, patch_file_path):
+    index_file_path = patch_file_path + INDEX_FILE_SUFFIX
+    info = cls._load(patch_file_path, index_file_path)
+    if info:
+      return info
+    info = cls.scan(patch_file_path)
+    cls._save(index_file_path, info)
+    return info
+
+  @staticmethod
+  def _load(patch_file_path, index_file_path):
+    try:
+      patch_stat = os.stat(patch_file_path)
+      index_stat = os.stat(index_file_path)
+    except OSError:
+      return None
+    # Patch files downloaded again are newer than their index
+    if index_stat.st_mtime < patch_stat.st_mtime:
+      return None
+    try:
+      with open(index_file_path, "r") as f:
+        info = PatchInfo.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError):
+      LOG.warning("Ignoring invalid patch index file: %s", index_file_path)
+      return None
+    return info if info.size == patch_stat.st_size else None
+
+  @staticmethod
+  def _save(index_file_path, info):
+    tmp_file_path = "{}.{}.tmp".format(index_file_path, os.getpid())
+    with open(tmp_file_path, "w") as f:
+      json.dump(info.to_dict(), f)
+    os.replace(tmp_file_path, index_file_path)
+
+  @classmethod
+  def scan(cls, patch_file_path):
+    with open(patch_file_path, "rb") as f:
+      size = os.fstat(f.fileno()).st_size
+      if size == 0:
+        return PatchInfo(0, hashlib.sha256().hexdigest(), {})
+      with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        sha256 = hashlib.sha256(mm).hexdigest()
+        hunks = cls._get_hunks(mm)
+    return PatchInfo(size, sha256, hunks)
+
+  @staticmethod
+  def _get_hunks(data):
+    hunks = {}
+    current_path = None
+    for match in DIFF_HEADER_PATTERN.finditer(data):
+      if match.group(5):
+        if current_path is not None:
+          hunks[current_path] += 1
+        continue
+      if match.group(1):
+        current_path = _decode_path(match.group(2))
+      else:
+        old_path, new_path = _decode_path(match.group(3)), _decode_path(match.group(4))
+        current_path = old_path if new_path == DEV_NULL else new_path
+      hunks.setdefault(current_path, 0)
+    return hunks
+
+
+def _decode_path(path):
+  path = path.decode("utf-8", errors="replace").rstrip()
+  if path.startswith("a/") or path.startswith("b/"):
+    return path[2:]
+  return path
+
+
+def get_module(path):
+  # Directory of the module owning the path: the directory containing the src directory, e.g.
+  # hadoop-yarn-project/hadoop-yarn/hadoop-yarn-common/src/main/... belongs to hadoop-yarn-common.
+  # Paths outside of src directories belong to their top-level directory.
+  parts = path.split("/")
+  if SOURCE_DIR_NAME in parts[1:]:
+    return parts[parts.index(SOURCE_DIR_NAME, 1) - 1]
+  return parts[0] if len(parts) > 1 else "."
@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import re
+import subprocess
+from contextlib import nullcontext
+
+from git_backend import execute_command
+from rate_limit import get_host
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_PR_REMOTE = "origin"
+DEFAULT_GITHUB_REPO = "apache/hadoop"
+GITHUB_SEARCH_URL = "https://api.github.com/search/issues"
+PULL_REQUEST_REF_TEMPLATE = "refs/reviewsync/pull/{}"
+PULL_REQUEST_PATCH_FILENAME_TEMPLATE = "{issue_id}.PR-{number}.patch"
+# Line of git ls-remote output: <sha>\trefs/pull/<number>/head
+PULL_REQUEST_HEAD_PATTERN = re.compile(r'^[0-9a-f]+\trefs/pull/(\d+)/head$')
+
+
+def get_pull_request_numbers_from_urls(urls, github_repo=DEFAULT_GITHUB_REPO):
+  pattern = re.compile(r'github\.com/' + re.escape(github_repo) + r'/pull/(\d+)')
+  numbers = set()
+  for url in urls:
+    search_obj = pattern.search(url or "")
+    if search_obj:
+      numbers.add(int(search_obj.group(1)))
+  return sorted(numbers)
+
+
+class GitHubPullRequestSearch:
+  # Finds pull requests that have the issue key in their title, via the GitHub search API
+  def __init__(self, github_repo=DEFAULT_GITHUB_REPO, token=None, request_scheduler=None):
+    self.github_repo = github_repo
+    self.token = token
+    # Search requests are rate limited and retried by the scheduler if specified
+    self.request_scheduler = request_scheduler
+
+  def find_pull_requests(self, issue_id):
+    import urllib.parse
+    import urllib.request
+    query = '"{}" repo:{} type:pr in:title'.format(issue_id, self.github_repo)
+    request = urllib.request.Request(GITHUB_SEARCH_URL + "?" + urllib.parse.urlencode({"q": query}))
+    request.add_header("Accept", "application/vnd.github+json")
+    if self.token:
+      request.add_header("Authorization", "token " + self.token)
+    if self.request_scheduler:
+      result = self.request_scheduler.call(get_host(GITHUB_SEARCH_URL), self._search, request)
+    else:
+      result = self._search(request)
+    # Search is fuzzy, e.g. YARN-123 would match YARN-1234
+    title_pattern = re.compile(r'\b' + re.escape(issue_id) + r'\b')
+    return sorted(item["number"] for item in result.get("items", []) if title_pattern.search(item.get("title", "")))
+
+  @staticmethod
+  def _search(request):
+    import urllib.request
+    with urllib.request.urlopen(request, timeout=30) as response:
+      return json.loads(response.read().decode("utf-8"))
+
+
+class PullRequestFetcher:
+  # Fetches heads of pull requests with the refs/pull/<number>/head refspec, which GitHub provides for every PR,
+  # and writes their diff against the base branch to a patch file.
+  def __init__(self, repo_path, remote=DEFAULT_PR_REMOTE, lock=None):
+    self.repo_path = repo_path
+    self.remote = remote
+    # Fetches update refs of the shared repository, they are guarded by this lock if specified
+    self.lock = lock
+
+  def fetch(self, numbers):
+    numbers = sorted(set(numbers))
+    if not numbers:
+      return []
+    LOG.info("Fetching %d pull requests from %s: %s", len(numbers), self.remote, numbers)
+    status, _, stderr = self._fetch_refspecs(numbers)
+    if status == 0:
+      return numbers
+    # A single missing PR fails the whole fetch, the existing ones are listed with one request and fetched again
+    LOG.warning("Batched fetch of pull requests failed, skipping the missing ones. Error: %s", stderr)
+    existing = self._list_existing(numbers)
+    missing = [number for number in numbers if number not in existing]
+    if missing:
+      LOG.error("Pull requests do not exist on %s: %s", self.remote, missing)
+    fetched = [number for number in numbers if number in existing]
+    if not fetched:
+      return []
+    status, _, stderr = self._fetch_refspecs(fetched)
+    if status != 0:
+      LOG.error("Failed to fetch pull requests %s: %s", fetched, stderr)
+      return []
+    return fetched
+
+  def _list_existing(self, numbers):
+    refs = ["refs/pull/{}/head".format(number) for number in numbers]
+    status, stdout, stderr = execute_command(['git', 'ls-remote', self.remote] + refs, self.repo_path)
+    if status != 0:
+      LOG.error("Failed to list pull requests of %s: %s", self.remote, stderr)
+      return set()
+    existing = set()
+    for line in stdout.splitlines():
+      match = PULL_REQUEST_HEAD_PATTERN.match(line)
+      if match:
+        existing.add(int(match.group(1)))
+    return existing
+
+  def _fetch_refspecs(self, numbers):
+    refspecs = ["+refs/pull/{}/head:{}".format(number, PULL_REQUEST_REF_TEMPLATE.format(number)) for number in numbers]
+    with self.lock or nullcontext():
+      return execute_command(['git', 'fetch', '--no-tags', '--quiet', self.remote] + refspecs, self.repo_path)
+
+  def write_patch_file(self, number, base_branch, file_path):
+    pr_ref = PULL_REQUEST_REF_TEMPLATE.format(number)
+    status, merge_base, stderr = execute_command(['git', 'merge-base', base_branch, pr_ref], self.repo_path)
+    if status != 0:
+      raise ValueError("Failed to find merge base of {} and pull request #{}: {}".format(base_branch, number, stderr))
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    # The diff is written as bytes, line endings and the encoding of the changed files are kept as they are
+    tmp_file_path = "{}.{}.tmp".format(file_path, os.getpid())
+    with open(tmp_file_path, "wb") as f:
+      proc = subprocess.run(['git', 'diff', '--binary', '--no-color', '--no-ext-diff', merge_base, pr_ref],
+                            cwd=self.repo_path, stdout=f, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+      os.remove(tmp_file_path)
+      raise ValueError("Failed to create diff of pull request #{}: {}"
+                       .format(number, proc.stderr.decode("utf-8", errors="replace")))
+    os.replace(tmp_file_path, file_path)
+    return file_path
+
+
+class PullRequestSource:
+  # Collects issues without patch attachments during the sync, so that the pull requests of all of them
+  # can be fetched with a single git fetch.
+  def __init__(self, jira_wrapper, fetcher, patches_root, title_search=None):
+    self.jira_wrapper = jira_wrapper
+    self.fetcher = fetcher
+    self.patches_root = patches_root
+    self.title_search = title_search
+    # List of (issue ID, branches the issue is committed on, PR numbers)
+    self.pending = []
+
+  def add_issue(self, issue_id, committed_on_branches):
+    numbers = self.find_pull_requests(issue_id)
+    if not numbers:
+      return False
+    LOG.info("[%s] Found pull requests: %s", issue_id, numbers)
+    self.pending.append((issue_id, committed_on_branches, numbers))
+    return True
+
+  def find_pull_requests(self, issue_id):
+    numbers = self.jira_wrapper.get_pull_request_numbers(issue_id)
+    if not numbers and self.title_search:
+      try:
+        numbers = self.title_search.find_pull_requests(issue_id)
+      except OSError:
+        LOG.exception("[%s] Failed to search pull requests on GitHub", issue_id)
+    return numbers
+
+  def fetch_pending(self):
+    return set(self.fetcher.fetch([number for _, _, numbers in self.pending for number in numbers]))
+
+  def create_patch_file(self, issue_id, number, base_branch):
+    filename = PULL_REQUEST_PATCH_FILENAME_TEMPLATE.format(issue_id=issue_id, number=number)
+    file_path = os.path.join(self.patches_root, issue_id, filename)
+    return filename, self.fetcher.write_patch_file(number, base_branch, file_path)
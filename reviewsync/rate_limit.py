@@ -0,0 +1,269 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+LOG = logging.getLogger(__name__)
+
+JIRA_HOST = "issues.apache.org"
+GITHUB_HOST = "api.github.com"
+SHEETS_HOST = "sheets.googleapis.com"
+
+DEFAULT_RATE = 2.0
+# key: host, value: allowed requests per second
+DEFAULT_HOST_RATES = {
+  JIRA_HOST: 2.0,
+  # Search API allows 30 requests per minute with a token, 10 without
+  GITHUB_HOST: 0.15,
+  # Sheets API allows 60 requests per minute per user
+  SHEETS_HOST: 1.0,
+}
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 300.0
+
+# Responses meaning the host asks for fewer requests: all requests to the host are paused
+THROTTLING_STATUS_CODES = {429, 503}
+RETRYABLE_STATUS_CODES = THROTTLING_STATUS_CODES | {500, 502, 504}
+# GitHub responds with 403 if its rate limit is exceeded, with a Retry-After or X-RateLimit-Reset header
+FORBIDDEN_STATUS_CODE = 403
+# Network errors of urllib, requests and the standard library, matched by name so no HTTP client is imported here
+TRANSIENT_ERROR_NAMES = {"ConnectionError", "TimeoutError", "Timeout", "URLError", "ChunkedEncodingError"}
+
+
+def get_host(url):
+  return urlparse(url).netloc
+
+
+def parse_host_rate(value):
+  # HOST=RATE, e.g. issues.apache.org=1.5
+  host, sep, rate = value.partition("=")
+  try:
+    rate = float(rate)
+  except ValueError:
+    rate = 0
+  if not sep or not host or rate <= 0:
+    raise ValueError("Invalid host rate: '{}', expected HOST=REQUESTS_PER_SECOND, e.g. {}=1.5"
+                     .format(value, JIRA_HOST))
+  return host, rate
+
+
+def get_response(error):
+  # requests.Response is falsy for 4xx and 5xx status codes, it is compared with None
+  response = getattr(error, "response", None)
+  return response if response is not None else getattr(error, "resp", None)
+
+
+def get_status_code(error):
+  # Status code of the HTTP error responses of jira / requests (status_code), urllib (code),
+  # gspread (response.status_code) and the Google API client (resp.status), None for other errors
+  response = get_response(error)
+  for obj, attr in ((error, "status_code"), (error, "code"), (response, "status_code"), (response, "status")):
+    value = getattr(obj, attr, None)
+    if isinstance(value, int):
+      return value
+  return None
+
+
+def get_headers(error):
+  response = get_response(error)
+  headers = getattr(error, "headers", None) or getattr(response, "headers", None) or response
+  return headers if hasattr(headers, "get") else {}
+
+
+def get_header(headers, name):
+  return headers.get(name) or headers.get(name.lower())
+
+
+def get_retry_after(error, now=None):
+  # Seconds to wait according to the Retry-After (or GitHub's X-RateLimit-Reset) header of the error response,
+  # None if not specified
+  now = now if now is not None else time.time()
+  headers = get_headers(error)
+  value = get_header(headers, "Retry-After")
+  if not value:
+    reset = get_header(headers, "X-RateLimit-Reset")
+    if str(get_header(headers, "X-RateLimit-Remaining")) == "0" and str(reset).isdigit():
+      return max(0.0, int(reset) - now)
+    return None
+  value = str(value).strip()
+  if value.isdigit():
+    return float(value)
+  try:
+    retry_at = email.utils.parsedate_to_datetime(value).timestamp()
+  except (TypeError, ValueError):
+    LOG.warning("Ignoring invalid Retry-After header: %s", value)
+    return None
+  return max(0.0, retry_at - now)
+
+
+def is_transient_error(error):
+  return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class TokenBucket:
+  # Allows rate requests per second on average, and bursts of up to capacity requests.
+  # A throttling response pauses the bucket: no token is handed out until the pause is over.
+  def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+    self.rate = rate
+    self.capacity = capacity or max(1.0, rate)
+    self.tokens = self.capacity
+    self.clock = clock
+    self.sleep = sleep
+    self.updated_at = clock()
+    self.paused_until = 0.0
+    self._lock = threading.Lock()
+
+  def acquire(self):
+    # Returns the seconds waited for the token
+    waited = 0.0
+    while True:
+      with self._lock:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if now < self.paused_until:
+          wait = self.paused_until - now
+        elif self.tokens >= 1:
+          self.tokens -= 1
+          return waited
+        else:
+          wait = (1 - self.tokens) / self.rate
+      self.sleep(wait)
+      waited += wait
+
+  def pause(self, seconds):
+    with self._lock:
+      self.paused_until = max(self.paused_until, self.clock() + seconds)
+      self.tokens = 0
+
+
+class HostMetrics:
+  __slots__ = ('requests', 'retries', 'throttled_responses', 'failures', 'throttled_time')
+
+  def __init__(self):
+    self.requests = 0
+    self.retries = 0
+    self.throttled_responses = 0
+    # Requests failed without retry, or after the last retry
+    self.failures = 0
+    # Seconds spent waiting for tokens, pauses of the host and backoff delays
+    self.throttled_time = 0.0
+
+  def __repr__(self):
+    return repr((self.requests, self.retries, self.throttled_responses, self.failures, self.throttled_time))
+
+
+class RequestScheduler:
+  # Outbound requests of all clients (Jira, patch downloads, GitHub, Google Sheets) go through the token bucket
+  # of their host, so concurrent workers together stay within the rate the host allows.
+  # Failed requests are retried with jittered exponential backoff, honouring the Retry-After header
+  # of throttling responses, which also pauses all other requests to the host.
+  def __init__(self, host_rates=None, default_rate=DEFAULT_RATE, max_retries=DEFAULT_MAX_RETRIES,
+               base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY, clock=time.monotonic, sleep=time.sleep,
+               rand=random.random):
+    self.host_rates = dict(DEFAULT_HOST_RATES)
+    self.host_rates.update(host_rates or {})
+    self.default_rate = default_rate
+    self.max_retries = max_retries
+    self.base_delay = base_delay
+    self.max_delay = max_delay
+    self.clock = clock
+    self.sleep = sleep
+    self.rand = rand
+    self.buckets = {}
+    # key: host, value: HostMetrics
+    self.metrics = {}
+    self._lock = threading.Lock()
+
+  def _get_host_state(self, host):
+    with self._lock:
+      if host not in self.buckets:
+        rate = self.host_rates.get(host, self.default_rate)
+        self.buckets[host] = TokenBucket(rate, clock=self.clock, sleep=self.sleep)
+        self.metrics[host] = HostMetrics()
+      return self.buckets[host], self.metrics[host]
+
+  def call(self, host, func, *args, **kwargs):
+    bucket, metrics = self._get_host_state(host)
+    attempt = 0
+    while True:
+      waited = bucket.acquire()
+      with self._lock:
+        metrics.requests += 1
+        metrics.throttled_time += waited
+      try:
+        return func(*args, **kwargs)
+      except Exception as e:
+        delay, throttled = self._get_retry_delay(e, attempt)
+        with self._lock:
+          metrics.throttled_responses += int(throttled)
+          if delay is None:
+            metrics.failures += 1
+          else:
+            metrics.retries += 1
+        if delay is None:
+          raise
+        LOG.warning("Request to %s failed (%s), retrying in %.1f seconds (retry %d of %d)",
+                    host, e, delay, attempt + 1, self.max_retries)
+        if throttled:
+          # The pause is waited for by the next acquire of the bucket
+          bucket.pause(delay)
+        else:
+          self.sleep(delay)
+          with self._lock:
+            metrics.throttled_time += delay
+        attempt += 1
+
+  def _get_retry_delay(self, error, attempt):
+    # Returns (seconds to wait before the retry or None if not retried, whether the host throttled the request)
+    status_code = get_status_code(error)
+    retry_after = None
+    if status_code in THROTTLING_STATUS_CODES or status_code == FORBIDDEN_STATUS_CODE:
+      retry_after = get_retry_after(error)
+    throttled = status_code in THROTTLING_STATUS_CODES or retry_after is not None
+    if status_code is not None:
+      retryable = status_code in RETRYABLE_STATUS_CODES or throttled
+    else:
+      retryable = is_transient_error(error)
+    if not retryable or attempt >= self.max_retries:
+      return None, throttled
+    if retry_after is not None:
+      if retry_after > self.max_delay:
+        LOG.error("Host asks to wait %.0f seconds before the next request, more than the maximum delay of %.0f seconds",
+                  retry_after, self.max_delay)
+        return None, throttled
+      return retry_after, throttled
+    # Equal jitter: half of the exponential delay is fixed, half is random, so retries of workers don't align
+    delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+    return delay / 2 + self.rand() * delay / 2, throttled
+
+  def wrap(self, host, obj):
+    return RateLimitedProxy(self, host, obj)
+
+  def log_summary(self):
+    with self._lock:
+      metrics = sorted(self.metrics.items())
+    for host, host_metrics in metrics:
+      LOG.info("Requests to %s: %d, retries: %d, throttled responses: %d, failed: %d, throttled for %.1f seconds",
+               host, host_metrics.requests, host_metrics.retries, host_metrics.throttled_responses,
+               host_metrics.failures, host_metrics.throttled_time)
+
+
+class RateLimitedProxy:
+  # Schedules every method call of a client object as one request to host
+  def __init__(self, scheduler, host, target):
+    self._scheduler = scheduler
+    self._host = host
+    self._target = target
+
+  def __getattr__(self, name):
+    attr = getattr(self._target, name)
+    if not callable(attr):
+      return attr
+
+    def scheduled_call(*args, **kwargs):
+      return self._scheduler.call(self._host, attr, *args, **kwargs)
+    return scheduled_call
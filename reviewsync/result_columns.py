@@ -0,0 +1,151 @@
+import sys
+from array import array
+
+from patch_apply import PatchStatus
+
+NOT_AVAILABLE = "N/A"
+# Position of a PatchStatus in this list is the code stored in the result column
+PATCH_STATUSES = list(PatchStatus)
+PATCH_STATUS_CODES = {status: code for code, status in enumerate(PATCH_STATUSES)}
+EXPLICIT_UNKNOWN = -1
+MODULE_TESTS_UNKNOWN = -1
+
+
+class ResultColumns:
+  # Column-oriented storage of PatchApply results: one list / array per column, one element per issue x branch row.
+  # Repeated strings (issue IDs, branches, owners, patch files, touched modules, overall statuses) are interned,
+  # statuses, explicit flags, conflict counts and patch sizes are stored as machine integers.
+  HEADERS = ["Row", "Issue", "Patch apply", "Owner", "Patch file", "Patch size", "Touched modules", "Branch",
+             "Explicit", "Result", "Number of conflicted files", "Maven modules", "Module tests", "Overall result"]
+
+  __slots__ = ('issue_ids', 'owners', 'patch_files', 'patch_sizes', 'touched_modules', 'branches', 'explicit',
+               'results', 'conflicts', 'maven_modules', 'module_tests', 'overall_statuses')
+
+  def __init__(self):
+    self.issue_ids = []
+    self.owners = []
+    self.patch_files = []
+    # 0 if the size is not known
+    self.patch_sizes = array('Q')
+    self.touched_modules = []
+    self.branches = []
+    self.explicit = array('b')
+    self.results = array('B')
+    self.conflicts = array('I')
+    self.maven_modules = []
+    self.module_tests = array('i')
+    self.overall_statuses = []
+
+  @classmethod
+  def from_results(cls, results):
+    columns = cls()
+    for issue_id, patch_applies in results.items():
+      columns.add_issue(issue_id, patch_applies)
+    return columns
+
+  def __len__(self):
+    return len(self.issue_ids)
+
+  def add_issue(self, issue_id, patch_applies):
+    for patch_apply in patch_applies:
+      patch = patch_apply.patch
+      patch_size = 0
+      touched_modules = None
+      if patch:
+        owner = patch.owner_display_name
+        filename = patch.filename
+        overall_status = patch.overall_status.status
+        if patch.info:
+          patch_size = patch.info.size
+          touched_modules = ", ".join(patch.info.modules)
+      else:
+        owner = NOT_AVAILABLE
+        filename = NOT_AVAILABLE
+        overall_status = NOT_AVAILABLE
+      maven_modules = None
+      module_tests = MODULE_TESTS_UNKNOWN
+      if patch_apply.module_impact:
+        maven_modules = ", ".join(patch_apply.module_impact.module_names)
+        module_tests = patch_apply.module_impact.tests
+      self.add_row(issue_id, owner, filename, patch_apply.branch, patch_apply.explicit, patch_apply.result,
+                   patch_apply.conflicts, overall_status, patch_size=patch_size, touched_modules=touched_modules,
+                   maven_modules=maven_modules, module_tests=module_tests)
+
+  def add_row(self, issue_id, owner, patch_file, branch, explicit, result, conflicts, overall_status,
+              patch_size=0, touched_modules=None, maven_modules=None, module_tests=MODULE_TESTS_UNKNOWN):
+    self.issue_ids.append(sys.intern(issue_id))
+    self.owners.append(sys.intern(owner or NOT_AVAILABLE))
+    self.patch_files.append(sys.intern(patch_file or NOT_AVAILABLE))
+    self.patch_sizes.append(patch_size)
+    self.touched_modules.append(sys.intern(touched_modules or NOT_AVAILABLE))
+    self.branches.append(sys.intern(branch))
+    self.explicit.append(EXPLICIT_UNKNOWN if explicit is None else int(explicit))
+    self.results.append(PATCH_STATUS_CODES[result])
+    self.conflicts.append(conflicts)
+    self.maven_modules.append(sys.intern(maven_modules or NOT_AVAILABLE))
+    self.module_tests.append(module_tests)
+    self.overall_statuses.append(sys.intern(overall_status or NOT_AVAILABLE))
+
+  def reorder(self, issue_ids):
+    # Returns a new ResultColumns object with the rows of issues in the order of issue_ids.
+    # Rows of an issue keep their order, rows of issues not in issue_ids are moved to the end.
+    positions = {issue_id: position for position, issue_id in enumerate(issue_ids)}
+    rows = sorted(range(len(self)), key=lambda idx: positions.get(self.issue_ids[idx], len(positions)))
+    columns = ResultColumns()
+    for column_name in self.__slots__:
+      column = getattr(self, column_name)
+      getattr(columns, column_name).extend(column[idx] for idx in rows)
+    return columns
+
+  def get_result(self, idx):
+    return PATCH_STATUSES[self.results[idx]]
+
+  def get_explicit(self, idx):
+    explicit = self.explicit[idx]
+    return None if explicit == EXPLICIT_UNKNOWN else bool(explicit)
+
+  def add_record(self, record):
+    self.add_row(record["issue"], record["owner"], record["patch_file"], record["branch"], record["explicit"],
+                 PatchStatus[record["result"]], record["conflicts"], record["overall_status"],
+                 patch_size=record.get("patch_size", 0), touched_modules=record.get("touched_modules"),
+                 maven_modules=record.get("maven_modules"),
+                 module_tests=record.get("module_tests", MODULE_TESTS_UNKNOWN))
+
+  def iter_records(self, start=0):
+    # Portable, JSON-serializable representation of rows
+    for idx in range(start, len(self)):
+      yield {"issue": self.issue_ids[idx], "owner": self.owners[idx], "patch_file": self.patch_files[idx],
+             "patch_size": self.patch_sizes[idx], "touched_modules": self.touched_modules[idx],
+             "branch": self.branches[idx], "explicit": self.get_explicit(idx), "result": self.get_result(idx).name,
+             "conflicts": self.conflicts[idx], "maven_modules": self.maven_modules[idx],
+             "module_tests": self.module_tests[idx], "overall_status": self.overall_statuses[idx]}
+
+  def iter_rows(self, start=0):
+    # start should point to the first row of an issue
+    prev_issue_id = None
+    patch_apply_idx = 0
+    for idx in range(start, len(self)):
+      issue_id = self.issue_ids[idx]
+      patch_apply_idx = patch_apply_idx + 1 if issue_id == prev_issue_id else 1
+      prev_issue_id = issue_id
+      conflicts = NOT_AVAILABLE if self.conflicts[idx] == 0 else str(self.conflicts[idx])
+      patch_size = NOT_AVAILABLE if self.patch_sizes[idx] == 0 else str(self.patch_sizes[idx])
+      module_tests = NOT_AVAILABLE if self.module_tests[idx] == MODULE_TESTS_UNKNOWN else str(self.module_tests[idx])
+      yield [idx + 1, issue_id, patch_apply_idx, self.owners[idx], self.patch_files[idx], patch_size,
+             self.touched_modules[idx], self.branches[idx],
+             "Yes" if self.explicit[idx] == 1 else "No", self.get_result(idx).value, conflicts,
+             self.maven_modules[idx], module_tests, self.overall_statuses[idx]]
+
+  def iter_issue_statuses(self, start=0):
+    # Yields the overall status of each issue, taken from the first row of the issue
+    prev_issue_id = None
+    for idx in range(start, len(self)):
+      issue_id = self.issue_ids[idx]
+      if issue_id == prev_issue_id:
+        continue
+      prev_issue_id = issue_id
+      overall_status = self.overall_statuses[idx]
+      if overall_status == NOT_AVAILABLE:
+        # No patch was found for the issue, so the result is the only status we have
+        overall_status = self.get_result(idx).value
+      yield issue_id, overall_status
@@ -0,0 +1,128 @@
+import datetime
+import json
+import logging
+
+from result_columns import ResultColumns
+
+LOG = logging.getLogger(__name__)
+
+GSHEET_DATE_FORMAT = '%d/%m/%Y %H:%M:%S'
+
+
+def update_gsheet(gsheet_wrapper, issue_statuses):
+  # issue_statuses: list of (issue ID, overall status).
+  # All cells are written with a single request if the GSheet wrapper supports it, see HadoopGSheetWrapper.
+  update_date_str = datetime.datetime.now().strftime(GSHEET_DATE_FORMAT)
+  if hasattr(gsheet_wrapper, "update_issue_cells"):
+    gsheet_wrapper.update_issue_cells(list(issue_statuses), update_date_str)
+  else:
+    for issue_id, overall_status in issue_statuses:
+      gsheet_wrapper.update_issue_with_results(issue_id, update_date_str, overall_status)
+
+
+# Sinks receive the rows of each issue as soon as the issue is finished.
+# start is the index of the first row of the finished issue in the ResultColumns object.
+class ResultSink:
+  def issue_finished(self, results, start):
+    pass
+
+  # Called once on resume, with the rows of the issues finished by the interrupted run
+  def issues_restored(self, results):
+    pass
+
+  # Called once with all CrossConflict objects, after all issues are finished
+  def cross_conflicts_found(self, conflicts):
+    pass
+
+  def close(self):
+    pass
+
+
+class ConsoleRowSink(ResultSink):
+  def __init__(self, output_func=print):
+    self.output_func = output_func
+    self.header_printed = False
+
+  def issue_finished(self, results, start):
+    if not self.header_printed:
+      self.output_func(" | ".join(ResultColumns.HEADERS))
+      self.header_printed = True
+    for row in results.iter_rows(start=start):
+      self.output_func(" | ".join(str(value) for value in row))
+
+
+class JsonLinesSink(ResultSink):
+  def __init__(self, file_path):
+    self.file_path = file_path
+    self.file = open(file_path, "a")
+    LOG.info("Writing results to JSON lines file: %s", file_path)
+
+  def issue_finished(self, results, start):
+    lines = [json.dumps(record) + "\n" for record in results.iter_records(start=start)]
+    self.file.write("".join(lines))
+    self.file.flush()
+
+  def cross_conflicts_found(self, conflicts):
+    self.file.write("".join(json.dumps(conflict.to_record()) + "\n" for conflict in conflicts))
+    self.file.flush()
+
+  def close(self):
+    self.file.close()
+
+
+class GSheetBatchSink(ResultSink):
+  def __init__(self, gsheet_wrapper, batch_size):
+    self.gsheet_wrapper = gsheet_wrapper
+    self.batch_size = batch_size
+    self.pending = []
+    # key: issue ID, value: overall status written to the GSheet
+    self.statuses = {}
+
+  def issue_finished(self, results, start):
+    issue_statuses = list(results.iter_issue_statuses(start=start))
+    self.statuses.update(issue_statuses)
+    self.pending.extend(issue_statuses)
+    if len(self.pending) >= self.batch_size:
+      self.flush()
+
+  def issues_restored(self, results):
+    # Statuses of issues finished by the interrupted run may have been pending in a batch that was never written
+    self.issue_finished(results, 0)
+
+  def cross_conflicts_found(self, conflicts):
+    # Statuses of issues with conflicting patches are written again, with the conflicting issues appended
+    conflicting = {}
+    for conflict in conflicts:
+      conflicting.setdefault(conflict.first.issue_id, []).append("{} on {}".format(conflict.second.issue_id,
+                                                                                 conflict.branch))
+      conflicting.setdefault(conflict.second.issue_id, []).append("{} on {}".format(conflict.first.issue_id,
+                                                                                  conflict.branch))
+    # Pending statuses of these issues are replaced, so a batch writes each issue once
+    self.pending = [(issue_id, status) for issue_id, status in self.pending if issue_id not in conflicting]
+    for issue_id, others in conflicting.items():
+      if issue_id in self.statuses:
+        self.pending.append((issue_id, "{}, CROSS-CONFLICT: {}".format(self.statuses[issue_id], ", ".join(others))))
+
+  def flush(self):
+    if not self.pending:
+      return
+    LOG.info("Updating GSheet with results of %d issues...", len(self.pending))
+    update_gsheet(self.gsheet_wrapper, self.pending)
+    self.pending = []
+
+  def close(self):
+    self.flush()
+
+
+class CheckpointSink(ResultSink):
+  # Appends the rows of each finished issue to a CheckpointJournal, so an interrupted run can be resumed
+  def __init__(self, journal):
+    self.journal = journal
+
+  def issue_finished(self, results, start):
+    rows = list(results.iter_records(start=start))
+    if rows:
+      self.journal.append(rows[0]["issue"], rows)
+
+  def close(self):
+    self.journal.close()
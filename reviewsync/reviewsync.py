@@ -1,56 +1,164 @@
 #!/usr/bin/python
 
 import argparse
+import json
 import logging
 import os
-from collections import OrderedDict
+import threading
+import zlib
+from contextlib import nullcontext
 
-from googleapiwrapper.google_sheet import GSheetWrapper, GSheetOptions
 from pythoncommons.file_utils import FileUtils
-from pythoncommons.result_printer import BasicResultPrinter
-from pythoncommons.jira_wrapper import JiraFetchMode
 
-from jira_wrapper import HadoopJiraWrapper
-from git_wrapper import GitWrapper
+from fetch_mode import JiraFetchMode
+from git_backend import GitBackendType
+from conflict_details import DEFAULT_MAX_CONFLICT_DETAILS
+from import_timer import ImportTimer
+from jql_source import DEFAULT_JQL_PAGE_SIZE
+from patch_ids import DEFAULT_PATCH_ID_WINDOW
+from pull_requests import DEFAULT_PR_REMOTE
+from run_history import HISTORY_DB_FILENAME, RunHistoryReport, StageTimer
+from shards import SHARDS_DIR_NAME, SHARD_OUTPUT_FILENAME, ShardFilter, parse_shard
+from checkpoint import CHECKPOINTS_DIR_NAME, CHECKPOINT_FILENAME_TEMPLATE, CheckpointJournal
+from locks import APPLY_AREA_DIR_NAME, LOCKS_DIR_NAME, ApplyArea, RepoLocks
+from rate_limit import DEFAULT_HOST_RATES, DEFAULT_MAX_RETRIES, SHEETS_HOST, RequestScheduler, parse_host_rate
 from os.path import expanduser
 import datetime
+import sys
 import time
 from logging.handlers import TimedRotatingFileHandler
 
-from patch_apply import PatchStatus, PatchApply
-from jira_patch import PatchOverallStatus
-
 DEFAULT_BRANCH = "trunk"
 JIRA_URL = "https://issues.apache.org/jira"
+DEFAULT_ROOT = os.path.join(expanduser("~"), "reviewsync")
+DEFAULT_GSHEET_BATCH_SIZE = 10
+DEFAULT_RELEASE_BRANCH_PATTERN = r'^branch-3\.\d+$'
+DEFAULT_ACTIVE_DAYS = 365
 LOG = logging.getLogger(__name__)
 
 __author__ = 'Szilard Nemeth'
 
 class ReviewSync:
   def __init__(self, args):
-    self.setup_dirs()
+    self.setup_dirs(args.root)
+    # Runs sharing the same root only lock fetches, worktree registrations and patch downloads
+    self.repo_locks = RepoLocks(os.path.join(self.reviewsync_root, LOCKS_DIR_NAME))
+    self.apply_area = None
     self.branches = self.get_branches(args)
-    self.git_wrapper = GitWrapper(self.git_root)
-    self.jira_wrapper = HadoopJiraWrapper(JIRA_URL, DEFAULT_BRANCH, self.patches_root, self.git_wrapper)
+    self.issues = args.issues
+    self.jql = args.jql
+    self.jql_page_size = args.jql_page_size
     self.issue_fetch_mode = args.fetch_mode
+    self.git_backend = args.git_backend
+    self.max_conflict_details = args.max_conflict_details
+    self.patch_id_window = args.patch_id_window
+    self.classify_conflicts = args.classify_conflicts
+    self.stream_console = args.stream_console
+    self.jsonl_output = args.jsonl_output
+    self.gsheet_batch_size = args.gsheet_batch_size
+    self.result_sinks = []
+    self.matrix = args.matrix
+    self.matrix_branch_pattern = args.matrix_branch_pattern
+    self.matrix_active_days = args.matrix_active_days
+    self.matrix_workers = args.matrix_workers
+    self.backport_matrix = None
+    self.pull_requests = args.pull_requests
+    self.pr_remote = args.pr_remote
+    self.pr_title_search = args.pr_title_search
+    self.pull_request_source = None
+    self.gsheet_options = getattr(args, "gsheet_options", None)
+    self.history_db = args.history_db or os.path.join(self.reviewsync_root, HISTORY_DB_FILENAME)
+    self.save_history = not args.no_history
+    self.stage_timer = StageTimer()
+    self.shard_filter = ShardFilter(*args.shard) if args.shard else None
+    self.shard_output = args.shard_output
+    if self.shard_filter and not self.shard_output:
+      self.shard_output = os.path.join(self.reviewsync_root, SHARDS_DIR_NAME,
+                                       SHARD_OUTPUT_FILENAME.format(*args.shard))
+    self.merge_shard_files = args.merge_shards
+    self.resume = args.resume
+    self.checkpoint_file = args.checkpoint_file
+    if not self.checkpoint_file:
+      filename = CHECKPOINT_FILENAME_TEMPLATE.format(self.get_run_key(args))
+      self.checkpoint_file = os.path.join(self.reviewsync_root, CHECKPOINTS_DIR_NAME, filename)
+    self.checkpoint_journal = None
+    self.workers = args.workers
+    # Requests to Jira, GitHub and Google Sheets of all workers are rate limited per host
+    self.request_scheduler = RequestScheduler(host_rates=dict(args.request_rates or []),
+                                              max_retries=args.max_retries)
+    self.test_impact = args.test_impact
+    self.detect_cross_conflicts = args.cross_conflicts
+    self.cross_conflict_detector = None
+    self.cross_conflicts = []
+    self.module_index_store = None
+    # Patches are applied in the single working tree of the repository, unless the backport matrix is used
+    self._apply_lock = threading.Lock()
+    self._results_lock = threading.Lock()
+    # Heavy modules (GitPython, Jira client, Google API) are only imported once they are actually needed
+    self._git_wrapper = None
+    self._jira_wrapper = None
+    self._gsheet_wrapper = None
+
+  @property
+  def git_wrapper(self):
+    if not self._git_wrapper:
+      git_wrapper_module = ImportTimer.import_module("git_wrapper")
+      self._git_wrapper = git_wrapper_module.GitWrapper(self.git_root, backend_type=self.git_backend,
+                                                        log_dir=self.log_dir,
+                                                        max_conflict_details=self.max_conflict_details,
+                                                        patch_id_window=self.patch_id_window,
+                                                        classify_conflicts=self.classify_conflicts,
+                                                        repo_locks=self.repo_locks)
+    return self._git_wrapper
+
+  @property
+  def jira_wrapper(self):
+    if not self._jira_wrapper:
+      jira_wrapper_module = ImportTimer.import_module("jira_wrapper")
+      self._jira_wrapper = jira_wrapper_module.HadoopJiraWrapper(JIRA_URL, DEFAULT_BRANCH, self.patches_root,
+                                                                 self.git_wrapper,
+                                                                 request_scheduler=self.request_scheduler)
+    return self._jira_wrapper
+
+  @property
+  def gsheet_wrapper(self):
+    if not self._gsheet_wrapper:
+      if self.issue_fetch_mode != JiraFetchMode.GSHEET:
+        raise ValueError("GSheet wrapper is only available with fetch mode {}!".format(JiraFetchMode.GSHEET))
+      gsheet_wrapper_module = ImportTimer.import_module("gsheet_wrapper")
+      self._gsheet_wrapper = self.request_scheduler.wrap(SHEETS_HOST,
+                                                         gsheet_wrapper_module.HadoopGSheetWrapper(self.gsheet_options))
+    return self._gsheet_wrapper
+
+  def import_modules_for_fetch_mode(self):
+    ImportTimer.import_modules("patch_apply", "jira_patch", "result_columns", "result_sinks", "git_wrapper",
+                               "jira_wrapper")
     if self.issue_fetch_mode == JiraFetchMode.GSHEET:
-      self.gsheet_wrapper: GSheetWrapper = GSheetWrapper(args.gsheet_options)
-    
+      ImportTimer.import_module("gsheet_wrapper")
+    elif self.issue_fetch_mode == JiraFetchMode.JQL:
+      ImportTimer.import_module("jql_source")
+
   def get_or_fetch_issues(self):
     if self.issue_fetch_mode == JiraFetchMode.ISSUES_CMDLINE:
       LOG.info("Using Jira fetch mode from issues specified from command line.")
-      issues = args.issues
+      issues = self.issues
       if not issues or len(issues) == 0:
         raise ValueError("Jira issues should be specified!")
       return issues
     elif self.issue_fetch_mode == JiraFetchMode.GSHEET:
       LOG.info("Using Jira fetch mode from GSheet.")
       return self.gsheet_wrapper.fetch_jira_data()
+    elif self.issue_fetch_mode == JiraFetchMode.JQL:
+      LOG.info("Using Jira fetch mode from JQL query: %s", self.jql)
+      from jql_source import JqlIssueStream
+      # Issue keys are streamed page by page, fetching starts right away in the background
+      return JqlIssueStream(self.jira_wrapper, self.jql, page_size=self.jql_page_size).start()
     else:
-      raise ValueError("Unknown state! Jira fetch mode should be either "
-                       "{} or {} but it is {}"
+      raise ValueError("Unknown state! Jira fetch mode should be one of "
+                       "{}, {} or {} but it is {}"
                        .format(JiraFetchMode.ISSUES_CMDLINE,
                                JiraFetchMode.GSHEET,
+                               JiraFetchMode.JQL,
                                self.issue_fetch_mode))
 
   @staticmethod
@@ -62,9 +170,15 @@ class ReviewSync:
       branches = branches + args.branches
     return branches
 
-  def setup_dirs(self):
-    home = expanduser("~")
-    self.reviewsync_root = os.path.join(home, "reviewsync")
+  @staticmethod
+  def get_run_key(args):
+    # Identifies the issues checked by a run, so concurrent runs of different issue sources
+    # (and different shards) have their own checkpoint journals, while reruns of the same source can resume
+    source = [str(args.fetch_mode), args.issues, args.jql, args.gsheet_spreadsheet, args.gsheet_worksheet, args.shard]
+    return "{:08x}".format(zlib.crc32(json.dumps(source).encode("utf-8")))
+
+  def setup_dirs(self, root):
+    self.reviewsync_root = root
     self.git_root = os.path.join(self.reviewsync_root, "repos")
     self.patches_root = os.path.join(self.reviewsync_root, "patches")
     self.log_dir = os.path.join(self.reviewsync_root, 'logs')
@@ -75,67 +189,354 @@ class ReviewSync:
     FileUtils.ensure_dir_created(self.log_dir)
 
   def sync(self):
-    issues = self.get_or_fetch_issues()
-    if not issues or len(issues) == 0:
+    started_at = time.time()
+    self.import_modules_for_fetch_mode()
+    from result_columns import ResultColumns
+    with self.stage_timer.measure("issue_fetch"):
+      issues = self.get_or_fetch_issues()
+    if self.issue_fetch_mode == JiraFetchMode.JQL:
+      LOG.info("Jira issues matching JQL query will be review-synced: %s", self.jql)
+    elif not issues or len(issues) == 0:
       LOG.info("No Jira issues found using fetch mode: %s", self.issue_fetch_mode)
-      return
-    
-    LOG.info("Jira issues will be review-synced: %s", issues)
+      return None
+    else:
+      LOG.info("Jira issues will be review-synced: %s", issues)
     LOG.info("Branches specified: %s", self.branches)
+    if self.shard_filter:
+      LOG.info("Only issues of shard %s will be review-synced", self.shard_filter)
+      issues = self.shard_filter.filter(issues)
     
-    self.git_wrapper.sync_hadoop(fetch=True)
+    self.checkpoint_journal = CheckpointJournal(self.checkpoint_file)
+    # Concurrent runs of the same issue source would share the journal
+    self.checkpoint_journal.lock()
+    finished_issues = self.load_checkpoint() if self.resume else None
+    # A resumed run continues with the refs fetched by the interrupted run
+    with self.stage_timer.measure("git_fetch"):
+      self.git_wrapper.sync_hadoop(fetch=not finished_issues)
+    if self.matrix:
+      self.add_release_branches_for_matrix()
     self.git_wrapper.validate_branches(self.branches)
 
-    # key: jira issue ID
-    # value: list of PatchApply objects
+    # Results are stored column-wise, PatchApply objects of an issue are only kept until the issue is finished.
     # For non-applicable patches (e.g. jira is already Resolved, patch object is None)
-    
-    results = OrderedDict()
+    results = ResultColumns()
+    resumed_issue_order = []
+    if finished_issues:
+      for rows in finished_issues.values():
+        for row in rows:
+          results.add_record(row)
+      issues = self._skip_finished_issues(issues, finished_issues, resumed_issue_order)
+    else:
+      self.checkpoint_journal.start(self.branches)
+    self.result_sinks = self.create_result_sinks()
+    # Patches are applied in worktrees of an apply area exclusively used by this run
+    self.apply_area = ApplyArea.acquire(os.path.join(self.git_root, APPLY_AREA_DIR_NAME))
+    try:
+      if finished_issues:
+        # Rows restored from the checkpoint did not go through the sinks of this run
+        for sink in self.result_sinks:
+          sink.issues_restored(results)
+      if self.matrix:
+        self.backport_matrix = self.create_backport_matrix()
+      else:
+        self.git_wrapper.set_apply_area(self.apply_area.path, DEFAULT_BRANCH)
+      if self.pull_requests:
+        self.pull_request_source = self.create_pull_request_source()
+      if self.detect_cross_conflicts:
+        from cross_conflicts import CrossPatchConflictDetector
+        self.cross_conflict_detector = CrossPatchConflictDetector(self.git_wrapper.hadoop_repo_path)
+      if self.test_impact:
+        from module_index import MavenModuleIndexStore, MODULE_INDEX_DIR_NAME
+        self.module_index_store = MavenModuleIndexStore(self.git_wrapper.hadoop_repo_path,
+                                                        os.path.join(self.git_root, MODULE_INDEX_DIR_NAME))
+      issue_order = self._sync_issues(issues, results)
+      if self.pull_request_source:
+        self._sync_pull_requests(results)
+      if self.cross_conflict_detector:
+        with self.stage_timer.measure("cross_conflicts"):
+          self.cross_conflicts = self.cross_conflict_detector.detect()
+        for sink in self.result_sinks:
+          sink.cross_conflicts_found(self.cross_conflicts)
+    finally:
+      for sink in self.result_sinks:
+        sink.close()
+      if self.backport_matrix:
+        self.backport_matrix.close()
+      self.git_wrapper.close()
+      self.apply_area.release()
+    # The run is complete, it cannot be resumed anymore
+    self.checkpoint_journal.remove()
+    if finished_issues:
+      # Issues restored from the checkpoint come first, results are reported in the original order of issues
+      issue_order = resumed_issue_order
+    if issue_order:
+      # Issues are finished in dispatch order, results are reported in the original order of issues
+      results = results.reorder(issue_order)
+    self.stage_timer.log_summary()
+    self.request_scheduler.log_summary()
+    if self.shard_filter:
+      from shards import ShardOutput
+      ShardOutput.write(self.shard_output, self.shard_filter, self.branches, results.iter_records())
+    if self.save_history:
+      self.save_run_history(started_at, results)
+    return results
+
+  def load_checkpoint(self):
+    if not os.path.exists(self.checkpoint_file):
+      LOG.info("No checkpoint found at %s, starting a new run", self.checkpoint_file)
+      return None
+    branches, finished_issues = self.checkpoint_journal.resume()
+    if branches != self.branches:
+      LOG.warning("Branches of the interrupted run are used: %s, instead of: %s", branches, self.branches)
+      self.branches = branches
+    LOG.info("Resuming interrupted run from checkpoint %s, skipping %d finished issues",
+             self.checkpoint_file, len(finished_issues))
+    return finished_issues
+
+  @staticmethod
+  def _skip_finished_issues(issues, finished_issues, issue_order):
+    # issue_order collects all issues, including the finished ones, in their original order
     for issue_id in issues:
-      if not issue_id:
-        LOG.warning("Found issue with empty issue ID! One reason could be an empty row of a Google sheet!")
-        continue
-      if "-" not in issue_id:
-        LOG.warning("Found issue with suspicious issue ID: %s", issue_id)
+      issue_order.append(issue_id)
+      if issue_id in finished_issues:
+        LOG.debug("Skipping issue %s, it was finished by the interrupted run", issue_id)
         continue
+      yield issue_id
+
+  def save_run_history(self, started_at, results):
+    from run_history import RunHistoryStore
+    store = RunHistoryStore(self.history_db)
+    try:
+      store.save_run(started_at, time.time(), self.issue_fetch_mode, self.branches, results, self.stage_timer)
+    finally:
+      store.close()
+
+  def merge_shards(self):
+    from result_columns import ResultColumns
+    from shards import ShardOutput
+    records, self.branches = ShardOutput.merge(self.merge_shard_files)
+    results = ResultColumns()
+    for record in records:
+      results.add_record(record)
+    if self.issue_fetch_mode == JiraFetchMode.GSHEET:
+      # Cells of the issues are only known once the sheet is fetched, like at the start of a sync
+      self.gsheet_wrapper.fetch_jira_data()
+      self.update_gsheet(results)
+      self.request_scheduler.log_summary()
+    return results
+
+  def add_release_branches_for_matrix(self):
+    release_branches = self.git_wrapper.discover_release_branches(self.matrix_branch_pattern,
+                                                                  active_days=self.matrix_active_days)
+    for branch in release_branches:
+      if branch not in self.branches:
+        self.branches.append(branch)
+    LOG.info("Branches of the backport matrix: %s", self.branches)
+
+  def create_backport_matrix(self):
+    from matrix import BackportMatrix, WORKTREES_DIR_NAME
+    return BackportMatrix(self.git_wrapper, self.branches, os.path.join(self.apply_area.path, WORKTREES_DIR_NAME),
+                          max_workers=self.matrix_workers)
+
+  def create_pull_request_source(self):
+    from pull_requests import GitHubPullRequestSearch, PullRequestFetcher, PullRequestSource
+    fetcher = PullRequestFetcher(self.git_wrapper.hadoop_repo_path, remote=self.pr_remote, lock=self.repo_locks.fetch)
+    title_search = None
+    if self.pr_title_search:
+      title_search = GitHubPullRequestSearch(token=os.environ.get("GITHUB_TOKEN"),
+                                             request_scheduler=self.request_scheduler)
+    return PullRequestSource(self.jira_wrapper, fetcher, self.patches_root, title_search=title_search)
+
+  def create_result_sinks(self):
+    from result_sinks import ConsoleRowSink, JsonLinesSink, GSheetBatchSink
+    from result_sinks import CheckpointSink
+    sinks = [CheckpointSink(self.checkpoint_journal)]
+    if self.stream_console:
+      sinks.append(ConsoleRowSink())
+    if self.jsonl_output:
+      sinks.append(JsonLinesSink(self.jsonl_output))
+    if self.issue_fetch_mode == JiraFetchMode.GSHEET and not self.shard_filter:
+      # Shards don't write to the GSheet, statuses of all shards are written once by the merge step
+      sinks.append(GSheetBatchSink(self.gsheet_wrapper, batch_size=self.gsheet_batch_size))
+    return sinks
+
+  def _sync_issues(self, issues, results):
+    if self.workers > 1:
+      return self._sync_issues_in_parallel(issues, results)
+    for issue_id in issues:
+      if self._is_valid_issue_id(issue_id):
+        self._sync_issue(issue_id, results)
+    return None
+
+  def _sync_issues_in_parallel(self, issues, results):
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+    from scheduler import AvailableChunks
+    valid_issues = (issue_id for issue_id in issues if self._is_valid_issue_id(issue_id))
+    if self.issue_fetch_mode == JiraFetchMode.JQL:
+      # Issues are dispatched as the pages of the query arrive, the most expensive ones of each chunk first
+      chunks = AvailableChunks(valid_issues)
+    else:
+      # All issues are known up front, the most expensive ones are dispatched first
+      chunks = [list(valid_issues)]
+    # Make sure the Jira client is created before the workers start using it
+    LOG.debug("Using Jira wrapper: %s", self.jira_wrapper)
+    issue_ids = []
+    # Only a few issues are queued ahead of the workers, so expensive issues of a later chunk don't wait
+    # behind the whole previous chunk
+    max_in_flight = self.workers * 2
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=self.workers) as executor:
+      for chunk in chunks:
+        issue_ids.extend(chunk)
+        for issue_id in self.get_dispatch_order(chunk):
+          if len(in_flight) >= max_in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+              future.result()
+          in_flight.add(executor.submit(self._sync_issue, issue_id, results))
+      for future in in_flight:
+        future.result()
+    return issue_ids
+
+  def get_dispatch_order(self, issue_ids):
+    from run_history import RunHistoryStore
+    from scheduler import IssueCostModel, LptScheduler
+    history_store = RunHistoryStore(self.history_db) if os.path.exists(self.history_db) else None
+    try:
+      scheduler = LptScheduler(IssueCostModel(history_store, self.patches_root, len(self.branches)))
+      return scheduler.order(issue_ids)
+    finally:
+      if history_store:
+        history_store.close()
 
+  @staticmethod
+  def _is_valid_issue_id(issue_id):
+    if not issue_id:
+      LOG.warning("Found issue with empty issue ID! One reason could be an empty row of a Google sheet!")
+      return False
+    if "-" not in issue_id:
+      LOG.warning("Found issue with suspicious issue ID: %s", issue_id)
+      return False
+    return True
+
+  def _sync_issue(self, issue_id, results):
+    with self.stage_timer.measure("issue", issue_id=issue_id):
+      self._check_issue(issue_id, results)
+
+  def _check_issue(self, issue_id, results):
+    with self.stage_timer.measure("committed_check", issue_id=issue_id):
       committed_on_branches = self.git_wrapper.get_remote_branches_committed_for_issue(issue_id)
-      LOG.info("Issue %s is committed on branches: %s", issue_id, committed_on_branches)
-      patches = self.download_latest_patches(issue_id, committed_on_branches)
-      if len(patches) == 0:
-        results[issue_id] = []
-        for branch in self.branches:
-          results[issue_id].append(PatchApply(None, branch, PatchStatus.CANNOT_FIND_PATCH))
-        LOG.warning("No patch found for Jira issue %s!", issue_id)
-        continue
+    LOG.info("Issue %s is committed on branches: %s", issue_id, committed_on_branches)
+    patches = self.download_latest_patches(issue_id, committed_on_branches)
+    if len(patches) == 0:
+      if self.pull_request_source and self.pull_request_source.add_issue(issue_id, committed_on_branches):
+        # Pull requests of all issues are fetched together, after all issues with patches are done
+        LOG.info("No patch found for Jira issue %s, checking its pull request later", issue_id)
+        return
+      LOG.warning("No patch found for Jira issue %s!", issue_id)
+      self.finish_issue(results, issue_id, self._create_cannot_find_patch_applies())
+      return
 
-      for patch in patches:
-        patch_applies = self.git_wrapper.apply_patch(patch)
-        if patch.issue_id not in results:
-          results[patch.issue_id] = []
-        results[patch.issue_id] += patch_applies
-        
-    self.set_overall_status_for_results(results)
-    LOG.info("List of Patch applies: %s", str(results))
-    return results
+    with self._get_apply_lock(), self.stage_timer.measure("apply", issue_id=issue_id):
+      patch_applies = self.apply_patches(patches)
+    if self.module_index_store:
+      self.add_module_impact(issue_id, patch_applies)
+    self.finish_issue(results, issue_id, patch_applies)
+
+  def _sync_pull_requests(self, results):
+    pending = self.pull_request_source.pending
+    if not pending:
+      return
+    with self.stage_timer.measure("pull_request_fetch"):
+      fetched_numbers = self.pull_request_source.fetch_pending()
+    for issue_id, committed_on_branches, numbers in pending:
+      numbers = [number for number in numbers if number in fetched_numbers]
+      if not numbers:
+        LOG.warning("No pull request could be fetched for Jira issue %s!", issue_id)
+        self.finish_issue(results, issue_id, self._create_cannot_find_patch_applies())
+        continue
+      # Similarly to patch files, only the latest pull request is checked
+      number = max(numbers)
+      filename, file_path = self.pull_request_source.create_patch_file(issue_id, number, "origin/" + DEFAULT_BRANCH)
+      patch = self.jira_wrapper.create_pull_request_patch(issue_id, number, filename, file_path, self.branches,
+                                                          committed_on_branches)
+      self.index_patch(patch)
+      self.git_wrapper.compute_patch_id(patch)
+      with self.stage_timer.measure("apply", issue_id=issue_id):
+        patch_applies = self.apply_patches([patch])
+      if self.module_index_store:
+        self.add_module_impact(issue_id, patch_applies)
+      self.finish_issue(results, issue_id, patch_applies)
+
+  def add_module_impact(self, issue_id, patch_applies):
+    from patch_apply import PatchStatus
+    with self.stage_timer.measure("test_impact", issue_id=issue_id):
+      for patch_apply in patch_applies:
+        patch = patch_apply.patch
+        if patch_apply.result not in (PatchStatus.APPLIES_CLEANLY, PatchStatus.THREE_WAY_CLEAN) or \
+            not patch or not patch.info:
+          continue
+        # Module layout can be different on each branch, the index of the branch tip is used
+        module_index = self.module_index_store.get_index(patch_apply.branch)
+        if module_index:
+          patch_apply.module_impact = module_index.get_impact(patch.info.paths)
+          LOG.info("[%s] Patch %s touches Maven modules on %s: %s (%d test files)", issue_id, patch.filename,
+                   patch_apply.branch, ", ".join(patch_apply.module_impact.module_names),
+                   patch_apply.module_impact.tests)
+
+  def _get_apply_lock(self):
+    # Worktrees of the backport matrix have their own locks
+    return nullcontext() if self.backport_matrix else self._apply_lock
+
+  def apply_patches(self, patches):
+    if self.backport_matrix:
+      return self.backport_matrix.apply_patches(patches)
+    patch_applies = []
+    for patch in patches:
+      patch_applies += self.git_wrapper.apply_patch(patch)
+    return patch_applies
+
+  def _create_cannot_find_patch_applies(self):
+    from patch_apply import PatchStatus, PatchApply
+    return [PatchApply(None, branch, PatchStatus.CANNOT_FIND_PATCH) for branch in self.branches]
+
+  def finish_issue(self, results, issue_id, patch_applies):
+    self.set_overall_status_for_issue(issue_id, patch_applies)
+    LOG.info("[%s] Patch applies: %s", issue_id, ", ".join("{}: {}".format(pa.branch, pa.result) for pa in patch_applies))
+    LOG.debug("[%s] List of Patch applies: %s", issue_id, str(patch_applies))
+    if self.cross_conflict_detector:
+      self.cross_conflict_detector.add(patch_applies)
+    with self._results_lock:
+      start = len(results)
+      results.add_issue(issue_id, patch_applies)
+      # Sinks get the rows as issues finish: with more than one worker, this is not the original order of issues
+      for sink in self.result_sinks:
+        sink.issue_finished(results, start)
 
   @classmethod
   def set_overall_status_for_results(cls, results):
     for issue_id, patch_applies in results.items():
-      statuses = set(map(lambda pa: pa.result, patch_applies))
-      if len(statuses) == 1 and next(iter(statuses)) == PatchStatus.PATCH_ALREADY_COMMITTED:
-        cls._set_overall_status_for_patches(issue_id, patch_applies, PatchOverallStatus("ALL COMMITTED"))
-        continue
-      
-      statuses = []
-      for patch_apply in patch_applies:
-        status = cls._translate_patch_apply_status_to_str(patch_apply)
-        statuses.append(status)
-      
-      cls._set_overall_status_for_patches(issue_id, patch_applies, PatchOverallStatus(", ".join(statuses)))
+      cls.set_overall_status_for_issue(issue_id, patch_applies)
+
+  @classmethod
+  def set_overall_status_for_issue(cls, issue_id, patch_applies):
+    from patch_apply import PatchStatus
+    from jira_patch import PatchOverallStatus
+    statuses = set(map(lambda pa: pa.result, patch_applies))
+    if len(statuses) == 1 and next(iter(statuses)) == PatchStatus.PATCH_ALREADY_COMMITTED:
+      cls._set_overall_status_for_patches(issue_id, patch_applies, PatchOverallStatus("ALL COMMITTED"))
+      return
+
+    statuses = []
+    for patch_apply in patch_applies:
+      status = cls._translate_patch_apply_status_to_str(patch_apply)
+      statuses.append(status)
+
+    cls._set_overall_status_for_patches(issue_id, patch_applies, PatchOverallStatus(", ".join(statuses)))
 
   @classmethod
   def _translate_patch_apply_status_to_str(cls, patch_apply):
+    from patch_apply import PatchStatus
     status_str = "N/A"
     if patch_apply.result == PatchStatus.CONFLICT:
       status_str = "CONFLICT"
@@ -143,6 +544,10 @@ class ReviewSync:
       status_str = "COMMITTED"
     elif patch_apply.result == PatchStatus.APPLIES_CLEANLY:
       status_str = "OK"
+    elif patch_apply.result == PatchStatus.PARTIALLY_APPLIED:
+      status_str = "PARTIALLY APPLIED"
+    elif patch_apply.result == PatchStatus.THREE_WAY_CLEAN:
+      status_str = "3WAY CLEAN"
     status = "{}: {}".format(patch_apply.branch, status_str)
     return status
 
@@ -193,9 +598,137 @@ class ReviewSync:
       '-b', '--branches', nargs='+', type=str,
       help='List of branches to apply patches that are targeted to trunk (default is trunk only)',
       required=False)
+    parser.add_argument('--root', dest='root', type=str, default=DEFAULT_ROOT, required=False,
+                        help='Root directory of the repository, patches, logs and state of reviewsync. '
+                             'Concurrent runs can share the same root, each run applies patches in its own '
+                             'worktrees (default: {})'.format(DEFAULT_ROOT))
     parser.add_argument('-v', '--verbose', action='store_true',
                         dest='verbose', default=None, required=False,
                         help='More verbose log')
+    parser.add_argument('--git-backend', dest='git_backend', type=str,
+                        choices=GitBackendType.ALLOWED_VALUES, default=GitBackendType.NATIVE, required=False,
+                        help='Backend used for ref lookups and object queries. '
+                             '"native" uses pygit2 if available, otherwise long-lived git plumbing processes, '
+                             '"gitpython" uses the GitPython object model (default: native)')
+    parser.add_argument('--max-conflict-details', dest='max_conflict_details', type=int,
+                        default=DEFAULT_MAX_CONFLICT_DETAILS, required=False,
+                        help='Maximum number of conflicting files / hunks kept per patch apply. '
+                             'Raw git apply output is saved under the log directory. '
+                             '(default: {})'.format(DEFAULT_MAX_CONFLICT_DETAILS))
+    matrix_group = parser.add_argument_group('matrix', "Arguments for backport matrix mode")
+    matrix_group.add_argument('--matrix', action='store_true',
+                              dest='matrix', default=False, required=False,
+                              help='Check every issue against all active release branches discovered from the '
+                                   'fetched refs and print an issue x branch matrix. '
+                                   'Applies on different branches run concurrently, in per-branch worktrees.')
+    matrix_group.add_argument('--matrix-branch-pattern', dest='matrix_branch_pattern', type=str,
+                              default=DEFAULT_RELEASE_BRANCH_PATTERN, required=False,
+                              help='Regex of release branch names for the matrix (default: {})'
+                              .format(DEFAULT_RELEASE_BRANCH_PATTERN))
+    matrix_group.add_argument('--matrix-active-days', dest='matrix_active_days', type=int,
+                              default=DEFAULT_ACTIVE_DAYS, required=False,
+                              help='Only include release branches with commits in this many days, '
+                                   '0 includes all of them (default: {})'.format(DEFAULT_ACTIVE_DAYS))
+    matrix_group.add_argument('--matrix-workers', dest='matrix_workers', type=int, required=False,
+                              help='Number of concurrent patch applies in matrix mode (default: number of branches)')
+
+    parser.add_argument('--workers', dest='workers', type=int, default=1, required=False,
+                        help='Number of issues processed concurrently. With more than one worker, issues are '
+                             'dispatched in the order of their predicted cost, based on the run history and '
+                             'previously downloaded patches, most expensive first. With --jql, processing starts '
+                             'with the first page, issues are ordered among the ones fetched so far. '
+                             'The final results table is printed in the original order of issues, while rows '
+                             'streamed to the console, the JSON lines output and the Google sheet are emitted '
+                             'as issues finish, in dispatch order (default: 1)')
+    parser.add_argument('--test-impact', action='store_true',
+                        dest='test_impact', default=False, required=False,
+                        help='For cleanly applying patches, report the Maven modules owning the touched paths and '
+                             'the number of test files in those modules. Modules are resolved from the pom.xml '
+                             'files of the branch tip, without checkouts, and cached by tree SHA')
+    parser.add_argument('--cross-conflicts', action='store_true',
+                        dest='cross_conflicts', default=False, required=False,
+                        help='Find pairs of cleanly (or 3-way cleanly) applying patches of different issues that '
+                             'conflict with each other. Only patches touching the same files are applied together, '
+                             'in a scratch index. Conflicting pairs are also written to the JSON lines output and '
+                             'appended to the statuses in the GSheet. Cannot be used with --shard or --resume, '
+                             'as patches of other shards or of issues finished before the interruption are not known')
+    parser.add_argument('--patch-id-window', dest='patch_id_window', type=int,
+                        default=DEFAULT_PATCH_ID_WINDOW, required=False,
+                        help='Number of recent commits per target branch whose patch-ids are compared with the '
+                             'patch-id of each patch, to detect already committed patches by content. '
+                             '0 disables the check (default: {})'.format(DEFAULT_PATCH_ID_WINDOW))
+    parser.add_argument('--classify-conflicts', action='store_true',
+                        dest='classify_conflicts', default=False, required=False,
+                        help='Run reverse and 3-way checks on conflicting patches, in a scratch index, to report '
+                             'patches that are already partially applied (PARTIALLY_APPLIED) or apply with a '
+                             '3-way merge (3WAY_CLEAN)')
+    pr_group = parser.add_argument_group('pull-requests', "Arguments for checking GitHub pull requests")
+    pr_group.add_argument('--pull-requests', action='store_true',
+                          dest='pull_requests', default=False, required=False,
+                          help='Check the latest linked GitHub pull request of issues without patch attachments. '
+                               'Pull requests are found from the remote links of the Jira issue and '
+                               'fetched with a single git fetch per run')
+    pr_group.add_argument('--pr-remote', dest='pr_remote', type=str,
+                          default=DEFAULT_PR_REMOTE, required=False,
+                          help='Remote name or URL to fetch refs/pull/<number>/head refs from (default: {})'
+                          .format(DEFAULT_PR_REMOTE))
+    pr_group.add_argument('--pr-title-search', action='store_true',
+                          dest='pr_title_search', default=False, required=False,
+                          help='If an issue has no pull request link, search GitHub for pull requests with the '
+                               'issue key in their title. Uses the GITHUB_TOKEN environment variable if set')
+
+    history_group = parser.add_argument_group('history', "Arguments for the run history database. "
+                                              "Reports are printed with: reviewsync.py report --help")
+    history_group.add_argument('--history-db', dest='history_db', type=str, required=False,
+                               help='Path of the SQLite database where results and stage durations of each run are '
+                                    'stored (default: <root>/{})'.format(HISTORY_DB_FILENAME))
+    history_group.add_argument('--no-history', action='store_true',
+                               dest='no_history', default=False, required=False,
+                               help='Do not store the results of this run in the run history database')
+
+    shard_group = parser.add_argument_group('shards', "Arguments for splitting a run into shards, "
+                                            "e.g. to run them on multiple hosts")
+    shard_group.add_argument('--shard', dest='shard', type=parse_shard, required=False,
+                             help='Only check the issues of shard i of N, specified as i/N (e.g. 1/4). '
+                                  'Issues are partitioned by a hash of their ID, so every shard process gets the '
+                                  'same partitioning. Results are written to the shard output file, '
+                                  'GSheet is only updated by --merge-shards')
+    shard_group.add_argument('--shard-output', dest='shard_output', type=str, required=False,
+                             help='Output file of the shard (default: <root>/{}/{})'
+                             .format(SHARDS_DIR_NAME, SHARD_OUTPUT_FILENAME.format("i", "N")))
+    shard_group.add_argument('--merge-shards', dest='merge_shards', nargs='+', type=str, required=False,
+                             help='Merge the output files of all shards of a run instead of running a sync: '
+                                  'print the results and update the GSheet once, if --gsheet is specified')
+
+    checkpoint_group = parser.add_argument_group('checkpoint', "Arguments for resuming interrupted runs")
+    checkpoint_group.add_argument('--resume', action='store_true',
+                                  dest='resume', default=False, required=False,
+                                  help='Resume the interrupted run from its checkpoint: finished issues are skipped, '
+                                       'the git fetch is skipped and already downloaded patch files are reused')
+    checkpoint_group.add_argument('--checkpoint-file', dest='checkpoint_file', type=str, required=False,
+                                  help='Journal of finished issues, removed when the run completes. '
+                                       'A run refuses to start while another live run uses the same journal '
+                                       '(default: <root>/{}/{}, named after a hash of the issue source)'
+                                  .format(CHECKPOINTS_DIR_NAME, CHECKPOINT_FILENAME_TEMPLATE.format("<hash>")))
+
+    request_group = parser.add_argument_group('requests', "Arguments for requests to Jira, GitHub and Google Sheets")
+    request_group.add_argument('--request-rate', dest='request_rates', type=parse_host_rate, action='append',
+                               required=False, metavar='HOST=RATE',
+                               help='Allowed requests per second to a host, can be specified multiple times. '
+                                    'Requests of all workers share the rate of their host '
+                                    '(default: {})'.format(", ".join("{}={}".format(host, rate) for host, rate
+                                                                     in DEFAULT_HOST_RATES.items())))
+    request_group.add_argument('--max-retries', dest='max_retries', type=int, default=DEFAULT_MAX_RETRIES,
+                               required=False,
+                               help='Number of retries of throttled or failed requests, with exponential backoff. '
+                                    'Retry-After headers of throttling responses are honoured (default: {})'
+                               .format(DEFAULT_MAX_RETRIES))
+
+    parser.add_argument('--stream-console', action='store_true',
+                        dest='stream_console', default=False, required=False,
+                        help='Print result rows to the console as soon as an issue is finished')
+    parser.add_argument('--jsonl-output', dest='jsonl_output', type=str, required=False,
+                        help='Append result rows to this JSON lines file as soon as an issue is finished')
 
     exclusive_group = parser.add_mutually_exclusive_group()
     exclusive_group.add_argument('-i', '--issues', nargs='+', type=str,
@@ -206,6 +739,12 @@ class ReviewSync:
                                  required=False,
                                  help='Enable reading values from Google Sheet API. '
                                       'Additional gsheet arguments need to be specified!')
+    exclusive_group.add_argument('-q', '--jql', type=str, dest='jql', required=False,
+                                 help='JQL query of Jira issues to check, '
+                                      'e.g. \'project = YARN AND status = "Patch Available"\'')
+    parser.add_argument('--jql-page-size', dest='jql_page_size', type=int,
+                        default=DEFAULT_JQL_PAGE_SIZE, required=False,
+                        help='Number of issues fetched per page in JQL mode (default: {})'.format(DEFAULT_JQL_PAGE_SIZE))
     
     # Arguments for Google sheet integration
     gsheet_group = parser.add_argument_group('google-sheet', "Arguments for Google sheet integration")
@@ -234,13 +773,23 @@ class ReviewSync:
                               dest='gsheet_status_info_column', required=False,
                               help='Name of the column where this script will store patch status info in the GSheet spreadsheet')
 
+    gsheet_group.add_argument('--gsheet-batch-size',
+                              dest='gsheet_batch_size', type=int, default=DEFAULT_GSHEET_BATCH_SIZE, required=False,
+                              help='Number of finished issues to collect before writing their status to the GSheet '
+                                   'spreadsheet (default: {})'.format(DEFAULT_GSHEET_BATCH_SIZE))
+
     # parser.add_argument(
     #   '-j', '--jira-url', type=str, help='URL of jira to check', required=True)
     args = parser.parse_args()
     print("Args: " + str(args))
     
-    if not args.issues and not args.gsheet_enable:
-      parser.error("Either list of jira issues (--issues) or Google Sheet integration (--gsheet) need to be provided!")
+    if not args.issues and not args.gsheet_enable and not args.jql and not args.merge_shards:
+      parser.error("Either list of jira issues (--issues), Google Sheet integration (--gsheet), "
+                   "a JQL query (--jql) or shard output files (--merge-shards) need to be provided!")
+    if args.shard and args.merge_shards:
+      parser.error("--shard and --merge-shards cannot be used together!")
+    if args.cross_conflicts and (args.shard or args.resume):
+      parser.error("--cross-conflicts cannot be used together with --shard or --resume!")
     
     # TODO check existence + readability on secret file!!
     if args.gsheet_enable and (args.gsheet_client_secret is None or
@@ -255,72 +804,102 @@ class ReviewSync:
     elif args.gsheet_enable:
       print("Using fetch mode: gsheet")
       args.fetch_mode = JiraFetchMode.GSHEET
-      args.gsheet_options = GSheetOptions(args.gsheet_client_secret,
-                                                    args.gsheet_spreadsheet,
-                                                    args.gsheet_worksheet,
-                                                    args.gsheet_jira_column,
-                                                    update_date_column=args.gsheet_update_date_column,
-                                                    status_column=args.gsheet_status_info_column)
+      google_sheet_module = ImportTimer.import_module("googleapiwrapper.google_sheet")
+      args.gsheet_options = google_sheet_module.GSheetOptions(args.gsheet_client_secret,
+                                                              args.gsheet_spreadsheet,
+                                                              args.gsheet_worksheet,
+                                                              args.gsheet_jira_column,
+                                                              update_date_column=args.gsheet_update_date_column,
+                                                              status_column=args.gsheet_status_info_column)
+    elif args.jql:
+      print("Using fetch mode: jql")
+      args.fetch_mode = JiraFetchMode.JQL
+    elif args.merge_shards:
+      print("Merging shard output files")
+      args.fetch_mode = None
     else:
       print("Unknown fetch mode!")
     
     return args
 
   def download_latest_patches(self, issue_id, committed_on_branches):
-    patches = self.jira_wrapper.get_patches_per_branch(issue_id, self.branches, committed_on_branches)
+    with self.stage_timer.measure("jira", issue_id=issue_id):
+      patches = self.jira_wrapper.get_patches_per_branch(issue_id, self.branches, committed_on_branches)
     for patch in patches:
       if patch.is_applicable():
         #TODO possible optimization: Just download required files based on branch applicability
-        self.jira_wrapper.download_patch_file(patch)
+        # The patch cache is shared by concurrent runs, a patch file is only read once its download is finished
+        with self.repo_locks.patch_download(issue_id):
+          if not self._reuse_downloaded_patch(patch):
+            with self.stage_timer.measure("download", issue_id=issue_id):
+              self.jira_wrapper.download_patch_file(patch)
+        self.index_patch(patch)
+        self.git_wrapper.compute_patch_id(patch)
       else:
         LOG.info("Skipping download of non-applicable patch: %s", patch)
 
-    return patches
+    return self.jira_wrapper.deduplicate_patches_by_patch_id(issue_id, patches)
+
+  def _reuse_downloaded_patch(self, patch):
+    # Patch files downloaded by an interrupted run are not downloaded again when the run is resumed.
+    # Downloads are renamed into place once complete, so an existing file is never a partial download.
+    # Called with the patch download lock of the issue held.
+    if not self.resume:
+      return False
+    file_path = os.path.join(self.patches_root, patch.issue_id, patch.filename)
+    if not os.path.isfile(file_path) or os.path.getsize(file_path) == 0:
+      return False
+    LOG.info("[%s] Reusing downloaded patch file: %s", patch.issue_id, file_path)
+    patch.file_path = file_path
+    return True
+
+  def index_patch(self, patch):
+    from patch_index import PatchIndex
+    with self.stage_timer.measure("index", issue_id=patch.issue_id):
+      try:
+        patch.info = PatchIndex.get(patch.file_path)
+      except OSError:
+        LOG.exception("[%s] Failed to index patch %s", patch.issue_id, patch.filename)
+        return
+    LOG.info("[%s] Patch %s: %s", patch.issue_id, patch.filename, patch.info)
 
   def print_results_table(self, results):
+    from pythoncommons.result_printer import BasicResultPrinter
     data, headers = self.convert_data_for_result_printer(results)
     BasicResultPrinter.print_table(data, headers)
 
+  def print_cross_conflicts(self):
+    from pythoncommons.result_printer import BasicResultPrinter
+    from cross_conflicts import CrossPatchConflictDetector
+    print("Patches applying cleanly one by one, but conflicting with each other:")
+    data, headers = CrossPatchConflictDetector.convert_data_for_result_printer(self.cross_conflicts)
+    BasicResultPrinter.print_table(data, headers)
+
+  def print_matrix(self, results):
+    from pythoncommons.result_printer import BasicResultPrinter
+    from matrix import BackportMatrix
+    data, headers = BackportMatrix.convert_data_for_matrix_printer(results, self.branches)
+    BasicResultPrinter.print_table(data, headers)
+
   def update_gsheet(self, results):
-    update_date_str = datetime.datetime.now().strftime('%d/%m/%Y %H:%M:%S')
-    
-    for issue_id, patch_applies in results.items():
-      if len(patch_applies) > 0:
-        patch = patch_applies[0].patch
-        if patch:
-          overall_status = patch.overall_status
-        else:
-          # We only have the PatchApply object here, not the Patch
-          overall_status = PatchOverallStatus(patch_applies[0].result)
-        self.gsheet_wrapper.update_issue_with_results(issue_id, update_date_str, overall_status.status)
-      
+    from result_sinks import update_gsheet
+    update_gsheet(self.gsheet_wrapper, list(results.iter_issue_statuses()))
+
   @staticmethod
   def convert_data_for_result_printer(results):
-    data = []
-    headers = ["Row", "Issue", "Patch apply", "Owner", "Patch file", "Branch", "Explicit", "Result", "Number of conflicted files", "Overall result"]
-    row = 0
-    for issue_id, patch_applies in results.items():
-      for idx, patch_apply in enumerate(patch_applies):
-        row += 1
-        patch = patch_apply.patch
-        explicit = "Yes" if patch_apply.explicit else "No"
-        conflicts = "N/A" if patch_apply.conflicts == 0 else str(patch_apply.conflicts)
-        if patch:
-          owner = patch.owner_display_name
-          filename = patch.filename
-          status = patch.overall_status.status
-        else:
-          owner = "N/A"
-          filename = "N/A"
-          status = "N/A"
-        data.append([row, issue_id, idx + 1, owner, filename,
-                     patch_apply.branch, explicit, patch_apply.result, conflicts, status])
-
-    return data, headers
+    # Rows are generated lazily from the result columns, the full table is never materialized here
+    from result_columns import ResultColumns
+    if not isinstance(results, ResultColumns):
+      results = ResultColumns.from_results(results)
+    return results.iter_rows(), ResultColumns.HEADERS
 
 
 if __name__ == '__main__':
   start_time = time.time()
+
+  if len(sys.argv) > 1 and sys.argv[1] == "report":
+    RunHistoryReport.main(sys.argv[2:], DEFAULT_ROOT)
+    sys.exit(0)
   
   # Parse args
   args = ReviewSync.parse_args()
@@ -330,13 +909,23 @@ if __name__ == '__main__':
   verbose = True if args.verbose else False
   ReviewSync.init_logger(reviewsync.log_dir, console_debug=verbose)
 
-  results = reviewsync.sync()
+  startup_time = time.time()
+  LOG.info("Startup (argument parsing and logger initialization) took %.3f seconds", startup_time - start_time)
+
+  if reviewsync.merge_shard_files:
+    results = reviewsync.merge_shards()
+  else:
+    results = reviewsync.sync()
   
+  # GSheet is updated incrementally during the sync, see GSheetBatchSink, or by merge_shards
   if results:
-    reviewsync.print_results_table(results)
-    if reviewsync.issue_fetch_mode == JiraFetchMode.GSHEET:
-      LOG.info("Updating GSheet with results...")
-      reviewsync.update_gsheet(results)
+    if reviewsync.matrix:
+      reviewsync.print_matrix(results)
+    else:
+      reviewsync.print_results_table(results)
+    if reviewsync.cross_conflicts:
+      reviewsync.print_cross_conflicts()
   
   end_time = time.time()
   LOG.info("Execution of script took %d seconds", end_time - start_time)
+  ImportTimer.log_timings()
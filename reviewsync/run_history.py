@@ -0,0 +1,244 @@
+import argparse
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+LOG = logging.getLogger(__name__)
+
+HISTORY_DB_FILENAME = "history.sqlite"
+SECONDS_PER_DAY = 24 * 60 * 60
+REMOTE_PREFIX = "origin/"
+
+# Short names accepted by the report command, values are names of PatchStatus members
+STATUS_ALIASES = {
+  "OK": "APPLIES_CLEANLY",
+  "COMMITTED": "PATCH_ALREADY_COMMITTED",
+  "ERROR": "UNKNOWN_ERROR",
+  "NO_PATCH": "CANNOT_FIND_PATCH",
+  "PARTIAL": "PARTIALLY_APPLIED",
+  "3WAY": "THREE_WAY_CLEAN",
+}
+
+SCHEMA = [
+  """CREATE TABLE IF NOT EXISTS runs (
+       id INTEGER PRIMARY KEY AUTOINCREMENT,
+       started_at REAL NOT NULL,
+       finished_at REAL NOT NULL,
+       fetch_mode TEXT,
+       branches TEXT)""",
+  """CREATE TABLE IF NOT EXISTS results (
+       run_id INTEGER NOT NULL REFERENCES runs(id),
+       issue TEXT NOT NULL,
+       branch TEXT NOT NULL,
+       status TEXT NOT NULL,
+       conflicts INTEGER NOT NULL,
+       patch_file TEXT)""",
+  """CREATE TABLE IF NOT EXISTS stage_timings (
+       run_id INTEGER NOT NULL REFERENCES runs(id),
+       issue TEXT,
+       stage TEXT NOT NULL,
+       duration REAL NOT NULL)""",
+  "CREATE INDEX IF NOT EXISTS runs_started_at ON runs(started_at)",
+  "CREATE INDEX IF NOT EXISTS results_run ON results(run_id)",
+  "CREATE INDEX IF NOT EXISTS results_issue_branch_run ON results(issue, branch, run_id)",
+  "CREATE INDEX IF NOT EXISTS stage_timings_run_stage ON stage_timings(run_id, stage)",
+  "CREATE INDEX IF NOT EXISTS stage_timings_issue_stage ON stage_timings(issue, stage, run_id)",
+]
+
+
+class StageTimer:
+  def __init__(self):
+    # List of (issue ID or None for run-level stages, stage, duration in seconds)
+    self.timings = []
+    self._lock = threading.Lock()
+
+  @contextmanager
+  def measure(self, stage, issue_id=None):
+    start_time = time.time()
+    try:
+      yield
+    finally:
+      self.add(stage, time.time() - start_time, issue_id=issue_id)
+
+  def add(self, stage, duration, issue_id=None):
+    with self._lock:
+      self.timings.append((issue_id, stage, duration))
+
+  def log_summary(self):
+    totals = {}
+    for _, stage, duration in self.timings:
+      totals[stage] = totals.get(stage, 0) + duration
+    for stage, duration in sorted(totals.items(), key=lambda item: item[1], reverse=True):
+      LOG.info("Stage %s took %.3f seconds in total", stage, duration)
+
+
+class RunHistoryStore:
+  def __init__(self, db_path):
+    self.db_path = db_path
+    # Concurrent runs may write the database at the same time, writers wait for each other
+    self.conn = sqlite3.connect(db_path, timeout=60)
+    with self.conn:
+      for statement in SCHEMA:
+        self.conn.execute(statement)
+
+  def close(self):
+    self.conn.close()
+
+  def save_run(self, started_at, finished_at, fetch_mode, branches, results, stage_timer):
+    # The whole run is appended in a single transaction
+    with self.conn:
+      cursor = self.conn.execute("INSERT INTO runs (started_at, finished_at, fetch_mode, branches) VALUES (?, ?, ?, ?)",
+                                 (started_at, finished_at, str(fetch_mode), ",".join(branches)))
+      run_id = cursor.lastrowid
+      self.conn.executemany("INSERT INTO results (run_id, issue, branch, status, conflicts, patch_file) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            ((run_id, r["issue"], self._strip_remote(r["branch"]), r["result"], r["conflicts"],
+                              r["patch_file"]) for r in results.iter_records()))
+      self.conn.executemany("INSERT INTO stage_timings (run_id, issue, stage, duration) VALUES (?, ?, ?, ?)",
+                            ((run_id, issue_id, stage, duration) for issue_id, stage, duration in stage_timer.timings))
+    LOG.info("Saved results of run %d to run history database %s", run_id, self.db_path)
+    return run_id
+
+  @staticmethod
+  def _strip_remote(branch):
+    return branch[len(REMOTE_PREFIX):] if branch.startswith(REMOTE_PREFIX) else branch
+
+  def get_status_flips(self, since, from_status, to_status):
+    # For each result since the given time with to_status, the previous result of the same issue and branch
+    # is looked up through the (issue, branch, run_id) index
+    return self.conn.execute("""
+      SELECT cur.issue, cur.branch, runs.started_at FROM runs
+      JOIN results cur ON cur.run_id = runs.id
+      WHERE runs.started_at >= ? AND cur.status = ?
+        AND (SELECT prev.status FROM results prev
+             WHERE prev.issue = cur.issue AND prev.branch = cur.branch AND prev.run_id < cur.run_id
+             ORDER BY prev.run_id DESC LIMIT 1) = ?
+      ORDER BY runs.started_at, cur.issue, cur.branch""", (since, to_status, from_status)).fetchall()
+
+  def get_stage_durations(self, since, until):
+    # Average duration of each stage in the runs of the time range, per run and per issue
+    return self.conn.execute("""
+      SELECT t.stage, AVG(t.duration), COUNT(*) FROM runs
+      JOIN stage_timings t ON t.run_id = runs.id
+      WHERE runs.started_at >= ? AND runs.started_at < ?
+      GROUP BY t.stage""", (since, until)).fetchall()
+
+  def get_slow_issues(self, since, stage, limit):
+    return self.conn.execute("""
+      SELECT t.issue, AVG(t.duration), MAX(t.duration), COUNT(*) FROM runs
+      JOIN stage_timings t ON t.run_id = runs.id
+      WHERE runs.started_at >= ? AND t.stage = ? AND t.issue IS NOT NULL
+      GROUP BY t.issue ORDER BY AVG(t.duration) DESC LIMIT ?""", (since, stage, limit)).fetchall()
+
+  def get_latest_issue_costs(self, issue_ids):
+    # key: issue ID, value: (sum of the stage durations, number of result rows) of the issue in the latest run
+    # the issue was part of. The "issue" stage is left out as it includes time spent waiting for other issues.
+    costs = {}
+    for issue_id in issue_ids:
+      row = self.conn.execute("""
+        SELECT run_id, SUM(duration) FROM stage_timings
+        WHERE issue = ? AND stage != 'issue'
+        GROUP BY run_id ORDER BY run_id DESC LIMIT 1""", (issue_id,)).fetchone()
+      if row:
+        rows = self.conn.execute("SELECT COUNT(*) FROM results WHERE issue = ? AND run_id = ?",
+                                 (issue_id, row[0])).fetchone()[0]
+        costs[issue_id] = (row[1], rows)
+    return costs
+
+
+class RunHistoryReport:
+  def __init__(self, store, output_func=print):
+    self.store = store
+    self.output_func = output_func
+
+  def report_flips(self, days, from_status, to_status):
+    since = time.time() - days * SECONDS_PER_DAY
+    from_status = STATUS_ALIASES.get(from_status, from_status)
+    to_status = STATUS_ALIASES.get(to_status, to_status)
+    rows = self.store.get_status_flips(since, from_status, to_status)
+    self.output_func("Issues that flipped from {} to {} in the last {} days: {}"
+                     .format(from_status, to_status, days, len(rows)))
+    for issue_id, branch, started_at in rows:
+      self.output_func("{}\t{}\t{}".format(self._format_time(started_at), issue_id, branch))
+    return rows
+
+  def report_stages(self, days, baseline_days):
+    now = time.time()
+    since = now - days * SECONDS_PER_DAY
+    recent = {stage: (avg, count) for stage, avg, count in self.store.get_stage_durations(since, now)}
+    baseline = {stage: (avg, count) for stage, avg, count in
+                self.store.get_stage_durations(since - baseline_days * SECONDS_PER_DAY, since)}
+    rows = []
+    for stage, (avg, count) in recent.items():
+      baseline_avg = baseline[stage][0] if stage in baseline else None
+      ratio = avg / baseline_avg if baseline_avg else None
+      rows.append((stage, avg, baseline_avg, ratio, count))
+    # Most regressed stages first
+    rows.sort(key=lambda row: row[3] if row[3] is not None else 0, reverse=True)
+    self.output_func("Average stage durations of the last {} days compared to the {} days before:"
+                     .format(days, baseline_days))
+    for stage, avg, baseline_avg, ratio, count in rows:
+      self.output_func("{}\t{:.3f}s\tbaseline: {}\tchange: {}\tsamples: {}".format(
+        stage, avg, "{:.3f}s".format(baseline_avg) if baseline_avg is not None else "N/A",
+        "{:+.1%}".format(ratio - 1) if ratio is not None else "N/A", count))
+    return rows
+
+  def report_slow_issues(self, days, stage, limit):
+    rows = self.store.get_slow_issues(time.time() - days * SECONDS_PER_DAY, stage, limit)
+    self.output_func("Slowest issues of the last {} days by stage {}:".format(days, stage))
+    for issue_id, avg, maximum, count in rows:
+      self.output_func("{}\tavg: {:.3f}s\tmax: {:.3f}s\truns: {}".format(issue_id, avg, maximum, count))
+    return rows
+
+  @staticmethod
+  def _format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+  @staticmethod
+  def parse_args(argv, default_root):
+    parser = argparse.ArgumentParser(prog="reviewsync report",
+                                     description='Reports from the run history database of reviewsync')
+    parser.add_argument('--root', dest='root', type=str, default=default_root, required=False,
+                        help='Root directory of reviewsync, the run history database is read from there '
+                             '(default: {})'.format(default_root))
+    parser.add_argument('--history-db', dest='history_db', type=str, required=False,
+                        help='Path of the run history database (default: <root>/{})'.format(HISTORY_DB_FILENAME))
+    subparsers = parser.add_subparsers(dest='report', required=True)
+
+    flips_parser = subparsers.add_parser('flips', help='Issues whose status changed between consecutive runs')
+    flips_parser.add_argument('--days', type=int, default=7, help='Time range in days (default: 7)')
+    flips_parser.add_argument('--from', dest='from_status', default="OK", help='Previous status (default: OK)')
+    flips_parser.add_argument('--to', dest='to_status', default="CONFLICT", help='New status (default: CONFLICT)')
+
+    stages_parser = subparsers.add_parser('stages', help='Stage durations compared to a baseline period')
+    stages_parser.add_argument('--days', type=int, default=7, help='Time range in days (default: 7)')
+    stages_parser.add_argument('--baseline-days', dest='baseline_days', type=int, default=28,
+                               help='Length of the baseline period before the time range in days (default: 28)')
+
+    slow_parser = subparsers.add_parser('slow-issues', help='Issues with the longest stage durations')
+    slow_parser.add_argument('--days', type=int, default=7, help='Time range in days (default: 7)')
+    slow_parser.add_argument('--stage', default="issue", help='Stage to rank issues by (default: issue)')
+    slow_parser.add_argument('--limit', type=int, default=20, help='Number of issues to list (default: 20)')
+    args = parser.parse_args(argv)
+    if not args.history_db:
+      args.history_db = os.path.join(args.root, HISTORY_DB_FILENAME)
+    return args
+
+  @classmethod
+  def main(cls, argv, default_root):
+    args = cls.parse_args(argv, default_root)
+    store = RunHistoryStore(args.history_db)
+    try:
+      report = cls(store)
+      if args.report == 'flips':
+        report.report_flips(args.days, args.from_status, args.to_status)
+      elif args.report == 'stages':
+        report.report_stages(args.days, args.baseline_days)
+      elif args.report == 'slow-issues':
+        report.report_slow_issues(args.days, args.stage, args.limit)
+    finally:
+      store.close()
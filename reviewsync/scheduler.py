@@ -0,0 +1,117 @@
+import logging
+import os
+import queue
+import threading
+
+from patch_index import INDEX_FILE_SUFFIX
+
+LOG = logging.getLogger(__name__)
+
+_END_OF_ITEMS = object()
+
+
+class IssueCostModel:
+  # Predicts the processing time of issues from the run history:
+  # - Issues processed before: duration of their stages in the latest run, scaled by the number of branches.
+  # - Other issues with patch files downloaded before: size of the patch files, with the seconds per byte
+  #   rate of the issues with known durations.
+  # - Any other issue: average duration of the issues with known durations.
+  def __init__(self, history_store, patches_root, branch_count):
+    self.history_store = history_store
+    self.patches_root = patches_root
+    self.branch_count = branch_count
+
+  def predict(self, issue_ids):
+    # key: issue ID, value: predicted cost in seconds
+    history = self.history_store.get_latest_issue_costs(issue_ids) if self.history_store else {}
+    patch_sizes = {issue_id: self._get_patch_size(issue_id) for issue_id in issue_ids}
+    costs = {}
+    for issue_id, (duration, branch_count) in history.items():
+      costs[issue_id] = duration * self.branch_count / branch_count if branch_count else duration
+    average_cost = sum(costs.values()) / len(costs) if costs else 0
+    sized_issues = [issue_id for issue_id in costs if patch_sizes[issue_id]]
+    known_bytes = sum(patch_sizes[issue_id] for issue_id in sized_issues)
+    seconds_per_byte = sum(costs[issue_id] for issue_id in sized_issues) / known_bytes if known_bytes else None
+
+    for issue_id in issue_ids:
+      if issue_id in costs:
+        continue
+      if patch_sizes[issue_id] and seconds_per_byte is not None:
+        costs[issue_id] = patch_sizes[issue_id] * seconds_per_byte
+      else:
+        costs[issue_id] = average_cost
+    LOG.info("Predicted cost of %d issues, %d of them from the run history", len(issue_ids), len(history))
+    return costs
+
+  def _get_patch_size(self, issue_id):
+    issue_dir = os.path.join(self.patches_root, issue_id)
+    if not os.path.isdir(issue_dir):
+      return 0
+    return sum(entry.stat().st_size for entry in os.scandir(issue_dir)
+               if entry.is_file() and not entry.name.endswith(INDEX_FILE_SUFFIX))
+
+
+class LptScheduler:
+  # Longest-processing-time-first: issues with the highest predicted cost are dispatched to the worker pool first,
+  # so the long running issues don't end up at the tail of the run.
+  def __init__(self, cost_model):
+    self.cost_model = cost_model
+
+  def order(self, issue_ids):
+    costs = self.cost_model.predict(issue_ids)
+    # Sort is stable, issues with the same predicted cost keep their original order
+    ordered = sorted(issue_ids, key=lambda issue_id: costs[issue_id], reverse=True)
+    if ordered:
+      LOG.info("Dispatch order of issues by predicted cost: %s",
+               ", ".join("{} ({:.1f}s)".format(issue_id, costs[issue_id]) for issue_id in ordered[:10]))
+    return ordered
+
+
+class AvailableChunks:
+  # Iterates over the items of a slow iterable (e.g. issues of JQL pages) in chunks, without waiting for all items:
+  # each chunk has the items that arrived while the previous chunk was being dispatched, at least one.
+  # Items are read by a background thread, errors of the iterable are raised after the items read before them.
+  def __init__(self, items):
+    self.items = items
+    self.queue = queue.Queue()
+    self._thread = None
+
+  def start(self):
+    if not self._thread:
+      self._thread = threading.Thread(target=self._read_items, name="chunk-reader", daemon=True)
+      self._thread.start()
+    return self
+
+  def _read_items(self):
+    try:
+      for item in self.items:
+        self.queue.put(item)
+    except Exception as e:
+      self.queue.put(_ItemsError(e))
+    finally:
+      self.queue.put(_END_OF_ITEMS)
+
+  def __iter__(self):
+    self.start()
+    while True:
+      entries = [self.queue.get()]
+      while True:
+        try:
+          entries.append(self.queue.get_nowait())
+        except queue.Empty:
+          break
+      chunk = []
+      for entry in entries:
+        if entry is _END_OF_ITEMS or isinstance(entry, _ItemsError):
+          if chunk:
+            yield chunk
+          if entry is _END_OF_ITEMS:
+            return
+          raise entry.error
+        chunk.append(entry)
+      yield chunk
+
+
+class _ItemsError:
+  def __init__(self, error):
+    self.error = error
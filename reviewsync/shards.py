@@ -0,0 +1,102 @@
+import argparse
+import json
+import logging
+import os
+import zlib
+
+LOG = logging.getLogger(__name__)
+
+SHARDS_DIR_NAME = "shards"
+SHARD_OUTPUT_FILENAME = "shard-{}-of-{}.jsonl"
+
+
+def parse_shard(value):
+  # Format: i/N, where i is the 1-based index of the shard and N is the number of shards
+  try:
+    index, count = (int(part) for part in value.split("/"))
+  except ValueError:
+    raise argparse.ArgumentTypeError("Shard should be specified as i/N, e.g. 1/4. Got: {}".format(value))
+  if count < 1 or not 1 <= index <= count:
+    raise argparse.ArgumentTypeError("Shard index should be between 1 and {}. Got: {}".format(count, value))
+  return index, count
+
+
+class ShardFilter:
+  # Keeps the issues that belong to one shard.
+  # crc32 of the issue ID is used instead of hash(), as it gives the same partitioning in every process and host.
+  def __init__(self, index, count):
+    self.index = index
+    self.count = count
+    # key: issue ID, value: position of the issue in the full issue list, used to restore the order on merge
+    self.positions = {}
+
+  def __str__(self):
+    return "{}/{}".format(self.index, self.count)
+
+  def contains(self, issue_id):
+    return zlib.crc32(issue_id.encode("utf-8")) % self.count == self.index - 1
+
+  def filter(self, issues):
+    for position, issue_id in enumerate(issues):
+      if issue_id and self.contains(issue_id):
+        self.positions.setdefault(issue_id, position)
+        yield issue_id
+
+
+class ShardOutput:
+  # Portable output of a shard: a header line followed by one JSON line per result row.
+  # Files are written to a temporary file first and renamed, so a missing file means an unfinished shard.
+  @staticmethod
+  def write(file_path, shard_filter, branches, records):
+    output_dir = os.path.dirname(file_path)
+    if output_dir and not os.path.exists(output_dir):
+      os.makedirs(output_dir, exist_ok=True)
+    tmp_file_path = file_path + ".tmp"
+    rows = 0
+    with open(tmp_file_path, "w") as f:
+      f.write(json.dumps({"shard": shard_filter.index, "shards": shard_filter.count, "branches": branches}) + "\n")
+      for record in records:
+        record["position"] = shard_filter.positions.get(record["issue"], -1)
+        f.write(json.dumps(record) + "\n")
+        rows += 1
+    os.replace(tmp_file_path, file_path)
+    LOG.info("Wrote %d result rows of shard %s to: %s", rows, shard_filter, file_path)
+
+  @staticmethod
+  def read(file_path):
+    with open(file_path, "r") as f:
+      header = json.loads(f.readline())
+      records = [json.loads(line) for line in f if line.strip()]
+    return header, records
+
+  @classmethod
+  def merge(cls, file_paths):
+    # Returns the records of all shards in the order of the original issue list, and the branches of the shards
+    headers = {}
+    branches = None
+    records = []
+    for file_path in file_paths:
+      header, shard_records = cls.read(file_path)
+      shard = (header["shard"], header["shards"])
+      if shard in headers:
+        raise ValueError("Shard {}/{} is specified twice: {} and {}".format(shard[0], shard[1], headers[shard],
+                                                                            file_path))
+      if branches is not None and header["branches"] != branches:
+        raise ValueError("Branches of shard file {} are different: {}, expected: {}"
+                         .format(file_path, header["branches"], branches))
+      headers[shard] = file_path
+      branches = header["branches"]
+      records.extend(shard_records)
+
+    counts = {count for _, count in headers}
+    if len(counts) != 1:
+      raise ValueError("Shard files are from runs with different number of shards: {}".format(sorted(headers)))
+    count = counts.pop()
+    missing = [index for index in range(1, count + 1) if (index, count) not in headers]
+    if missing:
+      raise ValueError("Missing output of shards: {}".format(", ".join("{}/{}".format(i, count) for i in missing)))
+
+    # Sort is stable, rows of an issue keep their order
+    records.sort(key=lambda record: record["position"])
+    LOG.info("Merged %d result rows of %d shards", len(records), count)
+    return records, branches
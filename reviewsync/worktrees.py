@@ -0,0 +1,47 @@
+import logging
+import os
+import shutil
+from contextlib import nullcontext
+
+from git_backend import execute_command
+
+LOG = logging.getLogger(__name__)
+
+
+class WorktreeManager:
+  def __init__(self, repo_path, worktrees_root, lock=None):
+    self.repo_path = repo_path
+    self.worktrees_root = worktrees_root
+    # Worktrees are registered in the shared repository, registration is guarded by this lock if specified
+    self.lock = lock
+
+  def get_worktree(self, name, target):
+    worktree_path = os.path.join(self.worktrees_root, name.replace("/", "_"))
+    if os.path.exists(os.path.join(worktree_path, ".git")):
+      LOG.debug("Reusing worktree %s", worktree_path)
+      return worktree_path
+    if os.path.exists(worktree_path):
+      # Leftover of an interrupted worktree creation
+      shutil.rmtree(worktree_path)
+    os.makedirs(self.worktrees_root, exist_ok=True)
+    with self.lock or nullcontext():
+      self._run(['git', 'worktree', 'prune'], self.repo_path)
+      LOG.info("Creating worktree %s for %s", worktree_path, target)
+      self._run(['git', 'worktree', 'add', '--detach', '--force', worktree_path, target], self.repo_path)
+    return worktree_path
+
+  def remove_worktree(self, worktree_path):
+    LOG.info("Removing worktree %s", worktree_path)
+    self._run(['git', 'worktree', 'remove', '--force', worktree_path], self.repo_path)
+
+  @classmethod
+  def reset(cls, worktree_path, target):
+    cls._run(['git', 'reset', '-q', '--hard', target], worktree_path)
+    cls._run(['git', 'clean', '-xdfq'], worktree_path)
+
+  @staticmethod
+  def _run(command, cwd):
+    status, stdout, stderr = execute_command(command, cwd)
+    if status != 0:
+      raise ValueError("Git command {} failed in {} with status {}: {}".format(command, cwd, status, stderr))
+    return stdout
@@ -3,5 +3,7 @@
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Modules of the reviewsync package import each other by their plain module names
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'reviewsync')))
 
 import reviewsync
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import os
+import tempfile
+import unittest
+
+from checkpoint import CheckpointJournal
+
+
+def create_rows(issue_id, result):
+    return [{"issue": issue_id, "branch": "origin/trunk", "result": result}]
+
+
+class CheckpointJournalTestSuite(unittest.TestCase):
+    """Test cases for the checkpoint journal of finished issues."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, "checkpoints", "run.jsonl")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_resume_after_crash(self):
+        journal = CheckpointJournal(self.file_path)
+        journal.start(["trunk", "branch-3.2"])
+        journal.append("YARN-1", create_rows("YARN-1", "APPLIES_CLEANLY"))
+        journal.append("YARN-2", create_rows("YARN-2", "CONFLICT"))
+        journal.close()
+        # Process died in the middle of writing an entry
+        with open(self.file_path, "a") as f:
+            f.write('{"issue": "YARN-3", "ro')
+
+        journal = CheckpointJournal(self.file_path)
+        branches, finished_issues = journal.resume()
+        self.assertEqual(["trunk", "branch-3.2"], branches)
+        self.assertEqual(["YARN-1", "YARN-2"], list(finished_issues))
+        self.assertEqual(create_rows("YARN-2", "CONFLICT"), finished_issues["YARN-2"])
+
+        journal.append("YARN-3", create_rows("YARN-3", "CONFLICT"))
+        journal.close()
+        _, finished_issues = CheckpointJournal(self.file_path).load()
+        self.assertEqual(["YARN-1", "YARN-2", "YARN-3"], list(finished_issues))
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "Open file descriptors are listed in /proc/self/fd")
+    def test_start_after_resuming_empty_journal(self):
+        journal = CheckpointJournal(self.file_path)
+        journal.start(["trunk"])
+        journal.close()
+        open_fds = len(os.listdir("/proc/self/fd"))
+
+        journal = CheckpointJournal(self.file_path)
+        self.assertEqual((["trunk"], {}), journal.resume())
+        # Nothing to skip, a new run is started on the same journal
+        journal.start(["trunk"])
+        journal.close()
+        self.assertEqual(open_fds, len(os.listdir("/proc/self/fd")))
+
+    def test_start_drops_previous_run_and_remove(self):
+        journal = CheckpointJournal(self.file_path)
+        journal.start(["trunk"])
+        journal.append("YARN-1", create_rows("YARN-1", "APPLIES_CLEANLY"))
+        journal.close()
+
+        journal = CheckpointJournal(self.file_path)
+        journal.start(["trunk"])
+        self.assertEqual((["trunk"], {}), journal.load())
+        journal.remove()
+        self.assertFalse(os.path.exists(self.file_path))
+
+    def test_journal_is_owned_by_one_run(self):
+        journal = CheckpointJournal(self.file_path)
+        journal.lock()
+        journal.start(["trunk"])
+        concurrent_journal = CheckpointJournal(self.file_path)
+        with self.assertRaises(ValueError):
+            concurrent_journal.lock()
+        # Lock is released once the run completes
+        journal.remove()
+        concurrent_journal.lock()
+        concurrent_journal.remove()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import os
+import subprocess
+import tempfile
+import unittest
+
+from conflict_classifier import ConflictClassifier
+from jira_patch import HadoopJiraPatch
+from patch_apply import PatchApplicability, PatchApply, PatchStatus
+
+FILE_CONTENT = "".join("line {}\n".format(i) for i in range(1, 11))
+
+
+def run_git(repo_path, *args):
+    env = dict(os.environ, GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@example.com",
+               GIT_COMMITTER_NAME="test", GIT_COMMITTER_EMAIL="test@example.com")
+    return subprocess.check_output(["git"] + list(args), cwd=repo_path, env=env, universal_newlines=True)
+
+
+class JiraUser:
+    def __init__(self, name):
+        self.name = name
+        self.display_name = name
+
+
+class ConflictClassifierTestSuite(unittest.TestCase):
+    """Test cases for classifying conflicting patches, run against a throwaway local repository."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.repo_path = os.path.join(self.tmp_dir.name, "hadoop")
+        os.makedirs(self.repo_path)
+        run_git(self.repo_path, "init", "-q", "-b", "base")
+        self.commit({"A.java": FILE_CONTENT, "B.java": FILE_CONTENT})
+        # The patch changes line 5 of both files
+        self.commit({"A.java": FILE_CONTENT.replace("line 5\n", "patched 5\n"),
+                     "B.java": FILE_CONTENT.replace("line 5\n", "patched 5\n")})
+        self.patch_file = os.path.join(self.tmp_dir.name, "YARN-1.001.patch")
+        with open(self.patch_file, "w") as f:
+            f.write(run_git(self.repo_path, "diff", "HEAD~1", "HEAD"))
+        run_git(self.repo_path, "reset", "-q", "--hard", "HEAD~1")
+        self.classifier = ConflictClassifier(self.repo_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def commit(self, files):
+        for filename, content in files.items():
+            with open(os.path.join(self.repo_path, filename), "w") as f:
+                f.write(content)
+        run_git(self.repo_path, "add", ".")
+        run_git(self.repo_path, "commit", "-q", "-m", "update")
+
+    def create_branch(self, branch, files):
+        # Branch is created as a remote branch, like the branches reviewsync checks
+        run_git(self.repo_path, "checkout", "-q", "-b", branch, "base")
+        self.commit(files)
+        run_git(self.repo_path, "update-ref", "refs/remotes/origin/" + branch, "HEAD")
+        run_git(self.repo_path, "checkout", "-q", "base")
+
+    def classify(self, branch):
+        patch = HadoopJiraPatch("YARN-1", JiraUser("owner"), 1, branch, os.path.basename(self.patch_file),
+                                PatchApplicability(True))
+        patch.file_path = self.patch_file
+        patch_apply = PatchApply(patch, "origin/" + branch, PatchStatus.CONFLICT, conflicts=2)
+        return self.classifier.classify(patch, "origin/" + branch, patch_apply)
+
+    def test_patch_already_committed(self):
+        self.create_branch("branch-3.2", {"A.java": FILE_CONTENT.replace("line 5\n", "patched 5\n"),
+                                          "B.java": FILE_CONTENT.replace("line 5\n", "patched 5\n")})
+        patch_apply = self.classify("branch-3.2")
+        self.assertEqual(PatchStatus.PATCH_ALREADY_COMMITTED, patch_apply.result)
+        self.assertEqual(0, patch_apply.conflicts)
+
+    def test_partially_applied(self):
+        self.create_branch("branch-3.2", {"A.java": FILE_CONTENT.replace("line 5\n", "patched 5\n"),
+                                          "B.java": FILE_CONTENT.replace("line 5\n", "other 5\n")})
+        patch_apply = self.classify("branch-3.2")
+        self.assertEqual(PatchStatus.PARTIALLY_APPLIED, patch_apply.result)
+        self.assertEqual(2, patch_apply.conflicts)
+
+    def test_three_way_clean(self):
+        # Context of the patch changed, but not the lines changed by the patch
+        self.create_branch("branch-3.2", {"A.java": FILE_CONTENT.replace("line 3\n", "changed 3\n"),
+                                          "B.java": FILE_CONTENT.replace("line 7\n", "changed 7\n")})
+        self.assertEqual(PatchStatus.THREE_WAY_CLEAN, self.classify("branch-3.2").result)
+
+    def test_conflict(self):
+        self.create_branch("branch-3.2", {"A.java": FILE_CONTENT.replace("line 5\n", "other 5\n")})
+        self.assertEqual(PatchStatus.CONFLICT, self.classify("branch-3.2").result)
+
+    def test_only_conflicts_are_classified(self):
+        patch_apply = PatchApply(None, "origin/branch-3.2", PatchStatus.APPLIES_CLEANLY)
+        self.assertIs(patch_apply, self.classifier.classify(None, "origin/branch-3.2", patch_apply))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import os
+import tempfile
+import unittest
+
+from conflict_details import ConflictDetailParser, ConflictOutputStore, truncate_output
+
+PATCH = """diff --git a/src/A.java b/src/A.java
+--- a/src/A.java
++++ b/src/A.java
+@@ -10,3 +10,3 @@ class A {
+-  int a;
++  int b;
+@@ -40,3 +40,3 @@ class A {
+-  int c;
++  int d;
+diff --git a/src/B.java b/src/B.java
+--- a/src/B.java
++++ b/src/B.java
+@@ -5,3 +5,3 @@ class B {
+-  int e;
++  int f;
+"""
+
+STDERR = """error: patch failed: src/A.java:40
+error: src/A.java: patch does not apply
+error: src/C.java: does not exist in index
+error: patch failed: src/B.java:5
+error: src/B.java: patch does not apply"""
+
+
+class ConflictDetailsTestSuite(unittest.TestCase):
+    """Test cases for parsing the output of conflicting git apply commands."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.patch_file = os.path.join(self.tmp_dir.name, "YARN-1234.001.patch")
+        with open(self.patch_file, "w") as f:
+            f.write(PATCH)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_parse_maps_failed_lines_to_hunks(self):
+        conflict_details = ConflictDetailParser.parse(STDERR, self.patch_file)
+        self.assertEqual(3, conflict_details.total)
+        self.assertFalse(conflict_details.truncated)
+        self.assertEqual([("src/A.java", 2, "patch does not apply"),
+                          ("src/C.java", None, "does not exist in index"),
+                          ("src/B.java", 1, "patch does not apply")],
+                         [(d.file, d.hunk, d.reason) for d in conflict_details.details])
+
+    def test_parse_caps_number_of_details(self):
+        conflict_details = ConflictDetailParser.parse(STDERR, self.patch_file, max_details=1)
+        self.assertEqual(1, len(conflict_details))
+        self.assertEqual(3, conflict_details.total)
+        self.assertTrue(conflict_details.truncated)
+
+    def test_save_raw_output(self):
+        store = ConflictOutputStore(self.tmp_dir.name)
+        file_path = store.save("YARN-1234", "branch-3.2", "YARN-1234.001.patch", "", STDERR)
+        with open(file_path) as f:
+            self.assertIn(STDERR, f.read())
+
+    def test_truncate_output(self):
+        self.assertEqual("abc", truncate_output("abc", max_length=3))
+        self.assertEqual("ab... (1 more characters)", truncate_output("abc", max_length=2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import os
+import subprocess
+import tempfile
+import unittest
+
+from cross_conflicts import CrossPatchConflictDetector
+from patch_apply import PatchApplicability, PatchApply, PatchStatus
+from patch_index import PatchIndex
+
+FILE_CONTENT = "".join("line {}\n".format(i) for i in range(1, 31))
+
+
+def create_diff(path, line, new_line):
+    return ("diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n"
+            "@@ -{start},3 +{start},3 @@\n line {before}\n-line {line}\n+{new_line}\n line {after}\n"
+            .format(path=path, start=line - 1, before=line - 1, line=line, new_line=new_line, after=line + 1))
+
+
+class FakePatch:
+    def __init__(self, issue_id, file_path):
+        self.issue_id = issue_id
+        self.filename = os.path.basename(file_path)
+        self.file_path = file_path
+        self.info = PatchIndex.get(file_path)
+
+    def get_applicability(self, branch):
+        return PatchApplicability(True)
+
+
+class CrossPatchConflictDetectorTestSuite(unittest.TestCase):
+    """Test cases for finding conflicting pairs of cleanly applying patches."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.repo_path = os.path.join(self.tmp_dir.name, "hadoop")
+        os.makedirs(self.repo_path)
+        for filename in ("A.java", "B.java"):
+            with open(os.path.join(self.repo_path, filename), "w") as f:
+                f.write(FILE_CONTENT)
+        for command in (["init", "-q", "-b", "trunk"], ["add", "."], ["commit", "-q", "-m", "YARN-1 Initial commit"]):
+            self._run_git(*command)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _run_git(self, *args):
+        env = dict(os.environ, GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@example.com",
+                   GIT_COMMITTER_NAME="test", GIT_COMMITTER_EMAIL="test@example.com")
+        return subprocess.check_output(["git"] + list(args), cwd=self.repo_path, env=env, universal_newlines=True)
+
+    def _write_file(self, content):
+        with open(os.path.join(self.repo_path, "A.java"), "w") as f:
+            f.write(content)
+
+    def _create_patch(self, issue_id, diff):
+        file_path = os.path.join(self.tmp_dir.name, issue_id + ".001.patch")
+        with open(file_path, "w") as f:
+            f.write(diff)
+        return FakePatch(issue_id, file_path)
+
+    def test_candidate_pairs_share_paths(self):
+        patches = [self._create_patch("YARN-2", create_diff("A.java", 5, "two")),
+                   self._create_patch("YARN-3", create_diff("B.java", 5, "three")),
+                   self._create_patch("YARN-4", create_diff("A.java", 20, "four") + create_diff("B.java", 20, "four"))]
+        self.assertEqual({(0, 2): ["A.java"], (1, 2): ["B.java"]},
+                         CrossPatchConflictDetector.get_candidate_pairs(patches))
+
+    def test_detect_conflicting_pairs(self):
+        detector = CrossPatchConflictDetector(self.repo_path)
+        detector.clean_patches["trunk"] = [
+            self._create_patch("YARN-2", create_diff("A.java", 5, "two")),
+            # Same line as YARN-2
+            self._create_patch("YARN-3", create_diff("A.java", 5, "three")),
+            # Same file, different part of it
+            self._create_patch("YARN-4", create_diff("A.java", 20, "four")),
+            self._create_patch("YARN-5", create_diff("B.java", 5, "five")),
+        ]
+        conflicts = detector.detect()
+        self.assertEqual([("trunk", "YARN-2", "YARN-3", ["A.java"])],
+                         [(c.branch, c.first.issue_id, c.second.issue_id, c.paths) for c in conflicts])
+        data, headers = CrossPatchConflictDetector.convert_data_for_result_printer(conflicts)
+        self.assertEqual([["trunk", "YARN-2", "YARN-2.001.patch", "YARN-3", "YARN-3.001.patch", "A.java"]], data)
+        self.assertEqual({"type": "cross_conflict", "branch": "trunk", "issue": "YARN-2",
+                          "patch_file": "YARN-2.001.patch", "conflicting_issue": "YARN-3",
+                          "conflicting_patch_file": "YARN-3.001.patch", "paths": ["A.java"]}, conflicts[0].to_record())
+
+    def test_three_way_clean_patches(self):
+        # Patch of YARN-6 is created with the blob of the initial commit, its context is changed on trunk afterwards
+        self._write_file(FILE_CONTENT.replace("line 12\n", "six\n"))
+        three_way_patch = self._create_patch("YARN-6", self._run_git("diff"))
+        self._write_file(FILE_CONTENT.replace("line 9\n", "changed 9\n"))
+        self._run_git("commit", "-q", "-a", "-m", "YARN-5 Change context")
+        patches = [three_way_patch,
+                   # Same file, different part of it
+                   self._create_patch("YARN-7", create_diff("A.java", 20, "seven")),
+                   # Same line as YARN-6
+                   self._create_patch("YARN-8", create_diff("A.java", 12, "eight"))]
+
+        detector = CrossPatchConflictDetector(self.repo_path)
+        for patch, result in zip(patches, [PatchStatus.THREE_WAY_CLEAN, PatchStatus.APPLIES_CLEANLY,
+                                           PatchStatus.APPLIES_CLEANLY]):
+            detector.add([PatchApply(patch, "trunk", result)])
+        detector.add([PatchApply(self._create_patch("YARN-9", create_diff("A.java", 12, "nine")), "trunk",
+                                 PatchStatus.CONFLICT)])
+        self.assertEqual(patches, detector.clean_patches["trunk"])
+        self.assertEqual([("trunk", "YARN-6", "YARN-8")],
+                         [(c.branch, c.first.issue_id, c.second.issue_id) for c in detector.detect()])
+
+
+if __name__ == '__main__':
+    unittest.main()
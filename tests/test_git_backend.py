@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import os
+import subprocess
+import tempfile
+import unittest
+
+from git_backend import GitBackendType, NativeGitBackend, create_git_backend
+
+
+def run_git(repo_path, *args):
+    env = dict(os.environ, GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@example.com",
+               GIT_COMMITTER_NAME="test", GIT_COMMITTER_EMAIL="test@example.com")
+    return subprocess.check_output(["git"] + list(args), cwd=repo_path, env=env, universal_newlines=True).strip()
+
+
+class NativeGitBackendTestSuite(unittest.TestCase):
+    """Test cases for the native git backend, run against a throwaway local repository."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.repo_path = self.tmp_dir.name
+        run_git(self.repo_path, "init", "-q")
+        with open(os.path.join(self.repo_path, "file.txt"), "w") as f:
+            f.write("content\n")
+        run_git(self.repo_path, "add", "file.txt")
+        run_git(self.repo_path, "commit", "-q", "-m", "initial")
+        self.head_sha = run_git(self.repo_path, "rev-parse", "HEAD")
+        self.backend = NativeGitBackend(self.repo_path)
+
+    def tearDown(self):
+        self.backend.close()
+        self.tmp_dir.cleanup()
+
+    def test_resolve_commit(self):
+        self.assertEqual(self.head_sha, self.backend.resolve_commit("HEAD"))
+        self.assertIsNone(self.backend.resolve_commit("does-not-exist"))
+
+    def test_create_git_backend_with_unknown_type(self):
+        with self.assertRaises(ValueError):
+            create_git_backend("unknown", self.repo_path)
+        self.assertIsNotNone(create_git_backend(GitBackendType.NATIVE, self.repo_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
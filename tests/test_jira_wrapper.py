@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import os
+import tempfile
+import unittest
+
+from jira.exceptions import JIRAError
+from requests.exceptions import Timeout
+
+from jira_wrapper import HadoopJiraWrapper
+from rate_limit import RequestScheduler
+
+HOST = "issues.example.org"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeAttachment:
+    def __init__(self, filename, data, errors=None):
+        self.filename = filename
+        self.data = data
+        # Raised by the first requests, one each
+        self.errors = list(errors or [])
+
+    def get(self):
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.data
+
+
+class FakeFields:
+    def __init__(self, attachments):
+        self.attachment = attachments
+
+
+class FakeIssue:
+    def __init__(self, attachments):
+        self.fields = FakeFields(attachments)
+
+
+class FakeJira:
+    def __init__(self, attachments, errors=None):
+        self.attachments = attachments
+        self.errors = list(errors or [])
+
+    def issue(self, issue_id):
+        if self.errors:
+            raise self.errors.pop(0)
+        return FakeIssue(self.attachments)
+
+
+class FakePatch:
+    def __init__(self, issue_id, filename):
+        self.issue_id = issue_id
+        self.filename = filename
+        self.file_path = None
+
+    def set_patch_file_path(self, file_path):
+        self.file_path = file_path
+
+
+class HadoopJiraWrapperTestSuite(unittest.TestCase):
+    """Test cases for downloading patch attachments into the patch cache."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        # The Jira client is replaced, no connection is made
+        self.jira_wrapper = HadoopJiraWrapper.__new__(HadoopJiraWrapper)
+        self.jira_wrapper.patches_root = self.tmp_dir.name
+        self.jira_wrapper.request_scheduler = None
+        self.jira_wrapper.host = HOST
+
+    def use_scheduler(self):
+        clock = FakeClock()
+        self.jira_wrapper.request_scheduler = RequestScheduler(host_rates={HOST: 1.0}, max_retries=3, base_delay=1.0,
+                                                               max_delay=60.0, clock=clock.time, sleep=clock.sleep,
+                                                               rand=lambda: 0.5)
+        return self.jira_wrapper.request_scheduler
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_download_replaces_patch_file(self):
+        data = b"diff --git a/A.cmd b/A.cmd\r\n+caf\xe9\r\n"
+        self.jira_wrapper.jira = FakeJira([FakeAttachment("YARN-1.001.patch", data)])
+        issue_dir = os.path.join(self.tmp_dir.name, "YARN-1")
+        os.makedirs(issue_dir)
+        # Leftover of an interrupted download
+        with open(os.path.join(issue_dir, "YARN-1.001.patch"), "wb") as f:
+            f.write(data[:10])
+
+        patch = FakePatch("YARN-1", "YARN-1.001.patch")
+        self.jira_wrapper.download_patch_file(patch)
+        self.assertEqual(os.path.join(issue_dir, "YARN-1.001.patch"), patch.file_path)
+        with open(patch.file_path, "rb") as f:
+            self.assertEqual(data, f.read())
+        self.assertEqual(["YARN-1.001.patch"], os.listdir(issue_dir))
+
+    def test_download_of_missing_attachment(self):
+        self.jira_wrapper.jira = FakeJira([FakeAttachment("YARN-1.001.patch", b"")])
+        with self.assertRaises(ValueError):
+            self.jira_wrapper.download_patch_file(FakePatch("YARN-1", "YARN-1.002.patch"))
+
+    def test_throttled_issue_request_is_retried(self):
+        scheduler = self.use_scheduler()
+        self.jira_wrapper.jira = FakeJira([], errors=[JIRAError(status_code=429)])
+        self.assertIsNotNone(self.jira_wrapper.get_jira_issue("YARN-1"))
+        self.assertEqual(1, scheduler.metrics[HOST].retries)
+        self.assertEqual(1, scheduler.metrics[HOST].throttled_responses)
+
+    def test_issue_is_none_if_retries_are_exhausted(self):
+        scheduler = self.use_scheduler()
+        self.jira_wrapper.jira = FakeJira([], errors=[JIRAError(status_code=503)] * 4)
+        self.assertIsNone(self.jira_wrapper.get_jira_issue("YARN-1"))
+        self.assertEqual(3, scheduler.metrics[HOST].retries)
+        self.assertEqual(1, scheduler.metrics[HOST].failures)
+
+    def test_timed_out_download_is_retried(self):
+        scheduler = self.use_scheduler()
+        attachment = FakeAttachment("YARN-1.001.patch", b"diff\n", errors=[Timeout("Read timed out")])
+        self.jira_wrapper.jira = FakeJira([attachment])
+        patch = FakePatch("YARN-1", "YARN-1.001.patch")
+        self.jira_wrapper.download_patch_file(patch)
+        with open(patch.file_path, "rb") as f:
+            self.assertEqual(b"diff\n", f.read())
+        self.assertEqual(1, scheduler.metrics[HOST].retries)
+
+
+if __name__ == '__main__':
+    unittest.main()
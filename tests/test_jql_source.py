@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import unittest
+
+from jql_source import JqlIssueStream, get_stable_jql
+
+
+class FakeJiraWrapper:
+    def __init__(self, keys, fail_at=None, max_results_limit=None, report_total=True):
+        self.keys = keys
+        self.fail_at = fail_at
+        self.max_results_limit = max_results_limit
+        self.report_total = report_total
+        self.requested_pages = []
+        self.queries = set()
+
+    def search_issue_keys(self, jql, start_at, max_results):
+        self.requested_pages.append(start_at)
+        self.queries.add(jql)
+        if self.fail_at is not None and start_at >= self.fail_at:
+            raise ValueError("Jira is down")
+        if self.max_results_limit:
+            max_results = min(max_results, self.max_results_limit)
+        return self.keys[start_at:start_at + max_results], len(self.keys) if self.report_total else None
+
+
+class JqlIssueStreamTestSuite(unittest.TestCase):
+    """Test cases for streaming issue keys of a JQL query page by page."""
+
+    def test_iterates_over_all_pages(self):
+        keys = ["YARN-{}".format(i) for i in range(7)]
+        jira_wrapper = FakeJiraWrapper(keys)
+        stream = JqlIssueStream(jira_wrapper, "project = YARN", page_size=3)
+        self.assertEqual(keys, list(stream))
+        self.assertEqual([0, 3, 6], jira_wrapper.requested_pages)
+        self.assertEqual(7, stream.fetched_issues)
+
+    def test_server_limits_page_size(self):
+        keys = ["YARN-{}".format(i) for i in range(7)]
+        jira_wrapper = FakeJiraWrapper(keys, max_results_limit=2)
+        self.assertEqual(keys, list(JqlIssueStream(jira_wrapper, "project = YARN", page_size=3)))
+        self.assertEqual([0, 2, 4, 6], jira_wrapper.requested_pages)
+
+    def test_paging_without_total(self):
+        keys = ["YARN-{}".format(i) for i in range(5)]
+        jira_wrapper = FakeJiraWrapper(keys, max_results_limit=2, report_total=False)
+        self.assertEqual(keys, list(JqlIssueStream(jira_wrapper, "project = YARN", page_size=3)))
+        # Paging stops at the first empty page
+        self.assertEqual([0, 2, 4, 5], jira_wrapper.requested_pages)
+
+    def test_pages_are_ordered_by_key(self):
+        jira_wrapper = FakeJiraWrapper(["YARN-1"])
+        list(JqlIssueStream(jira_wrapper, "project = YARN"))
+        self.assertEqual({"project = YARN ORDER BY key"}, jira_wrapper.queries)
+        self.assertEqual("project = YARN order by updated DESC, key",
+                         get_stable_jql("project = YARN order by updated DESC"))
+        self.assertEqual("project = YARN ORDER BY key DESC", get_stable_jql("project = YARN ORDER BY key DESC"))
+
+    def test_empty_result(self):
+        self.assertEqual([], list(JqlIssueStream(FakeJiraWrapper([]), "project = YARN", page_size=3)))
+
+    def test_error_is_raised_after_already_fetched_pages(self):
+        keys = ["YARN-{}".format(i) for i in range(6)]
+        stream = JqlIssueStream(FakeJiraWrapper(keys, fail_at=3), "project = YARN", page_size=3)
+        received = []
+        with self.assertRaises(ValueError):
+            for key in stream:
+                received.append(key)
+        self.assertEqual(keys[:3], received)
+
+
+if __name__ == '__main__':
+    unittest.main()
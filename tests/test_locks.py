@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from locks import PATCH_LOCK_STRIPES, ApplyArea, FileLock, RepoLocks
+
+HOLD_LOCK_SCRIPT = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from locks import FileLock
+lock = FileLock(sys.argv[2])
+lock.acquire()
+print("locked", flush=True)
+sys.stdin.readline()
+lock.release()
+"""
+
+
+class LocksTestSuite(unittest.TestCase):
+    """Test cases for the locks shared by concurrent runs."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.package_dir = os.path.dirname(os.path.abspath(reviewsync.__file__))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def hold_lock_in_other_process(self, file_path):
+        process = subprocess.Popen([sys.executable, "-c", HOLD_LOCK_SCRIPT, self.package_dir, file_path],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+        self.assertEqual("locked", process.stdout.readline().strip())
+        return process
+
+    def release_lock_in_other_process(self, process):
+        process.communicate("\n")
+        self.assertEqual(0, process.returncode)
+
+    def test_file_lock_is_exclusive_between_processes(self):
+        file_path = os.path.join(self.tmp_dir.name, "fetch.lock")
+        process = self.hold_lock_in_other_process(file_path)
+        lock = FileLock(file_path)
+        self.assertFalse(lock.acquire(blocking=False))
+        self.release_lock_in_other_process(process)
+        self.assertTrue(lock.acquire(blocking=False))
+        lock.release()
+
+    def test_file_lock_is_exclusive_between_threads(self):
+        lock = FileLock(os.path.join(self.tmp_dir.name, "refs.lock"))
+        with lock:
+            self.assertFalse(lock.acquire(blocking=False))
+        self.assertTrue(lock.acquire(blocking=False))
+        lock.release()
+
+    def test_patch_download_locks_are_striped(self):
+        locks_dir = os.path.join(self.tmp_dir.name, "locks")
+        repo_locks = RepoLocks(locks_dir)
+        self.assertIs(repo_locks.patch_download("YARN-1"), repo_locks.patch_download("YARN-1"))
+        # Lock files are not created per issue
+        locks = {repo_locks.patch_download("YARN-{}".format(number)) for number in range(1000)}
+        self.assertLessEqual(len(locks), PATCH_LOCK_STRIPES)
+        for lock in locks:
+            with lock:
+                pass
+        self.assertEqual(len(locks), len([name for name in os.listdir(locks_dir) if name.startswith("patches-")]))
+
+        # Other processes map the issue to the same lock file
+        process = self.hold_lock_in_other_process(RepoLocks(locks_dir).patch_download("YARN-1").file_path)
+        self.assertFalse(repo_locks.patch_download("YARN-1").acquire(blocking=False))
+        self.release_lock_in_other_process(process)
+
+    def test_apply_area_per_run(self):
+        root = os.path.join(self.tmp_dir.name, "apply-areas")
+        os.makedirs(root)
+        process = self.hold_lock_in_other_process(os.path.join(root, "area-0.lock"))
+        first = ApplyArea.acquire(root)
+        second = ApplyArea.acquire(root)
+        self.assertEqual(os.path.join(root, "area-1"), first.path)
+        self.assertEqual(os.path.join(root, "area-2"), second.path)
+        self.release_lock_in_other_process(process)
+
+        # Areas released by finished runs are reused
+        first.release()
+        areas = [ApplyArea.acquire(root), ApplyArea.acquire(root)]
+        self.assertEqual([os.path.join(root, "area-0"), os.path.join(root, "area-1")], [area.path for area in areas])
+        for area in areas + [second]:
+            area.release()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import os
+import subprocess
+import tempfile
+import time
+import unittest
+
+from git_wrapper import GitWrapper
+from jira_patch import HadoopJiraPatch
+from matrix import BackportMatrix
+from patch_apply import PatchApplicability, PatchStatus
+from result_columns import ResultColumns
+from worktrees import WorktreeManager
+
+SECONDS_PER_DAY = 24 * 60 * 60
+PATCH = "--- a/A.java\n+++ b/A.java\n@@ -1,3 +1,3 @@\n line 1\n-line 2\n+changed\n line 3\n"
+
+
+def run_git(repo_path, *args, commit_time=None):
+    env = dict(os.environ, GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@example.com",
+               GIT_COMMITTER_NAME="test", GIT_COMMITTER_EMAIL="test@example.com")
+    if commit_time:
+        env["GIT_COMMITTER_DATE"] = "{} +0000".format(int(commit_time))
+    return subprocess.check_output(["git"] + list(args), cwd=repo_path, env=env, universal_newlines=True).strip()
+
+
+def commit_file(repo_path, content, commit_time=None):
+    with open(os.path.join(repo_path, "A.java"), "w") as f:
+        f.write(content)
+    run_git(repo_path, "add", "A.java")
+    run_git(repo_path, "commit", "-q", "-m", "update", commit_time=commit_time)
+
+
+class JiraUser:
+    def __init__(self, name):
+        self.name = name
+        self.display_name = name
+
+
+class BackportMatrixTestSuite(unittest.TestCase):
+    """Test cases for worktrees, release branch discovery and the backport matrix, run against a local upstream."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        upstream_path = os.path.join(self.tmp_dir.name, "upstream")
+        os.makedirs(upstream_path)
+        run_git(upstream_path, "init", "-q", "-b", "trunk")
+        commit_file(upstream_path, "line 1\nline 2\nline 3\n")
+        old_commit_time = time.time() - 100 * SECONDS_PER_DAY
+        for branch, content, commit_time in [("branch-3.1", "line 1\nline 2\nline 3\nold\n", old_commit_time),
+                                             ("branch-3.2", "line 1\nline 2\nline 3\n3.2\n", None),
+                                             ("branch-3.10", "line 1\nconflict\nline 3\n", None)]:
+            run_git(upstream_path, "checkout", "-q", "-b", branch, "trunk")
+            commit_file(upstream_path, content, commit_time=commit_time)
+        run_git(upstream_path, "checkout", "-q", "trunk")
+
+        git_root = os.path.join(self.tmp_dir.name, "repos")
+        os.makedirs(git_root)
+        run_git(git_root, "clone", "-q", upstream_path, "hadoop")
+        self.git_wrapper = GitWrapper(git_root, patch_id_window=0)
+        self.git_wrapper.sync_hadoop(fetch=False)
+        self.repo_path = self.git_wrapper.hadoop_repo_path
+        self.worktrees_root = os.path.join(self.tmp_dir.name, "worktrees")
+
+    def tearDown(self):
+        self.git_wrapper.close()
+        self.tmp_dir.cleanup()
+
+    def create_patch(self, issue_id, branches):
+        file_path = os.path.join(self.tmp_dir.name, issue_id + ".001.patch")
+        with open(file_path, "w") as f:
+            f.write(PATCH)
+        patch = HadoopJiraPatch(issue_id, JiraUser("owner"), 1, branches[0], os.path.basename(file_path),
+                                PatchApplicability(True))
+        for branch in branches[1:]:
+            patch.add_additional_branch(branch, PatchApplicability(True, explicit=False))
+        patch.file_path = file_path
+        return patch
+
+    def test_worktree_creation_reset_and_reuse(self):
+        manager = WorktreeManager(self.repo_path, self.worktrees_root)
+        worktree_path = manager.get_worktree("branch-3.2", "origin/branch-3.2")
+        self.assertEqual(os.path.join(self.worktrees_root, "branch-3.2"), worktree_path)
+        with open(os.path.join(worktree_path, "A.java")) as f:
+            self.assertEqual("line 1\nline 2\nline 3\n3.2\n", f.read())
+
+        # Existing worktrees are reused as they are
+        with open(os.path.join(worktree_path, "untracked.txt"), "w") as f:
+            f.write("untracked\n")
+        self.assertEqual(worktree_path, manager.get_worktree("branch-3.2", "origin/branch-3.2"))
+        self.assertTrue(os.path.exists(os.path.join(worktree_path, "untracked.txt")))
+
+        WorktreeManager.reset(worktree_path, "origin/trunk")
+        self.assertFalse(os.path.exists(os.path.join(worktree_path, "untracked.txt")))
+        self.assertEqual(run_git(self.repo_path, "rev-parse", "origin/trunk"),
+                         run_git(worktree_path, "rev-parse", "HEAD"))
+
+    def test_worktree_leftover_is_recreated(self):
+        leftover_path = os.path.join(self.worktrees_root, "branch-3.2")
+        os.makedirs(leftover_path)
+        manager = WorktreeManager(self.repo_path, self.worktrees_root)
+        self.assertEqual(leftover_path, manager.get_worktree("branch-3.2", "origin/branch-3.2"))
+        self.assertTrue(os.path.exists(os.path.join(leftover_path, ".git")))
+
+    def test_discover_release_branches(self):
+        # Branches are sorted by version, not alphabetically
+        self.assertEqual(["branch-3.1", "branch-3.2", "branch-3.10"],
+                         self.git_wrapper.discover_release_branches(r'^branch-\d+\.\d+$'))
+        # branch-3.1 had no commit in the last 30 days
+        self.assertEqual(["branch-3.2", "branch-3.10"],
+                         self.git_wrapper.discover_release_branches(r'^branch-\d+\.\d+$', active_days=30))
+
+    def test_apply_patches_and_matrix_table(self):
+        branches = ["trunk", "branch-3.2", "branch-3.10"]
+        matrix = BackportMatrix(self.git_wrapper, branches, self.worktrees_root)
+        try:
+            patch_applies = matrix.apply_patches([self.create_patch("YARN-1", branches)])
+        finally:
+            matrix.close()
+        self.assertEqual([("origin/trunk", PatchStatus.APPLIES_CLEANLY),
+                          ("origin/branch-3.2", PatchStatus.APPLIES_CLEANLY),
+                          ("origin/branch-3.10", PatchStatus.CONFLICT)],
+                         [(patch_apply.branch, patch_apply.result) for patch_apply in patch_applies])
+        # The main working tree is not touched
+        self.assertEqual("", run_git(self.repo_path, "status", "--porcelain"))
+
+        results = ResultColumns()
+        results.add_issue("YARN-1", patch_applies)
+        data, headers = BackportMatrix.convert_data_for_matrix_printer(results, branches + ["branch-3.3"])
+        self.assertEqual(["Issue", "trunk", "branch-3.2", "branch-3.10", "branch-3.3"], headers)
+        self.assertEqual([["YARN-1", "OK", "OK", "CONFLICT (1)", "-"]], data)
+
+    def test_target_branch_outside_of_matrix_is_skipped(self):
+        matrix = BackportMatrix(self.git_wrapper, ["trunk", "branch-3.2"], self.worktrees_root)
+        try:
+            # e.g. YARN-2.branch-2.10.001.patch targets a branch the matrix has no worktree for
+            patch_applies = matrix.apply_patches([self.create_patch("YARN-2", ["trunk", "branch-2.10"])])
+        finally:
+            matrix.close()
+        self.assertEqual([("origin/trunk", PatchStatus.APPLIES_CLEANLY)],
+                         [(patch_apply.branch, patch_apply.result) for patch_apply in patch_applies])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import os
+import subprocess
+import tempfile
+import unittest
+
+from module_index import MavenModuleIndex, MavenModuleIndexStore, ModuleTrie
+
+PATHS = [
+    "pom.xml",
+    "hadoop-common-project/pom.xml",
+    "hadoop-common-project/hadoop-common/pom.xml",
+    "hadoop-common-project/hadoop-common/src/main/java/Conf.java",
+    "hadoop-common-project/hadoop-common/src/test/java/TestConf.java",
+    "hadoop-common-project/hadoop-common/src/test/java/TestFs.java",
+    "hadoop-common-project/hadoop-common/src/test/resources/core-site.xml",
+    "hadoop-yarn-project/hadoop-yarn/pom.xml",
+    "hadoop-yarn-project/hadoop-yarn/hadoop-yarn-common/pom.xml",
+    "hadoop-yarn-project/hadoop-yarn/hadoop-yarn-common/src/test/java/TestRecords.java",
+    "dev-support/bin/test-patch",
+]
+
+
+class ModuleIndexTestSuite(unittest.TestCase):
+    """Test cases for resolving paths to their Maven modules."""
+
+    def test_trie_finds_deepest_module(self):
+        trie = ModuleTrie()
+        trie.insert("a")
+        trie.insert("a/b/c")
+        self.assertEqual("a/b/c", trie.find("a/b/c/d/File.java"))
+        self.assertEqual("a", trie.find("a/b/File.java"))
+        self.assertEqual("a", trie.find("a/pom.xml"))
+        self.assertIsNone(trie.find("x/File.java"))
+
+    def test_impact(self):
+        index = MavenModuleIndex.build(PATHS)
+        self.assertEqual({".": 0, "hadoop-common-project": 0, "hadoop-common-project/hadoop-common": 2,
+                          "hadoop-yarn-project/hadoop-yarn": 0,
+                          "hadoop-yarn-project/hadoop-yarn/hadoop-yarn-common": 1}, index.test_counts)
+        impact = index.get_impact(["hadoop-common-project/hadoop-common/src/main/java/Conf.java",
+                                   "hadoop-yarn-project/hadoop-yarn/hadoop-yarn-common/src/main/java/New.java",
+                                   "dev-support/bin/test-patch"])
+        self.assertEqual([".", "hadoop-common", "hadoop-yarn-common"], impact.module_names)
+        self.assertEqual(3, impact.tests)
+
+    def test_store_caches_index_by_tree(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            repo_path = os.path.join(tmp_dir, "hadoop")
+            for path in PATHS:
+                os.makedirs(os.path.join(repo_path, os.path.dirname(path)), exist_ok=True)
+                with open(os.path.join(repo_path, path), "w") as f:
+                    f.write(path)
+            env = dict(os.environ, GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@example.com",
+                       GIT_COMMITTER_NAME="test", GIT_COMMITTER_EMAIL="test@example.com")
+            for command in (["init", "-q"], ["add", "."], ["commit", "-q", "-m", "YARN-1 Initial commit"]):
+                subprocess.check_call(["git"] + command, cwd=repo_path, env=env)
+
+            index_dir = os.path.join(tmp_dir, "module-index")
+            index = MavenModuleIndexStore(repo_path, index_dir).get_index("HEAD")
+            self.assertEqual(5, len(index.test_counts))
+            self.assertEqual(1, len(os.listdir(index_dir)))
+            # A new store loads the index of the same tree from the index directory
+            loaded_index = MavenModuleIndexStore(repo_path, index_dir).get_index("HEAD")
+            self.assertEqual(index.test_counts, loaded_index.test_counts)
+            self.assertIsNone(MavenModuleIndexStore(repo_path, index_dir).get_index("missing-branch"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import os
+import subprocess
+import tempfile
+import threading
+import unittest
+
+from patch_ids import ApplyVerdictCache, CommittedPatchIdIndex, compute_patch_id
+
+PATCH = """diff --git a/src/A.java b/src/A.java
+index 1111111..2222222 100644
+--- a/src/A.java
++++ b/src/A.java
+@@ -10,3 +10,3 @@ class A {
+   int x;
+-  int a;
++  int b;
+   int y;
+"""
+
+
+def run_git(repo_path, *args):
+    env = dict(os.environ, GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@example.com",
+               GIT_COMMITTER_NAME="test", GIT_COMMITTER_EMAIL="test@example.com")
+    return subprocess.check_output(["git"] + list(args), cwd=repo_path, env=env, universal_newlines=True)
+
+
+class FakePatchApply:
+    def __init__(self, result, conflicts=0, conflict_details=None):
+        self.result = result
+        self.conflicts = conflicts
+        self.conflict_details = conflict_details
+
+
+class PatchIdsTestSuite(unittest.TestCase):
+    """Test cases for patch-id based patch equivalence."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write_patch(self, filename, content):
+        file_path = os.path.join(self.tmp_dir.name, filename)
+        with open(file_path, "w") as f:
+            f.write(content)
+        return file_path
+
+    def test_same_diff_under_different_filenames_has_same_patch_id(self):
+        trunk_patch = self._write_patch("YARN-1234.001.patch", PATCH)
+        # Different index line and a mail header, but the same change
+        branch_patch = self._write_patch("YARN-1234.branch-3.2.002.patch",
+                                         "From: someone\nSubject: backport\n\n" +
+                                         PATCH.replace("1111111..2222222", "3333333..4444444"))
+        other_patch = self._write_patch("YARN-5678.001.patch", PATCH.replace("int b;", "int c;"))
+        patch_id = compute_patch_id(self.tmp_dir.name, trunk_patch)
+        self.assertIsNotNone(patch_id)
+        self.assertEqual(patch_id, compute_patch_id(self.tmp_dir.name, branch_patch))
+        self.assertNotEqual(patch_id, compute_patch_id(self.tmp_dir.name, other_patch))
+
+    def test_format_patch_has_same_patch_id_as_plain_diff(self):
+        repo_path = os.path.join(self.tmp_dir.name, "repo")
+        os.makedirs(repo_path)
+        run_git(repo_path, "init", "-q")
+        for filename in ("A.java", "B.java"):
+            self._write_patch(os.path.join("repo", filename), "int a;\n")
+        run_git(repo_path, "add", ".")
+        run_git(repo_path, "commit", "-q", "-m", "initial")
+        for filename in ("A.java", "B.java"):
+            self._write_patch(os.path.join("repo", filename), "int b;\n")
+            run_git(repo_path, "commit", "-q", "-a", "-m", "YARN-1234 change " + filename)
+
+        single_commit = self._write_patch("YARN-1234.001.patch", run_git(repo_path, "format-patch", "--stdout", "-1"))
+        single_diff = self._write_patch("YARN-1234.002.patch", run_git(repo_path, "diff", "HEAD~1"))
+        patch_id = compute_patch_id(repo_path, single_commit)
+        self.assertIsNotNone(patch_id)
+        self.assertEqual(compute_patch_id(repo_path, single_diff), patch_id)
+
+        # Commits of a format-patch series get the patch-id of the squashed diff
+        series = self._write_patch("YARN-1234.003.patch", run_git(repo_path, "format-patch", "--stdout", "-2"))
+        squashed_diff = self._write_patch("YARN-1234.004.patch", run_git(repo_path, "diff", "HEAD~2"))
+        self.assertIsNotNone(compute_patch_id(repo_path, series))
+        self.assertEqual(compute_patch_id(repo_path, squashed_diff), compute_patch_id(repo_path, series))
+
+    def test_apply_verdict_cache(self):
+        cache = ApplyVerdictCache()
+        self.assertIsNone(cache.get("patch-id", "tip1"))
+        cache.put("patch-id", "tip1", FakePatchApply("CONFLICT", conflicts=2))
+        self.assertEqual(2, cache.get("patch-id", "tip1").conflicts)
+        self.assertIsNone(cache.get("patch-id", "tip2"))
+        self.assertIsNone(cache.get(None, "tip1"))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(2, cache.misses)
+
+
+class CommittedPatchIdIndexTestSuite(unittest.TestCase):
+    """Test cases for detecting committed patches by content, run against a throwaway local repository."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.origin_path = os.path.join(self.tmp_dir.name, "origin")
+        self.repo_path = os.path.join(self.tmp_dir.name, "hadoop")
+        self.index_dir = os.path.join(self.tmp_dir.name, "patch-id-index")
+        os.makedirs(self.origin_path)
+        self._git(self.origin_path, "init", "-q", "-b", "trunk")
+        self._commit("A.java", "int a;\n", "YARN-1 Initial commit")
+        self._git(self.tmp_dir.name, "clone", "-q", self.origin_path, self.repo_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _git(self, cwd, *args):
+        env = dict(os.environ, GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@example.com",
+                   GIT_COMMITTER_NAME="test", GIT_COMMITTER_EMAIL="test@example.com")
+        return subprocess.check_output(["git"] + list(args), cwd=cwd, env=env, universal_newlines=True)
+
+    def _commit(self, filename, content, message):
+        with open(os.path.join(self.origin_path, filename), "w") as f:
+            f.write(content)
+        self._git(self.origin_path, "add", filename)
+        self._git(self.origin_path, "commit", "-q", "-m", message)
+        return self._git(self.origin_path, "show", "--format=", "HEAD")
+
+    def _patch_id(self, diff):
+        patch_file = os.path.join(self.tmp_dir.name, "test.patch")
+        with open(patch_file, "w") as f:
+            f.write(diff)
+        return compute_patch_id(self.repo_path, patch_file)
+
+    def test_index_is_updated_incrementally(self):
+        index = CommittedPatchIdIndex(self.repo_path, self.index_dir, window=10)
+        # Committed with a typo in the issue key
+        diff = self._commit("B.java", "int b;\n", "YARN-22 Typo in key")
+        self.assertFalse(index.contains("trunk", self._patch_id(diff)))
+
+        self._git(self.repo_path, "fetch", "-q", "origin")
+        index = CommittedPatchIdIndex(self.repo_path, self.index_dir, window=10)
+        self.assertTrue(index.contains("trunk", self._patch_id(diff)))
+        self.assertFalse(index.contains("trunk", None))
+
+    def test_window_limits_indexed_commits(self):
+        first_diff = self._commit("B.java", "int b;\n", "YARN-2")
+        second_diff = self._commit("C.java", "int c;\n", "YARN-3")
+        self._git(self.repo_path, "fetch", "-q", "origin")
+        index = CommittedPatchIdIndex(self.repo_path, self.index_dir, window=1)
+        self.assertTrue(index.contains("trunk", self._patch_id(second_diff)))
+        self.assertFalse(index.contains("trunk", self._patch_id(first_diff)))
+
+    def test_loaded_branches_do_not_wait_for_other_builds(self):
+        building = threading.Event()
+        finish_build = threading.Event()
+
+        class SlowIndex(CommittedPatchIdIndex):
+            def _load_or_build(self, branch):
+                if branch == "branch-3.2":
+                    building.set()
+                    finish_build.wait(10)
+                return [branch + "-patch-id"]
+
+        index = SlowIndex(self.repo_path, self.index_dir)
+        self.assertTrue(index.contains("trunk", "trunk-patch-id"))
+        thread = threading.Thread(target=index.contains, args=("branch-3.2", "patch-id"))
+        thread.start()
+        try:
+            self.assertTrue(building.wait(10))
+            # branch-3.2 is still being built
+            lookup = threading.Thread(target=index.contains, args=("trunk", "trunk-patch-id"))
+            lookup.start()
+            lookup.join(2)
+            self.assertFalse(lookup.is_alive())
+        finally:
+            finish_build.set()
+            thread.join()
+        self.assertTrue(index.contains("branch-3.2", "branch-3.2-patch-id"))
+
+
+if __name__ == '__main__':
+    unittest.main()
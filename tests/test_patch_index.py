@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import hashlib
+import os
+import tempfile
+import time
+import unittest
+
+from patch_index import INDEX_FILE_SUFFIX, PatchIndex, get_module
+
+PATCH = """From 1111111 Mon Sep 17 00:00:00 2001
+Subject: [PATCH] YARN-1234. Fix the scheduler
+
+diff --git a/hadoop-yarn-project/hadoop-yarn/hadoop-yarn-common/src/main/java/A.java b/hadoop-yarn-project/hadoop-yarn/hadoop-yarn-common/src/main/java/A.java
+index 1111111..2222222 100644
+--- a/hadoop-yarn-project/hadoop-yarn/hadoop-yarn-common/src/main/java/A.java
++++ b/hadoop-yarn-project/hadoop-yarn/hadoop-yarn-common/src/main/java/A.java
+@@ -10,3 +10,3 @@ class A {
+   int x;
+--- removed line that looks like a file header
++  int b;
+@@ -30,3 +30,3 @@ class A {
+   int y;
+-  int c;
++  int d;
+diff --git a/hadoop-common-project/hadoop-common/src/test/java/B.java b/hadoop-common-project/hadoop-common/src/test/java/B.java
+new file mode 100644
+index 0000000..3333333
+--- /dev/null
++++ b/hadoop-common-project/hadoop-common/src/test/java/B.java
+@@ -0,0 +1 @@
++class B {}
+diff --git a/pom.xml b/pom.xml
+deleted file mode 100644
+index 4444444..0000000
+--- a/pom.xml
++++ /dev/null
+@@ -1 +0,0 @@
+-<project/>
+diff --git a/dev-support/icon.png b/dev-support/icon.png
+Binary files a/dev-support/icon.png and b/dev-support/icon.png differ
+"""
+
+
+class PatchIndexTestSuite(unittest.TestCase):
+    """Test cases for indexing diff headers of patch files."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.patch_file = os.path.join(self.tmp_dir.name, "YARN-1234.001.patch")
+        with open(self.patch_file, "w") as f:
+            f.write(PATCH)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_scan(self):
+        info = PatchIndex.scan(self.patch_file)
+        self.assertEqual(len(PATCH.encode()), info.size)
+        self.assertEqual(hashlib.sha256(PATCH.encode()).hexdigest(), info.sha256)
+        self.assertEqual({"hadoop-yarn-project/hadoop-yarn/hadoop-yarn-common/src/main/java/A.java": 2,
+                          "hadoop-common-project/hadoop-common/src/test/java/B.java": 1,
+                          "pom.xml": 1,
+                          "dev-support/icon.png": 0}, info.hunks)
+        self.assertEqual(4, info.total_hunks)
+        self.assertEqual([".", "dev-support", "hadoop-common", "hadoop-yarn-common"], info.modules)
+
+    def test_index_file_is_reused_until_patch_changes(self):
+        info = PatchIndex.get(self.patch_file)
+        self.assertTrue(os.path.exists(self.patch_file + INDEX_FILE_SUFFIX))
+        self.assertEqual(info.hunks, PatchIndex.get(self.patch_file).hunks)
+
+        with open(self.patch_file, "a") as f:
+            f.write("diff --git a/C.txt b/C.txt\n--- a/C.txt\n+++ b/C.txt\n@@ -1 +1 @@\n-a\n+b\n")
+        future = time.time() + 10
+        os.utime(self.patch_file, (future, future))
+        self.assertIn("C.txt", PatchIndex.get(self.patch_file).hunks)
+
+    def test_empty_patch(self):
+        open(self.patch_file, "w").close()
+        info = PatchIndex.scan(self.patch_file)
+        self.assertEqual((0, {}), (info.size, info.hunks))
+
+    def test_get_module(self):
+        self.assertEqual("hadoop-yarn-common", get_module("hadoop-yarn-project/hadoop-yarn/hadoop-yarn-common/src/main/A.java"))
+        self.assertEqual("dev-support", get_module("dev-support/bin/test-patch"))
+        self.assertEqual(".", get_module("pom.xml"))
+
+
+if __name__ == '__main__':
+    unittest.main()
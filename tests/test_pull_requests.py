@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import os
+import subprocess
+import tempfile
+import unittest
+
+from pull_requests import PullRequestFetcher, get_pull_request_numbers_from_urls
+
+
+def run_git(cwd, *args):
+    env = dict(os.environ, GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@example.com",
+               GIT_COMMITTER_NAME="test", GIT_COMMITTER_EMAIL="test@example.com")
+    return subprocess.check_output(["git"] + list(args), cwd=cwd, env=env, universal_newlines=True).strip()
+
+
+class PullRequestsTestSuite(unittest.TestCase):
+    """Test cases for fetching pull requests, with a local bare repository standing in for GitHub."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.github_path = os.path.join(self.tmp_dir.name, "github.git")
+        work_path = os.path.join(self.tmp_dir.name, "work")
+        self.repo_path = os.path.join(self.tmp_dir.name, "hadoop")
+        run_git(self.tmp_dir.name, "init", "-q", "--bare", self.github_path)
+        run_git(self.tmp_dir.name, "init", "-q", "-b", "trunk", work_path)
+        self._commit(work_path, "A.java", "int a;\n", "Initial commit")
+        self._commit(work_path, "B.cmd", b"@echo off\r\necho one\r\n", "Windows script")
+        run_git(work_path, "push", "-q", self.github_path, "trunk")
+        # Pull request heads are only available under refs/pull/, like on GitHub
+        for number, filename, content in ((11, "B.java", "int b;\n"), (12, "B.java", "int c;\n"),
+                                          (13, "B.cmd", b"@echo off\r\necho caf\xe9\r\n")):
+            run_git(work_path, "checkout", "-q", "-b", "pr-{}".format(number), "trunk")
+            self._commit(work_path, filename, content, "YARN-1234. PR {}".format(number))
+            run_git(work_path, "push", "-q", self.github_path, "HEAD:refs/pull/{}/head".format(number))
+        run_git(self.tmp_dir.name, "clone", "-q", self.github_path, self.repo_path)
+        self.fetcher = PullRequestFetcher(self.repo_path, remote="origin")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def _commit(cwd, filename, content, message):
+        with open(os.path.join(cwd, filename), "wb" if isinstance(content, bytes) else "w") as f:
+            f.write(content)
+        run_git(cwd, "add", filename)
+        run_git(cwd, "commit", "-q", "-m", message)
+
+    def test_fetch_all_pull_requests_at_once(self):
+        self.assertEqual([11, 12], self.fetcher.fetch([12, 11, 12]))
+        file_path = os.path.join(self.tmp_dir.name, "patches", "YARN-1234", "YARN-1234.PR-12.patch")
+        self.fetcher.write_patch_file(12, "origin/trunk", file_path)
+        with open(file_path) as f:
+            diff = f.read()
+        self.assertIn("+int c;", diff)
+        self.assertNotIn("A.java", diff)
+        run_git(self.repo_path, "apply", "--check", file_path)
+
+    def test_patch_keeps_line_endings_and_encoding(self):
+        self.assertEqual([13], self.fetcher.fetch([13]))
+        file_path = os.path.join(self.tmp_dir.name, "patches", "YARN-1234", "YARN-1234.PR-13.patch")
+        self.fetcher.write_patch_file(13, "origin/trunk", file_path)
+        with open(file_path, "rb") as f:
+            diff = f.read()
+        self.assertIn(b"+echo caf\xe9\r\n", diff)
+        run_git(self.repo_path, "checkout", "-q", "origin/trunk")
+        run_git(self.repo_path, "apply", "--check", file_path)
+
+    def test_fetch_skips_missing_pull_requests(self):
+        self.assertEqual([11], self.fetcher.fetch([11, 99]))
+
+    def test_missing_pull_requests_do_not_fall_back_to_single_fetches(self):
+        fetches = []
+        fetch_refspecs = self.fetcher._fetch_refspecs
+
+        def counting_fetch_refspecs(numbers):
+            fetches.append(numbers)
+            return fetch_refspecs(numbers)
+        self.fetcher._fetch_refspecs = counting_fetch_refspecs
+        self.assertEqual([11, 12, 13], self.fetcher.fetch([11, 97, 12, 98, 13, 99]))
+        # The failed batch, then one batch of the existing pull requests
+        self.assertEqual([[11, 12, 13, 97, 98, 99], [11, 12, 13]], fetches)
+        run_git(self.repo_path, "rev-parse", "--verify", "refs/reviewsync/pull/13")
+
+    def test_get_pull_request_numbers_from_urls(self):
+        urls = ["https://github.com/apache/hadoop/pull/1234", "https://github.com/apache/hadoop/pull/99/files",
+                "https://github.com/other/hadoop/pull/5", None, "https://issues.apache.org/jira/browse/YARN-1"]
+        self.assertEqual([99, 1234], get_pull_request_numbers_from_urls(urls))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import unittest
+
+from rate_limit import RequestScheduler, TokenBucket, get_retry_after, get_status_code, parse_host_rate
+
+HOST = "issues.apache.org"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeRequestsResponse(FakeResponse):
+    # Like requests.Response, it is falsy for error status codes
+    def __bool__(self):
+        return self.status_code < 400
+
+
+class FakeHTTPError(Exception):
+    def __init__(self, status_code, headers=None, response_class=FakeResponse):
+        super().__init__("HTTP {}".format(status_code))
+        self.response = response_class(status_code, headers)
+
+
+class FakeRequest:
+    # Fails with the given errors, then returns the result
+    def __init__(self, clock, *errors):
+        self.clock = clock
+        self.errors = list(errors)
+        self.call_times = []
+
+    def __call__(self):
+        self.call_times.append(self.clock.now)
+        if self.errors:
+            raise self.errors.pop(0)
+        return "result"
+
+
+class RateLimitTestSuite(unittest.TestCase):
+    """Test cases for the rate limited request scheduler."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def create_scheduler(self, rate=1.0, max_retries=3):
+        return RequestScheduler(host_rates={HOST: rate}, max_retries=max_retries, base_delay=1.0, max_delay=60.0,
+                                clock=self.clock.time, sleep=self.clock.sleep, rand=lambda: 0.5)
+
+    def test_token_bucket_limits_rate(self):
+        bucket = TokenBucket(2.0, capacity=2, clock=self.clock.time, sleep=self.clock.sleep)
+        for _ in range(6):
+            bucket.acquire()
+        # The first 2 requests are a burst, the others are 0.5 seconds apart
+        self.assertEqual(2.0, self.clock.now)
+
+    def test_retry_after_pauses_host(self):
+        scheduler = self.create_scheduler()
+        request = FakeRequest(self.clock, FakeHTTPError(429, {"Retry-After": "30"}))
+        self.assertEqual("result", scheduler.call(HOST, request))
+        self.assertEqual([0.0, 30.0], request.call_times)
+
+        # Other requests to the host waited for the pause too, then continue at the allowed rate
+        other_request = FakeRequest(self.clock)
+        scheduler.call(HOST, other_request)
+        self.assertEqual([31.0], other_request.call_times)
+        metrics = scheduler.metrics[HOST]
+        self.assertEqual((3, 1, 1, 0), (metrics.requests, metrics.retries, metrics.throttled_responses,
+                                        metrics.failures))
+        self.assertEqual(31.0, metrics.throttled_time)
+
+    def test_exponential_backoff(self):
+        scheduler = self.create_scheduler(rate=100.0)
+        request = FakeRequest(self.clock, FakeHTTPError(502), ConnectionResetError(), FakeHTTPError(500))
+        self.assertEqual("result", scheduler.call(HOST, request))
+        # Delays of 1, 2 and 4 seconds, with a jitter of 0.5 applied to their random half
+        self.assertEqual([0.75, 1.5, 3.0], self.clock.sleeps)
+
+    def test_no_retry_of_client_errors(self):
+        scheduler = self.create_scheduler()
+        request = FakeRequest(self.clock, FakeHTTPError(404))
+        self.assertRaises(FakeHTTPError, scheduler.call, HOST, request)
+        self.assertEqual(1, len(request.call_times))
+        self.assertRaises(KeyError, scheduler.call, HOST, FakeRequest(self.clock, KeyError("key")))
+        self.assertEqual(2, scheduler.metrics[HOST].failures)
+
+    def test_retries_exhausted(self):
+        scheduler = self.create_scheduler(max_retries=2)
+        request = FakeRequest(self.clock, *[FakeHTTPError(503) for _ in range(3)])
+        self.assertRaises(FakeHTTPError, scheduler.call, HOST, request)
+        self.assertEqual(3, len(request.call_times))
+
+    def test_retry_after_longer_than_max_delay(self):
+        scheduler = self.create_scheduler()
+        request = FakeRequest(self.clock, FakeHTTPError(429, {"Retry-After": "3600"}))
+        self.assertRaises(FakeHTTPError, scheduler.call, HOST, request)
+
+    def test_get_retry_after(self):
+        self.assertEqual(120.0, get_retry_after(FakeHTTPError(429, {"retry-after": "120"})))
+        self.assertEqual(10.0, get_retry_after(FakeHTTPError(503, {"Retry-After": "Thu, 01 Jan 1970 00:00:10 GMT"}),
+                                               now=0))
+        self.assertEqual(50.0, get_retry_after(FakeHTTPError(403, {"X-RateLimit-Remaining": "0",
+                                                                   "X-RateLimit-Reset": "1050"}), now=1000))
+        self.assertIsNone(get_retry_after(FakeHTTPError(503)))
+
+    def test_falsy_response(self):
+        error = FakeHTTPError(429, {"Retry-After": "30"}, response_class=FakeRequestsResponse)
+        self.assertFalse(error.response)
+        self.assertEqual(429, get_status_code(error))
+        self.assertEqual(30.0, get_retry_after(error))
+        scheduler = self.create_scheduler()
+        request = FakeRequest(self.clock, FakeHTTPError(404, response_class=FakeRequestsResponse))
+        self.assertRaises(FakeHTTPError, scheduler.call, HOST, request)
+        # Client errors are not retried
+        self.assertEqual(1, len(request.call_times))
+
+    def test_parse_host_rate(self):
+        self.assertEqual((HOST, 1.5), parse_host_rate(HOST + "=1.5"))
+        for value in [HOST, HOST + "=0", HOST + "=x", "=1"]:
+            self.assertRaises(ValueError, parse_host_rate, value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import json
+import unittest
+
+from pythoncommons.jira_wrapper import PatchOverallStatus
+
+from jira_patch import HadoopJiraPatch
+from module_index import ModuleImpact
+from patch_apply import PatchApplicability, PatchApply, PatchStatus
+from patch_index import PatchInfo
+from result_columns import EXPLICIT_UNKNOWN, MODULE_TESTS_UNKNOWN, NOT_AVAILABLE, ResultColumns
+
+
+class JiraUser:
+    def __init__(self, name):
+        self.name = name
+        self.display_name = name
+
+
+def create_patch(issue_id, filename="001.patch", branches=("trunk",)):
+    patch = HadoopJiraPatch(issue_id, JiraUser("owner"), 1, branches[0], "{}.{}".format(issue_id, filename),
+                            PatchApplicability(True))
+    for branch in branches[1:]:
+        patch.add_additional_branch(branch, PatchApplicability(True, explicit=False))
+    return patch
+
+
+class ResultColumnsTestSuite(unittest.TestCase):
+    """Test cases for the column-oriented storage of results."""
+
+    def create_results(self):
+        patch = create_patch("YARN-1", branches=("trunk", "branch-3.2"))
+        patch.set_overall_status(PatchOverallStatus("ALL APPLIES CLEANLY: 1 of 2"))
+        patch.info = PatchInfo(1234, "sha", {"hadoop-yarn-common/src/main/A.java": 1})
+        clean = PatchApply(patch, "origin/trunk", PatchStatus.APPLIES_CLEANLY)
+        clean.module_impact = ModuleImpact(["hadoop-yarn-project/hadoop-yarn-common"], 42)
+        conflict = PatchApply(patch, "origin/branch-3.2", PatchStatus.CONFLICT, conflicts=3)
+        columns = ResultColumns()
+        columns.add_issue("YARN-1", [clean, conflict])
+        columns.add_issue("YARN-2", [PatchApply(None, "origin/trunk", PatchStatus.CANNOT_FIND_PATCH)])
+        return columns
+
+    def test_add_issue(self):
+        columns = self.create_results()
+        self.assertEqual(3, len(columns))
+        self.assertEqual(["YARN-1", "YARN-1", "YARN-2"], columns.issue_ids)
+        self.assertEqual([PatchStatus.APPLIES_CLEANLY, PatchStatus.CONFLICT, PatchStatus.CANNOT_FIND_PATCH],
+                         [columns.get_result(idx) for idx in range(len(columns))])
+        self.assertEqual([True, False, None], [columns.get_explicit(idx) for idx in range(len(columns))])
+        self.assertEqual(EXPLICIT_UNKNOWN, columns.explicit[2])
+        self.assertEqual([42, MODULE_TESTS_UNKNOWN, MODULE_TESTS_UNKNOWN], list(columns.module_tests))
+        self.assertEqual([1234, 1234, 0], list(columns.patch_sizes))
+
+    def test_iter_rows(self):
+        rows = list(self.create_results().iter_rows())
+        self.assertEqual(len(ResultColumns.HEADERS), len(rows[0]))
+        self.assertEqual([1, "YARN-1", 1, "owner", "YARN-1.001.patch", "1234", "hadoop-yarn-common", "origin/trunk",
+                          "Yes", "APPLIES CLEANLY", NOT_AVAILABLE, "hadoop-yarn-common", "42",
+                          "ALL APPLIES CLEANLY: 1 of 2"], rows[0])
+        self.assertEqual([2, "YARN-1", 2, "No", "CONFLICT", "3", NOT_AVAILABLE, NOT_AVAILABLE],
+                         rows[1][:3] + rows[1][8:13])
+        self.assertEqual([3, "YARN-2", 1, NOT_AVAILABLE, NOT_AVAILABLE, NOT_AVAILABLE, "No"],
+                         rows[2][:6] + [rows[2][8]])
+        # Rows can be generated from the first row of an issue
+        self.assertEqual(rows[2:], list(self.create_results().iter_rows(start=2)))
+
+    def test_records_round_trip(self):
+        columns = self.create_results()
+        records = [json.loads(json.dumps(record)) for record in columns.iter_records()]
+        restored = ResultColumns()
+        for record in records:
+            restored.add_record(record)
+        self.assertEqual(list(columns.iter_rows()), list(restored.iter_rows()))
+        self.assertEqual(records, list(restored.iter_records()))
+        self.assertIsNone(records[2]["explicit"])
+        self.assertEqual(MODULE_TESTS_UNKNOWN, records[1]["module_tests"])
+
+    def test_reorder(self):
+        columns = self.create_results()
+        reordered = columns.reorder(["YARN-2", "YARN-1"])
+        self.assertEqual(["YARN-2", "YARN-1", "YARN-1"], reordered.issue_ids)
+        # Rows of an issue keep their order
+        self.assertEqual([PatchStatus.CANNOT_FIND_PATCH, PatchStatus.APPLIES_CLEANLY, PatchStatus.CONFLICT],
+                         [reordered.get_result(idx) for idx in range(len(reordered))])
+        self.assertEqual([MODULE_TESTS_UNKNOWN, 42, MODULE_TESTS_UNKNOWN], list(reordered.module_tests))
+        # Issues not in the order are moved to the end
+        self.assertEqual(["YARN-2", "YARN-1", "YARN-1"], columns.reorder(["YARN-2"]).issue_ids)
+
+    def test_issue_statuses(self):
+        # Issues without a patch have no overall status, their result is used instead
+        self.assertEqual([("YARN-1", "ALL APPLIES CLEANLY: 1 of 2"), ("YARN-2", PatchStatus.CANNOT_FIND_PATCH.value)],
+                         list(self.create_results().iter_issue_statuses()))
+
+
+if __name__ == '__main__':
+    unittest.main()
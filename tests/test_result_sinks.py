@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import json
+import os
+import tempfile
+import unittest
+
+from checkpoint import CheckpointJournal
+from cross_conflicts import CrossConflict
+from gsheet_wrapper import HadoopGSheetWrapper
+from patch_apply import PatchApply, PatchStatus
+from rate_limit import SHEETS_HOST, RequestScheduler
+from result_columns import ResultColumns
+from result_sinks import CheckpointSink, ConsoleRowSink, GSheetBatchSink, JsonLinesSink, ResultSink
+
+
+def add_issue(results, issue_id, *branches):
+    start = len(results)
+    results.add_issue(issue_id, [PatchApply(None, "origin/" + branch, PatchStatus.CANNOT_FIND_PATCH)
+                                 for branch in branches])
+    return start
+
+
+class FakePatch:
+    def __init__(self, issue_id):
+        self.issue_id = issue_id
+        self.filename = issue_id + ".001.patch"
+
+
+class FakeGSheetWrapper:
+    def __init__(self):
+        self.updates = []
+
+    def update_issue_with_results(self, issue_id, date_str, status):
+        self.updates.append([(issue_id, status)])
+
+
+class FakeCell:
+    def __init__(self, issue_id, column):
+        self.issue_id = issue_id
+        self.column = column
+        self.value = ""
+
+
+class FakeCellUpdate:
+    def __init__(self, issue_id):
+        self.update_date_cell = FakeCellWrapper(FakeCell(issue_id, "update_date"))
+        self.status_cell = FakeCellWrapper(FakeCell(issue_id, "status"))
+
+
+class FakeCellWrapper:
+    def __init__(self, cell):
+        self.cell = cell
+
+
+class FakeSheet:
+    def __init__(self):
+        self.requests = []
+
+    def update_cells(self, cells):
+        self.requests.append(list(cells))
+
+
+class FakeOptions:
+    do_update_date = True
+    do_update_status = True
+
+
+class FakeBatchGSheetWrapper(HadoopGSheetWrapper):
+    # Sheet with fetched cells of YARN-1 to YARN-9, like GSheetWrapper after fetch_jira_data.
+    # Credentials are not needed, GSheetWrapper.__init__ is not called.
+    def __init__(self):
+        self.options = FakeOptions()
+        self.sheet = FakeSheet()
+        self.issue_to_cellupdate = {"YARN-{}".format(i): FakeCellUpdate("YARN-{}".format(i)) for i in range(1, 10)}
+
+    @property
+    def updates(self):
+        # Written statuses per request
+        return [[(cell.issue_id, cell.value) for cell in cells if cell.column == "status"]
+                for cells in self.sheet.requests]
+
+
+class ResultSinksTestSuite(unittest.TestCase):
+    """Test cases for the sinks receiving the rows of finished issues."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.results = ResultColumns()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def finish_issues(self, sink, *issue_ids):
+        for issue_id in issue_ids:
+            sink.issue_finished(self.results, add_issue(self.results, issue_id, "trunk", "branch-3.2"))
+
+    def test_base_sink_ignores_issues(self):
+        sink = ResultSink()
+        self.finish_issues(sink, "YARN-1")
+        sink.close()
+
+    def test_console_sink(self):
+        lines = []
+        self.finish_issues(ConsoleRowSink(output_func=lines.append), "YARN-1", "YARN-2")
+        # Header is printed once, then the rows of each issue
+        self.assertEqual(5, len(lines))
+        self.assertEqual(" | ".join(ResultColumns.HEADERS), lines[0])
+        self.assertTrue(lines[3].startswith("3 | YARN-2 | 1 | "))
+
+    def test_json_lines_sink(self):
+        file_path = os.path.join(self.tmp_dir.name, "results.jsonl")
+        sink = JsonLinesSink(file_path)
+        self.finish_issues(sink, "YARN-1", "YARN-2")
+        sink.close()
+        with open(file_path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(list(self.results.iter_records()), records)
+
+    def test_json_lines_sink_cross_conflicts(self):
+        file_path = os.path.join(self.tmp_dir.name, "results.jsonl")
+        sink = JsonLinesSink(file_path)
+        self.finish_issues(sink, "YARN-1", "YARN-2")
+        conflict = CrossConflict("origin/trunk", FakePatch("YARN-1"), FakePatch("YARN-2"), ["A.java"])
+        sink.cross_conflicts_found([conflict])
+        sink.close()
+        with open(file_path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(5, len(records))
+        self.assertEqual(conflict.to_record(), records[-1])
+
+    def test_gsheet_sink_batches(self):
+        gsheet_wrapper = FakeBatchGSheetWrapper()
+        sink = GSheetBatchSink(gsheet_wrapper, batch_size=2)
+        self.finish_issues(sink, "YARN-1")
+        self.assertEqual([], gsheet_wrapper.updates)
+        self.finish_issues(sink, "YARN-2", "YARN-3")
+        sink.close()
+        status = PatchStatus.CANNOT_FIND_PATCH.value
+        # One update request per batch, with the update date and status cells of the issues of the batch only
+        self.assertEqual([[("YARN-1", status), ("YARN-2", status)], [("YARN-3", status)]], gsheet_wrapper.updates)
+        self.assertEqual([4, 2], [len(cells) for cells in gsheet_wrapper.sheet.requests])
+
+    def test_gsheet_sink_batches_are_rate_limited(self):
+        gsheet_wrapper = FakeBatchGSheetWrapper()
+        scheduler = RequestScheduler(host_rates={SHEETS_HOST: 1000.0})
+        sink = GSheetBatchSink(scheduler.wrap(SHEETS_HOST, gsheet_wrapper), batch_size=2)
+        self.finish_issues(sink, "YARN-1", "YARN-2", "YARN-3")
+        sink.close()
+        # Each batch is a single scheduled request
+        self.assertEqual(2, scheduler.metrics[SHEETS_HOST].requests)
+        self.assertEqual(2, len(gsheet_wrapper.sheet.requests))
+
+    def test_gsheet_sink_cross_conflicts(self):
+        gsheet_wrapper = FakeBatchGSheetWrapper()
+        sink = GSheetBatchSink(gsheet_wrapper, batch_size=10)
+        self.finish_issues(sink, "YARN-1", "YARN-2", "YARN-3")
+        sink.cross_conflicts_found([CrossConflict("origin/trunk", FakePatch("YARN-1"), FakePatch("YARN-3"),
+                                                  ["A.java"])])
+        sink.close()
+        status = PatchStatus.CANNOT_FIND_PATCH.value
+        # Pending statuses of conflicting issues are replaced
+        self.assertEqual([[("YARN-2", status), ("YARN-1", status + ", CROSS-CONFLICT: YARN-3 on origin/trunk"),
+                           ("YARN-3", status + ", CROSS-CONFLICT: YARN-1 on origin/trunk")]], gsheet_wrapper.updates)
+
+    def test_gsheet_sink_restored_issues(self):
+        gsheet_wrapper = FakeBatchGSheetWrapper()
+        sink = GSheetBatchSink(gsheet_wrapper, batch_size=10)
+        # Rows of the interrupted run are restored from the checkpoint, without going through the sink
+        for issue_id in ("YARN-1", "YARN-2"):
+            add_issue(self.results, issue_id, "trunk")
+        sink.issues_restored(self.results)
+        self.finish_issues(sink, "YARN-3")
+        sink.close()
+        status = PatchStatus.CANNOT_FIND_PATCH.value
+        self.assertEqual([[("YARN-1", status), ("YARN-2", status), ("YARN-3", status)]], gsheet_wrapper.updates)
+
+    def test_gsheet_sink_without_batch_updates(self):
+        gsheet_wrapper = FakeGSheetWrapper()
+        sink = GSheetBatchSink(gsheet_wrapper, batch_size=10)
+        self.finish_issues(sink, "YARN-1", "YARN-2")
+        sink.close()
+        self.assertEqual(["YARN-1", "YARN-2"], [update[0][0] for update in gsheet_wrapper.updates])
+
+    def test_checkpoint_sink(self):
+        journal = CheckpointJournal(os.path.join(self.tmp_dir.name, "run.jsonl"))
+        journal.start(["trunk", "branch-3.2"])
+        sink = CheckpointSink(journal)
+        self.finish_issues(sink, "YARN-1", "YARN-2")
+        sink.close()
+        branches, finished_issues = journal.load()
+        self.assertEqual(["trunk", "branch-3.2"], branches)
+        self.assertEqual(["YARN-1", "YARN-2"], list(finished_issues))
+        self.assertEqual(list(self.results.iter_records(start=2)), finished_issues["YARN-2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
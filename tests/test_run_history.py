@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import os
+import tempfile
+import time
+import unittest
+
+from run_history import RunHistoryReport, RunHistoryStore, StageTimer, SECONDS_PER_DAY
+
+
+class FakeResults:
+    def __init__(self):
+        self.records = []
+
+    def iter_records(self):
+        return iter(self.records)
+
+
+class RunHistoryTestSuite(unittest.TestCase):
+    """Test cases for the run history database and its reports."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = RunHistoryStore(os.path.join(self.tmp_dir.name, "history.sqlite"))
+        self.output = []
+        self.report = RunHistoryReport(self.store, output_func=self.output.append)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def _save_run(self, days_ago, statuses, apply_duration):
+        results = FakeResults()
+        timer = StageTimer()
+        for issue_id, status in statuses.items():
+            results.records.append({"issue": issue_id, "patch_file": issue_id + ".001.patch", "branch": "origin/trunk",
+                                    "result": status, "conflicts": 0 if status == "APPLIES_CLEANLY" else 1})
+            timer.add("apply", apply_duration, issue_id=issue_id)
+        timer.add("git_fetch", 10.0)
+        started_at = time.time() - days_ago * SECONDS_PER_DAY
+        return self.store.save_run(started_at, started_at + 60, "issues", ["trunk"], results, timer)
+
+    def test_status_flips(self):
+        self._save_run(20, {"YARN-1": "APPLIES_CLEANLY", "YARN-2": "APPLIES_CLEANLY"}, 1.0)
+        self._save_run(3, {"YARN-1": "CONFLICT", "YARN-2": "APPLIES_CLEANLY"}, 1.0)
+        self._save_run(2, {"YARN-1": "CONFLICT", "YARN-2": "CONFLICT"}, 1.0)
+
+        rows = self.report.report_flips(7, "OK", "CONFLICT")
+        self.assertEqual([("YARN-1", "trunk"), ("YARN-2", "trunk")], [(row[0], row[1]) for row in rows])
+        self.assertEqual([], self.report.report_flips(1, "OK", "CONFLICT"))
+
+    def test_stage_regression(self):
+        self._save_run(10, {"YARN-1": "APPLIES_CLEANLY"}, 1.0)
+        self._save_run(1, {"YARN-1": "APPLIES_CLEANLY"}, 3.0)
+
+        rows = self.report.report_stages(7, 28)
+        self.assertEqual("apply", rows[0][0])
+        self.assertAlmostEqual(3.0, rows[0][3])
+        self.assertEqual(("git_fetch", 1.0), (rows[1][0], rows[1][3]))
+
+    def test_slow_issues_and_latest_costs(self):
+        self._save_run(2, {"YARN-1": "APPLIES_CLEANLY"}, 1.0)
+        self._save_run(1, {"YARN-1": "APPLIES_CLEANLY", "YARN-2": "CONFLICT"}, 5.0)
+
+        rows = self.report.report_slow_issues(7, "apply", 10)
+        self.assertEqual(["YARN-2", "YARN-1"], [row[0] for row in rows])
+        self.assertEqual({"YARN-1": (5.0, 1), "YARN-2": (5.0, 1)},
+                         self.store.get_latest_issue_costs(["YARN-1", "YARN-2", "YARN-3"]))
+
+    def test_report_args(self):
+        args = RunHistoryReport.parse_args(["--root", self.tmp_dir.name, "flips"], "/default/root")
+        self.assertEqual(os.path.join(self.tmp_dir.name, "history.sqlite"), args.history_db)
+        args = RunHistoryReport.parse_args(["stages"], "/default/root")
+        self.assertEqual(os.path.join("/default/root", "history.sqlite"), args.history_db)
+        # An explicit database path wins over the root
+        args = RunHistoryReport.parse_args(["--root", self.tmp_dir.name, "--history-db", "/tmp/h.sqlite", "flips"],
+                                           "/default/root")
+        self.assertEqual("/tmp/h.sqlite", args.history_db)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import os
+import tempfile
+import threading
+import unittest
+
+from scheduler import AvailableChunks, IssueCostModel, LptScheduler
+
+
+class FakeHistoryStore:
+    def __init__(self, costs):
+        self.costs = costs
+
+    def get_latest_issue_costs(self, issue_ids):
+        return {issue_id: cost for issue_id, cost in self.costs.items() if issue_id in issue_ids}
+
+
+class SchedulerTestSuite(unittest.TestCase):
+    """Test cases for ordering issues by predicted cost."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write_patch(self, issue_id, size):
+        os.makedirs(os.path.join(self.tmp_dir.name, issue_id))
+        with open(os.path.join(self.tmp_dir.name, issue_id, issue_id + ".001.patch"), "w") as f:
+            f.write("x" * size)
+
+    def test_costs_from_history_are_scaled_by_branches(self):
+        history = FakeHistoryStore({"YARN-1": (10.0, 2), "YARN-2": (4.0, 1)})
+        costs = IssueCostModel(history, self.tmp_dir.name, branch_count=4).predict(["YARN-1", "YARN-2"])
+        self.assertEqual({"YARN-1": 20.0, "YARN-2": 16.0}, costs)
+
+    def test_costs_of_new_issues(self):
+        self._write_patch("YARN-1", 1000)
+        self._write_patch("YARN-3", 3000)
+        history = FakeHistoryStore({"YARN-1": (2.0, 1), "YARN-2": (4.0, 1)})
+        costs = IssueCostModel(history, self.tmp_dir.name, branch_count=1).predict(
+            ["YARN-1", "YARN-2", "YARN-3", "YARN-4"])
+        # YARN-3: patch size x seconds per byte of YARN-1, YARN-4: average of known costs
+        self.assertEqual({"YARN-1": 2.0, "YARN-2": 4.0, "YARN-3": 6.0, "YARN-4": 3.0}, costs)
+
+    def test_lpt_order(self):
+        history = FakeHistoryStore({"YARN-1": (1.0, 1), "YARN-2": (9.0, 1), "YARN-3": (5.0, 1)})
+        scheduler = LptScheduler(IssueCostModel(history, self.tmp_dir.name, branch_count=1))
+        self.assertEqual(["YARN-2", "YARN-3", "YARN-1"], scheduler.order(["YARN-1", "YARN-2", "YARN-3"]))
+
+    def test_original_order_without_history(self):
+        scheduler = LptScheduler(IssueCostModel(None, self.tmp_dir.name, branch_count=1))
+        self.assertEqual(["YARN-3", "YARN-1", "YARN-2"], scheduler.order(["YARN-3", "YARN-1", "YARN-2"]))
+
+    def test_available_chunks(self):
+        first_page_read = threading.Event()
+        second_page = threading.Event()
+
+        def pages():
+            yield "YARN-1"
+            yield "YARN-2"
+            first_page_read.set()
+            second_page.wait()
+            yield "YARN-3"
+
+        chunks = iter(AvailableChunks(pages()).start())
+        first_page_read.wait()
+        # Items of the first page are dispatched without waiting for the next page
+        self.assertEqual(["YARN-1", "YARN-2"], next(chunks))
+        second_page.set()
+        self.assertEqual(["YARN-3"], next(chunks))
+        self.assertEqual([], list(chunks))
+
+    def test_available_chunks_error(self):
+        def pages():
+            yield "YARN-1"
+            raise ValueError("Jira is down")
+
+        received = []
+        with self.assertRaises(ValueError):
+            for chunk in AvailableChunks(pages()):
+                received.extend(chunk)
+        self.assertEqual(["YARN-1"], received)
+
+
+if __name__ == '__main__':
+    unittest.main()
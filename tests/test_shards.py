@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+from .context import reviewsync
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from fetch_mode import JiraFetchMode
+from rate_limit import RequestScheduler
+from reviewsync.reviewsync import ReviewSync
+from shards import ShardFilter, ShardOutput, parse_shard
+
+ISSUES = ["YARN-{}".format(i) for i in range(100, 160)] + ["HADOOP-1", "HDFS-2"]
+REVIEWSYNC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'reviewsync'))
+
+# Runs one shard in a separate process, with fake results of two branches per issue
+SHARD_SCRIPT = """
+import json, sys
+from shards import ShardFilter, ShardOutput
+index, count, output, issues = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3], json.loads(sys.argv[4])
+shard_filter = ShardFilter(index, count)
+records = []
+for issue_id in shard_filter.filter(issues):
+  for branch in ("origin/trunk", "origin/branch-3.2"):
+    records.append({"issue": issue_id, "owner": "owner", "patch_file": issue_id + ".001.patch", "branch": branch,
+                    "explicit": True, "result": "APPLIES_CLEANLY", "conflicts": 0,
+                    "overall_status": "trunk: OK, branch-3.2: OK"})
+ShardOutput.write(output, shard_filter, ["trunk", "branch-3.2"], records)
+"""
+
+
+class FakeGSheetWrapper:
+    def __init__(self, issues):
+        self.issues = issues
+        self.fetched = False
+        self.requests = []
+
+    def fetch_jira_data(self):
+        self.fetched = True
+        return self.issues
+
+    def update_issue_cells(self, issue_statuses, update_date_str):
+        if not self.fetched:
+            raise ValueError("Sheet data is not yet fetched!")
+        self.requests.append(issue_statuses)
+
+
+class ShardsTestSuite(unittest.TestCase):
+    """Test cases for sharded runs and merging of shard outputs."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _run_shard(self, index, count, hash_seed):
+        output = os.path.join(self.tmp_dir.name, "shard-{}-of-{}.jsonl".format(index, count))
+        env = dict(os.environ, PYTHONPATH=REVIEWSYNC_DIR, PYTHONHASHSEED=str(hash_seed))
+        return subprocess.Popen([sys.executable, "-c", SHARD_SCRIPT, str(index), str(count), output,
+                                 json.dumps(ISSUES)], env=env), output
+
+    def test_parse_shard(self):
+        self.assertEqual((2, 4), parse_shard("2/4"))
+        for value in ("0/4", "5/4", "1/0", "a/b", "1"):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_shard(value)
+
+    def test_shards_partition_issues(self):
+        shards = [list(ShardFilter(index, 3).filter(ISSUES)) for index in range(1, 4)]
+        self.assertEqual(sorted(ISSUES), sorted(sum(shards, [])))
+        self.assertTrue(all(shards))
+
+    def _run_shards(self, count):
+        # Different hash seeds: partitioning must not depend on the process
+        processes = [self._run_shard(index, count, hash_seed=index) for index in range(1, count + 1)]
+        outputs = []
+        for process, output in processes:
+            self.assertEqual(0, process.wait())
+            outputs.append(output)
+        return outputs
+
+    def test_merge_outputs_of_shard_processes(self):
+        outputs = self._run_shards(3)
+
+        records, branches = ShardOutput.merge(reversed(outputs))
+        self.assertEqual(["trunk", "branch-3.2"], branches)
+        self.assertEqual(len(ISSUES) * 2, len(records))
+        self.assertEqual(ISSUES, [record["issue"] for record in records[::2]])
+        self.assertEqual(["origin/trunk", "origin/branch-3.2"], [record["branch"] for record in records[:2]])
+
+    def test_merge_writes_gsheet_once(self):
+        merger = ReviewSync.__new__(ReviewSync)
+        merger.merge_shard_files = self._run_shards(2)
+        merger.issue_fetch_mode = JiraFetchMode.GSHEET
+        merger.request_scheduler = RequestScheduler()
+        gsheet_wrapper = FakeGSheetWrapper(ISSUES)
+        merger._gsheet_wrapper = gsheet_wrapper
+        results = merger.merge_shards()
+        self.assertEqual(len(ISSUES) * 2, len(results))
+        self.assertEqual(1, len(gsheet_wrapper.requests))
+        self.assertEqual([(issue_id, "trunk: OK, branch-3.2: OK") for issue_id in ISSUES], gsheet_wrapper.requests[0])
+
+    def test_merge_fails_on_missing_shard(self):
+        processes = [self._run_shard(index, 3, hash_seed=0) for index in (1, 3)]
+        outputs = [output for process, output in processes if process.wait() == 0]
+        with self.assertRaisesRegex(ValueError, "Missing output of shards: 2/3"):
+            ShardOutput.merge(outputs)
+        with self.assertRaisesRegex(ValueError, "specified twice"):
+            ShardOutput.merge(outputs + outputs[:1])
+
+
+if __name__ == '__main__':
+    unittest.main()